@@ -0,0 +1,190 @@
+# action_planner.py
+# Turns one search_recent_tweets page into a deduplicated action plan.
+#
+# Every tweet on the page is filtered, retweets are resolved to their originals, and
+# retweet/like/follow targets that several tweets share (five RTs of the same original,
+# three tweets by the same author) are coalesced into a single planned action. Targets
+# already in the done-ID stores are dropped in one pass at the end, so the loops only ever
+# spend API calls on the actions in the plan. With a near_duplicate.NearDuplicateIndex, a tweet
+# whose target text nearly repeats one acted on within the index window is skipped as well.
+import logging
+
+from candidate_buffer import base_score, tweet_timestamp
+from near_duplicate import SKIP_REASON_NEAR_DUPLICATE
+from tweet_filter import log_skip
+
+ACTION_NAMES = ("retweet", "like", "follow")
+
+# Tweet level skip reasons, in addition to the tweet_filter rules
+SKIP_REASON_OWN_TWEET = "own_tweet"
+SKIP_REASON_OWN_TARGET = "own_target"
+# Action level skip reasons
+SKIP_REASON_ALREADY_A_RETWEET = "already_a_retweet"
+SKIP_REASON_ALREADY_DONE = "already_done"
+SKIP_REASON_SELF_FOLLOW = "self_follow"
+
+LOG_PREVIEW_LENGTH = 150
+
+
+class TextPreview:
+    # Log argument: the one-line, truncated tweet text is only built if the record is emitted
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __str__(self):
+        preview = self.text.replace('\n', ' ').strip()
+        if len(preview) > LOG_PREVIEW_LENGTH:
+            preview = preview[:LOG_PREVIEW_LENGTH - 3] + "..."
+        return preview
+
+
+class PlannedAction:
+    __slots__ = ("action_name", "target_id", "action_args", "score", "created_at", "target_label", "source_ids")
+
+    def __init__(self, action_name, target_id, action_args, score, created_at, target_label, source_id):
+        self.action_name = action_name
+        self.target_id = target_id
+        self.action_args = action_args
+        self.score = score
+        self.created_at = created_at
+        self.target_label = target_label
+        self.source_ids = [source_id]
+
+
+class ActionPlan:
+    __slots__ = ("actions", "tweet_decisions", "action_skips", "highest_id", "tweet_count")
+
+    def __init__(self):
+        self.actions = []          # PlannedAction, in first-seen order
+        self.tweet_decisions = []  # (tweet, reason, detail); reason None for tweets that produced targets
+        self.action_skips = []     # (action_name, target_id, reason)
+        self.highest_id = None
+        self.tweet_count = 0
+
+    def skipped_tweet_count(self):
+        return sum(1 for _, reason, _ in self.tweet_decisions if reason is not None)
+
+    def summary(self):
+        per_action = {name: 0 for name in ACTION_NAMES}
+        for action in self.actions: per_action[action.action_name] += 1
+        planned = ", ".join(f"{count} {name}" for name, count in per_action.items() if count) or "no actions"
+        coalesced = sum(len(action.source_ids) - 1 for action in self.actions)
+        already_done = sum(1 for _, _, reason in self.action_skips if reason == SKIP_REASON_ALREADY_DONE)
+        return (f"Action plan for {self.tweet_count} tweets: {planned}; {self.skipped_tweet_count()} tweets skipped, "
+                f"{coalesced} duplicate targets coalesced, {already_done} targets already done.")
+
+    __str__ = summary # as a log argument, the summary is only built if the record is emitted
+
+    def format(self):
+        # Multi-line rendering used by --dry-run
+        lines = [self.summary()]
+        for action in self.actions:
+            sources = ", ".join(str(source_id) for source_id in action.source_ids)
+            lines.append(f"  {action.action_name:<8} {action.target_label:<28} score {action.score:6.2f}  <- {sources}")
+        for action_name, target_id, reason in self.action_skips:
+            lines.append(f"  {'(skip)':<8} {action_name} {target_id}: {reason}")
+        for tweet, reason, detail in self.tweet_decisions:
+            if reason is not None:
+                lines.append(f"  {'(skip)':<8} tweet {tweet.id}: {reason}" + (f" ({detail})" if detail else ""))
+        return "\n".join(lines)
+
+
+def resolve_interaction_target(search_result_tweet, author_username, users, original_tweets_data):
+    # For RTs found in search, like/follow the original tweet and its author when it is in the expansions
+    target_tweet_for_interaction = search_result_tweet
+    user_to_follow_id = search_result_tweet.author_id
+    user_to_follow_username = author_username
+    is_a_retweet_by_another_user = False
+
+    if search_result_tweet.referenced_tweets:
+        for ref in search_result_tweet.referenced_tweets:
+            if ref.type == 'retweeted':
+                is_a_retweet_by_another_user = True
+                if ref.id in original_tweets_data:
+                    target_tweet_for_interaction = original_tweets_data[ref.id]
+                    user_to_follow_id = target_tweet_for_interaction.author_id
+                    user_to_follow_username = users.get(user_to_follow_id, {}).get("username", "OriginalUnknown")
+                    logging.info("This is an RT. Targeting original tweet %s by @%s", target_tweet_for_interaction.id, user_to_follow_username)
+                else:
+                    logging.warning("RT detected, but original tweet %s not in expansions. Will target RT object.", ref.id)
+                break
+    return target_tweet_for_interaction, user_to_follow_id, user_to_follow_username, is_a_retweet_by_another_user
+
+
+def plan_search_page(tweets, includes, my_bot_id, tweet_filter, done_ids_by_action, target_languages=(), near_duplicates=None):
+    # done_ids_by_action maps each enabled action name to its done-ID store; disabled actions are never planned
+    plan = ActionPlan()
+    if not tweets: return plan
+    plan.tweet_count = len(tweets)
+    includes = includes or {}
+    users = {user["id"]: user for user in includes.get("users", [])}
+    original_tweets_data = {tweet["id"]: tweet for tweet in includes.get("tweets", [])}
+    planned = {} # (action_name, target_id) -> PlannedAction
+    seen_skips = set()
+
+    for search_result_tweet, skip_rule, skip_detail in tweet_filter.filter_batch(tweets, users):
+        if plan.highest_id is None or search_result_tweet.id > plan.highest_id:
+            plan.highest_id = search_result_tweet.id
+        author_username = users.get(search_result_tweet.author_id, {}).get("username", "UnknownUser")
+
+        logging.info("--- Processing Search Result ID: %s by @%s --- Text: \"%s\" ---",
+                     search_result_tweet.id, author_username, TextPreview(search_result_tweet.text))
+        logging.debug("Full raw tweet text: %s", search_result_tweet.text)
+
+        if search_result_tweet.author_id == my_bot_id:
+            logging.info("Skipping: Search result is by the bot itself.")
+            plan.tweet_decisions.append((search_result_tweet, SKIP_REASON_OWN_TWEET, None))
+            continue
+        if skip_rule is not None:
+            log_skip(skip_rule, skip_detail, search_result_tweet.text, author_username, target_languages)
+            plan.tweet_decisions.append((search_result_tweet, skip_rule, skip_detail))
+            continue
+
+        target_tweet, user_to_follow_id, user_to_follow_username, is_a_retweet_by_another_user = \
+            resolve_interaction_target(search_result_tweet, author_username, users, original_tweets_data)
+        if target_tweet.author_id == my_bot_id:
+            logging.info("Skipping actions: Target tweet (original or search result) is by the bot itself.")
+            plan.tweet_decisions.append((search_result_tweet, SKIP_REASON_OWN_TARGET, target_tweet.id))
+            continue
+        if near_duplicates is not None:
+            duplicate_of = near_duplicates.check(target_tweet.text, target_tweet.id)
+            if duplicate_of is not None:
+                logging.info("Skipping tweet: Text nearly duplicates tweet %s.", duplicate_of)
+                plan.tweet_decisions.append((search_result_tweet, SKIP_REASON_NEAR_DUPLICATE, duplicate_of))
+                continue
+        plan.tweet_decisions.append((search_result_tweet, None, None))
+
+        score = base_score(target_tweet, users.get(target_tweet.author_id))
+        created_at = tweet_timestamp(target_tweet)
+        targets = {
+            "retweet": (target_tweet.id, (target_tweet.id, False), f"tweet {target_tweet.id}"),
+            "like": (target_tweet.id, (target_tweet.id,), f"tweet {target_tweet.id}"),
+            "follow": (user_to_follow_id, (user_to_follow_id, user_to_follow_username, my_bot_id), f"@{user_to_follow_username} ({user_to_follow_id})"),
+        }
+        for action_name in done_ids_by_action:
+            target_id, action_args, target_label = targets[action_name]
+            skip_reason = None
+            if action_name == "retweet" and is_a_retweet_by_another_user: skip_reason = SKIP_REASON_ALREADY_A_RETWEET
+            elif action_name == "follow" and user_to_follow_id == my_bot_id: skip_reason = SKIP_REASON_SELF_FOLLOW
+            if skip_reason is not None:
+                if (action_name, target_id, skip_reason) not in seen_skips:
+                    seen_skips.add((action_name, target_id, skip_reason))
+                    plan.action_skips.append((action_name, target_id, skip_reason))
+                continue
+            if near_duplicates is not None: near_duplicates.hold_target(target_tweet.id, action_name, target_id)
+            existing = planned.get((action_name, target_id))
+            if existing is None:
+                planned[(action_name, target_id)] = PlannedAction(action_name, target_id, action_args, score, created_at, target_label, search_result_tweet.id)
+            else:
+                existing.source_ids.append(search_result_tweet.id)
+                existing.score = max(existing.score, score)
+
+    # Bulk drop of targets that were already acted on: each distinct target is looked up once
+    for (action_name, target_id), action in planned.items():
+        if str(target_id) in done_ids_by_action[action_name]:
+            plan.action_skips.append((action_name, target_id, SKIP_REASON_ALREADY_DONE))
+        else:
+            plan.actions.append(action)
+    return plan
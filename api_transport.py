@@ -0,0 +1,144 @@
+# api_transport.py
+# HTTP transport for the tweepy.Client session: pooled keep-alive connections, per-call
+# timeouts and retries.
+#
+# tweepy.Client always builds URLs on https://api.twitter.com and sends them without a timeout.
+# install_transport() mounts an ApiTransportAdapter for that host on the client's session.
+# The adapter:
+#   - keeps up to pool_maxsize connections alive (the async runtime calls from several threads)
+#   - gives every call that does not set its own timeout a (connect, read) timeout
+#   - retries idempotent calls (GET) after connection errors, timeouts and 5xx responses,
+#     backing off exponentially with jitter; a Retry-After header overrides the computed wait
+#   - retries any call whose connection could not be opened, since nothing was sent
+#   - after a 429 on an idempotent call, sleeps exactly until the reported reset and retries
+#     once, if that is at most max_rate_limit_wait away. Longer waits are left to the rate budget.
+#   - reports each attempt to observer(endpoint, outcome, seconds)
+#   - with pool, sends through that urllib3 PoolManager instead of its own, so many clients
+#     (one per TwitterBot) reuse the same keep-alive connections
+# With base_url, requests go to another host instead, e.g. a local mock_twitter_api.py server
+# for offline runs and benchmarks. Sleeps and latencies use the injected sleep/clock pair.
+import email.utils
+import logging
+import random
+import threading
+from time import sleep, time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import PoolManager
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from rate_budget import endpoint_for_request, parse_rate_limit_headers
+
+TWITTER_API_HOST = "https://api.twitter.com"
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+RETRY_STATUSES = frozenset((500, 502, 503, 504))
+SHARED_POOL_MAXSIZE = 32 # connections kept alive per host by shared_connection_pool()
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def shared_connection_pool():
+    # The process-wide PoolManager that every bot's clients send through, created on first use
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = PoolManager(num_pools=4, maxsize=SHARED_POOL_MAXSIZE)
+        return _shared_pool
+
+
+def retry_after_seconds(headers, now, rate_limited=False):
+    # Seconds until the server said to retry: Retry-After (seconds or an HTTP date), or for a 429
+    # the latest reset among the exhausted x-rate-limit windows. None if the headers do not say.
+    value = headers.get("retry-after")
+    if value:
+        try: return max(0.0, float(value))
+        except ValueError:
+            try: return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - now)
+            except (TypeError, ValueError): pass
+    if rate_limited:
+        exhausted = [reset_at for _, remaining, reset_at in parse_rate_limit_headers(headers).values() if remaining <= 0]
+        if exhausted: return max(0.0, max(exhausted) - now)
+    return None
+
+
+def connection_never_opened(error):
+    # True when the request cannot have reached the server, so even a POST is safe to resend
+    if isinstance(error, requests.ConnectTimeout): return True
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError): reason = reason.reason
+    return isinstance(reason, NewConnectionError)
+
+
+class ApiTransportAdapter(HTTPAdapter):
+    def __init__(self, base_url=None, timeout=(5, 30), retries=3, backoff_base=0.5, backoff_max=8.0, max_rate_limit_wait=60,
+                 pool_maxsize=10, pool=None, sleep=sleep, clock=time, observer=None, rng=None):
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self.sleep = sleep
+        self.clock = clock
+        self.observer = observer
+        self.rng = rng or random.Random()
+        self.shared_pool = pool
+        super().__init__(pool_connections=1, pool_maxsize=pool_maxsize)
+        if pool is not None: self.poolmanager = pool
+
+    def backoff(self, attempt):
+        # Exponential with "equal jitter": half the step is fixed, so a retry is never immediate
+        step = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return step / 2 + self.rng.uniform(0, step / 2)
+
+    def send(self, request, stream=False, timeout=None, **kwargs):
+        if self.base_url and request.url.startswith(TWITTER_API_HOST):
+            request.url = self.base_url + request.url[len(TWITTER_API_HOST):]
+        timeout = timeout if timeout is not None else self.timeout
+        endpoint = endpoint_for_request(request.method, request.path_url.split('?', 1)[0])
+        idempotent = request.method in IDEMPOTENT_METHODS
+        attempt = 0
+        waited_for_reset = False
+        while True:
+            started_at = self.clock()
+            try:
+                response = super().send(request, stream=stream, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._observe(endpoint, "connection_error", started_at)
+                if attempt >= self.retries or not (idempotent or connection_never_opened(e)): raise
+                wait = self.backoff(attempt)
+                logging.warning("%s %s failed (%s); retry %s/%s in %.1fs.", request.method, endpoint, type(e).__name__, attempt + 1, self.retries, wait)
+            else:
+                status = response.status_code
+                self._observe(endpoint, "ok" if status < 400 else "rate_limited" if status == 429 else
+                              "server_error" if status >= 500 else "client_error", started_at)
+                if status == 429 and idempotent and not waited_for_reset:
+                    wait = retry_after_seconds(response.headers, self.clock(), rate_limited=True)
+                    if wait is None or wait > self.max_rate_limit_wait: return response
+                    waited_for_reset = True
+                    logging.info("%s %s rate limited; retrying when the window resets in %.1fs.", request.method, endpoint, wait)
+                elif status in RETRY_STATUSES and idempotent and attempt < self.retries:
+                    server_wait = retry_after_seconds(response.headers, self.clock())
+                    wait = min(server_wait, self.max_rate_limit_wait) if server_wait is not None else self.backoff(attempt)
+                    logging.warning("%s %s returned %s; retry %s/%s in %.1fs.", request.method, endpoint, status, attempt + 1, self.retries, wait)
+                else:
+                    return response
+                response.content # read the error body so the connection goes back to the pool instead of being reset
+                response.close()
+            if wait: self.sleep(wait)
+            attempt += 1
+
+    def close(self):
+        # A shared pool outlives any one client's session
+        if self.shared_pool is None: super().close()
+
+    def _observe(self, endpoint, outcome, started_at):
+        if self.observer is not None: self.observer(endpoint, outcome, self.clock() - started_at)
+
+
+def install_transport(client, base_url=None, **settings):
+    # Mounts an ApiTransportAdapter for every request `client` (a tweepy.Client or StreamingClient) sends
+    client.session.mount(TWITTER_API_HOST + "/", ApiTransportAdapter(base_url, **settings))
+    return client
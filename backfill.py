@@ -0,0 +1,182 @@
+# backfill.py
+# Parallel backfill of the recent-search window for watched queries that have no since_id yet.
+#
+# Without a since_id, a search round only fetches the newest page, so a new query never sees
+# the rest of the 7 days recent search reaches back. A WindowBackfill splits that window into
+# `shards` start_time/end_time ranges and fetches them on a thread pool, newest shard first,
+# following next_token inside each shard. The workers share the caller's search rate budget:
+# a request waits until the budget allows it and is reserved from it before it is made, so
+# concurrent shards never spend more calls than remain. The backfill stops early once the
+# budget is blocked for longer than max_wait seconds or max_pages requests were made. Shards
+# cut short are logged; their older tweets are not searched again.
+#
+# Iterating yields the pages in the calling thread in ID order: oldest shard first, oldest
+# tweet first. A shard's pages are handed on once it and every older shard have finished, so
+# planning, the done-ID stores and the near-duplicate index stay single-threaded, and the
+# original of a copy-paste campaign is seen before its copies. The window ends at end_time,
+# and since_id is the last tweet ID that can be older than end_time (IDs begin with their
+# creation time). A live search from since_id neither repeats nor misses a tweet, whether or
+# not the window had any.
+import logging
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from time import sleep, time
+
+import tweepy
+
+from search_pager import SearchPage
+
+RECENT_SEARCH_WINDOW = 7 * 24 * 3600
+START_MARGIN = 60 # seconds; start_time must still lie inside the window when the last request arrives
+END_MARGIN = 30   # seconds; end_time must be at least 10 seconds before the request
+MIN_SHARD_SECONDS = 60
+TWITTER_EPOCH_MS = 1288834974657
+
+
+def snowflake_floor(epoch_seconds):
+    # Lowest tweet ID that can have been created at epoch_seconds
+    return (int(epoch_seconds * 1000) - TWITTER_EPOCH_MS) << 22
+
+
+def snowflake_time(tweet_id):
+    # Epoch seconds at which a tweet ID was created
+    return ((int(tweet_id) >> 22) + TWITTER_EPOCH_MS) / 1000
+
+
+def api_timestamp(epoch_seconds):
+    return datetime.fromtimestamp(epoch_seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class BackfillShard:
+    __slots__ = ("start_time", "end_time", "pages", "tweets", "complete", "failed")
+
+    def __init__(self, start_time, end_time):
+        self.start_time = start_time # epoch seconds, inclusive
+        self.end_time = end_time     # epoch seconds, exclusive
+        self.pages = []              # SearchPages, newest first
+        self.tweets = 0
+        self.complete = False        # paged to the end of its range
+        self.failed = False          # a request failed after the transport's retries
+
+
+class WindowBackfill:
+    # fetch_page(start_time, end_time, next_token) -> response with .data/.includes/.meta, or None on
+    # failure; it may raise tweepy.TooManyRequests once rate_budget has recorded it.
+    # rate_budget: the shared rate_budget.RateBudget whose `endpoint` budget every request is reserved from.
+    def __init__(self, fetch_page, window=RECENT_SEARCH_WINDOW, shards=14, workers=4, max_pages=100, max_wait=60,
+                 rate_budget=None, endpoint="search", clock=time, sleep=sleep):
+        self.fetch_page = fetch_page
+        self.workers = max(1, workers)
+        self.max_pages = max_pages
+        self.max_wait = max_wait
+        self.rate_budget = rate_budget
+        self.endpoint = endpoint
+        self.sleep = sleep
+        now = int(clock())
+        self.end_time = now - END_MARGIN
+        start_time = max(self.end_time - window, now - RECENT_SEARCH_WINDOW + START_MARGIN)
+        span = max(0, self.end_time - start_time)
+        shards = max(1, min(shards, span // MIN_SHARD_SECONDS))
+        bounds = [start_time + span * position // shards for position in range(shards + 1)]
+        self.shards = [BackfillShard(bounds[position], bounds[position + 1]) for position in range(shards)] # oldest first
+        self.since_id = snowflake_floor(self.end_time) - 1
+        self.pages = 0 # requests made or in flight
+        self.stopped_by = None # why the backfill ended before every shard was complete
+        self._lock = threading.Lock()
+        self._request_done = threading.Condition() # a reserved request finished and released its budget reservation
+        self._stopping = threading.Event()
+
+    @property
+    def tweets(self):
+        return sum(shard.tweets for shard in self.shards)
+
+    @property
+    def complete(self):
+        return all(shard.complete for shard in self.shards)
+
+    def __iter__(self):
+        executor = ThreadPoolExecutor(self.workers, thread_name_prefix="backfill")
+        try:
+            futures = [executor.submit(self._fetch_shard, shard) for shard in reversed(self.shards)]
+            for shard, future in zip(self.shards, reversed(futures)):
+                future.result() # re-raises a worker's ShutdownRequested or unexpected error here
+                for page in reversed(shard.pages): yield page
+                shard.pages = []
+        finally:
+            self._stopping.set() # also when the caller stops iterating early
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def summary(self):
+        incomplete = [shard for shard in self.shards if not shard.complete]
+        text = (f"Backfill from {api_timestamp(self.shards[0].start_time)} to {api_timestamp(self.end_time)}: {self.tweets} tweets "
+                f"in {self.pages} pages across {len(self.shards)} shards")
+        if not incomplete: return text + "."
+        oldest_gap = api_timestamp(incomplete[0].start_time)
+        reason = ", ".join(filter(None, [self.stopped_by, "failed requests" if any(shard.failed for shard in incomplete) else None]))
+        return text + f"; {len(incomplete)} shards cut short ({reason or 'stopped'}), oldest gap from {oldest_gap}."
+
+    __str__ = summary # as a log argument, the summary is only built if the record is emitted
+
+    def _fetch_shard(self, shard):
+        start_time, end_time = api_timestamp(shard.start_time), api_timestamp(shard.end_time)
+        next_token = None
+        while self._reserve_request():
+            try:
+                response = self.fetch_page(start_time, end_time, next_token)
+            except tweepy.TooManyRequests:
+                with self._lock: self.pages -= 1
+                continue # the next reservation waits for the reset the budget recorded
+            finally:
+                self._release_request()
+            if response is None:
+                shard.failed = True
+                return
+            tweets = list(response.data or [])
+            if tweets:
+                tweets.sort(key=lambda tweet: tweet.id)
+                shard.pages.append(SearchPage(tweets, response.includes, response.meta))
+                shard.tweets += len(tweets)
+            next_token = (response.meta or {}).get("next_token")
+            if not next_token:
+                shard.complete = True
+                return
+
+    def _reserve_request(self):
+        # Waits for the shared search budget and reserves a request from it; False once the backfill should stop
+        while not self._stopping.is_set():
+            wait = self.rate_budget.wait_time(self.endpoint) if self.rate_budget is not None else 0
+            if wait > self.max_wait:
+                self._stop(f"search budget blocked for {int(wait)}s")
+                return False
+            if wait > 0:
+                self.sleep(math.ceil(wait))
+                continue
+            if self.rate_budget is not None:
+                with self._request_done:
+                    if not self.rate_budget.reserve(self.endpoint):
+                        # Other shards' requests hold the last calls until their responses are counted
+                        self._request_done.wait(1.0)
+                        continue
+            with self._lock:
+                reserved = self.pages < self.max_pages
+                if reserved: self.pages += 1
+            if not reserved:
+                self._release_request()
+                self._stop(f"{self.max_pages} page limit")
+            return reserved
+        return False
+
+    def _release_request(self):
+        if self.rate_budget is None: return
+        with self._request_done:
+            self.rate_budget.release(self.endpoint)
+            self._request_done.notify_all()
+
+    def _stop(self, reason):
+        with self._lock:
+            if self.stopped_by is None:
+                self.stopped_by = reason
+                logging.info("Backfill stopping: %s.", reason)
+        self._stopping.set()
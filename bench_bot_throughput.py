@@ -0,0 +1,96 @@
+# bench_bot_throughput.py
+# End-to-end benchmark: runs the bot's serial loop against mock_twitter_api.py on a virtual
+# clock and reports actions per hour, wasted quota and bot CPU time per searched tweet.
+#
+# Wasted quota counts requests that bought nothing: 429s, empty search pages and actions
+# on targets that were already done. Copies counts likes and retweets spent on a copy-paste
+# campaign already liked or retweeted once (scenarios with a campaign_ratio). CPU is the bot thread's own CPU time; the mock
+# server runs in other threads. Bot logging is turned off so it does not dominate the result.
+# Usage: python bench_bot_throughput.py [simulated_hours] [scenario ...]
+import logging
+import sys
+import tempfile
+from time import perf_counter, thread_time
+
+from mock_twitter_api import MockTwitterAPI, MockTwitterServer
+from twitter_bot import TwitterBot
+from virtual_clock import SimulationComplete, VirtualClock
+
+BENCH_PROFILE = {"query": "#alxafrica OR \"tech news\"", "retweet": True, "like": True, "follow": True,
+                 "languages": ["en"], "negative_keywords": ["buy now"], "max_results": 10, "sync_history": False}
+BENCH_CREDENTIALS = {"bearer_token": "mock", "consumer_key": "mock", "consumer_secret": "mock",
+                     "access_token": "999-mock", "access_token_secret": "mock"}
+
+# name -> (mock API settings, bot setting overrides)
+SCENARIOS = {
+    "free": ({"tier": "free", "tweets_per_hour": 60, "latency": 0.3}, {}),
+    "free-single-page": ({"tier": "free", "tweets_per_hour": 60, "latency": 0.3}, {"search_max_pages_per_round": 1}),
+    "basic": ({"tier": "basic", "tweets_per_hour": 600, "latency": 0.3}, {"max_results_per_search": 100}),
+    "basic-small-pages": ({"tier": "basic", "tweets_per_hour": 600, "latency": 0.3}, {"max_results_per_search": 10, "catch_up_max_results": 10}),
+    "basic-flaky": ({"tier": "basic", "tweets_per_hour": 600, "latency": 1.5, "error_rate": 0.05}, {"max_results_per_search": 100}),
+    "basic-outages": ({"tier": "basic", "tweets_per_hour": 600, "latency": 0.3, "server_error_rate": 0.2}, {"max_results_per_search": 100}),
+    "basic-history": ({"tier": "basic", "tweets_per_hour": 600, "latency": 0.3, "history_ratio": 0.3}, {"max_results_per_search": 100}),
+    "basic-history-sync": ({"tier": "basic", "tweets_per_hour": 600, "latency": 0.3, "history_ratio": 0.3}, {"max_results_per_search": 100, "sync_history": True}),
+    "basic-backfill": ({"tier": "basic", "tweets_per_hour": 600, "latency": 0.3, "history_hours": 7 * 24}, {"max_results_per_search": 100, "backfill": True}),
+    "basic-campaigns": ({"tier": "basic", "tweets_per_hour": 600, "latency": 0.3, "campaign_ratio": 0.3}, {"max_results_per_search": 100}),
+    "basic-campaigns-unfiltered": ({"tier": "basic", "tweets_per_hour": 600, "latency": 0.3, "campaign_ratio": 0.3}, {"max_results_per_search": 100, "near_duplicate_threshold": 0}),
+    "pro-burst": ({"tier": "pro", "tweets_per_hour": 3000, "latency": 0.3}, {"max_results_per_search": 100, "sleep_between_batch_actions": 5}),
+}
+
+
+def quiet_bot_logging():
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+        handler.close()
+    root_logger.addHandler(logging.NullHandler())
+    root_logger.setLevel(logging.CRITICAL)
+
+
+def run(name, hours):
+    api_settings, bot_overrides = SCENARIOS[name]
+    clock = VirtualClock()
+    start = clock()
+    clock.stop_at = start + hours * 3600
+    mock_api = MockTwitterAPI(clock=clock, sleep=clock.advance, **api_settings)
+    server = MockTwitterServer(mock_api).start()
+    wall_start = perf_counter()
+    try:
+        with tempfile.TemporaryDirectory() as state_dir:
+            bot = TwitterBot(clock=clock, show_countdown=False, api_base_url=server.base_url)
+            bot.configure_from_profile(dict(BENCH_PROFILE, name=name), state_dir)
+            for setting, value in bot_overrides.items(): setattr(bot, setting, value)
+            cpu_start = thread_time()
+            try:
+                bot.run(BENCH_CREDENTIALS)
+            except SimulationComplete:
+                pass
+            cpu_seconds = thread_time() - cpu_start
+    finally:
+        server.stop()
+    wall_seconds = perf_counter() - wall_start
+
+    stats = mock_api.stats
+    simulated_hours = (clock() - start) / 3600
+    total_requests = sum(endpoint_stats.get("requests", 0) for endpoint_stats in stats.values())
+    rate_limited = sum(endpoint_stats.get("rate_limited", 0) for endpoint_stats in stats.values())
+    server_errors = sum(endpoint_stats.get("server_errors", 0) for endpoint_stats in stats.values())
+    duplicates = sum(endpoint_stats.get("duplicates", 0) for endpoint_stats in stats.values())
+    campaign_copies = sum(endpoint_stats.get("campaign_copies", 0) for endpoint_stats in stats.values())
+    empty_pages = stats.get("search", {}).get("empty_pages", 0)
+    wasted = rate_limited + duplicates + empty_pages
+    tweets_searched = stats.get("search", {}).get("tweets_served", 0)
+    per_hour = {action: stats.get(action, {}).get("ok", 0) / simulated_hours for action in ("retweet", "like", "follow")}
+    print(f"{name:<26} {simulated_hours:5.1f}h in {wall_seconds:5.1f}s  "
+          f"actions/h={sum(per_hour.values()):6.1f} (rt {per_hour['retweet']:.1f}, like {per_hour['like']:.1f}, follow {per_hour['follow']:.1f})  "
+          f"searches={stats.get('search', {}).get('requests', 0):>5}  tweets={tweets_searched:>6}  "
+          f"wasted={wasted:>4}/{total_requests:<5} ({wasted / max(total_requests, 1):5.1%}: 429 {rate_limited}, empty {empty_pages}, dup {duplicates})  "
+          f"5xx={server_errors:<4} copies={campaign_copies:<4} "
+          f"cpu={cpu_seconds / max(tweets_searched, 1) * 1e6:7.1f}us/tweet")
+
+
+if __name__ == "__main__":
+    quiet_bot_logging()
+    simulated_hours = float(sys.argv[1]) if len(sys.argv) > 1 else 24
+    for scenario_name in (sys.argv[2:] or SCENARIOS):
+        run(scenario_name, simulated_hours)
@@ -0,0 +1,137 @@
+# bench_near_duplicate.py
+# Benchmark: NearDuplicateIndex on a synthetic stream of organic tweets mixed with copy-paste
+# campaigns (one text reposted with a different link, mention, hashtag, casing or word).
+#
+# Reports the cost per tweet, the index's memory, how many campaign copies were caught and how
+# many other tweets were wrongly skipped. It also compares against an exact linear scan
+# (word Jaccard against every remembered text) on a prefix of the stream.
+# Usage: python bench_near_duplicate.py [tweets] [scan_tweets]
+import random
+import string
+import sys
+import tracemalloc
+from time import perf_counter
+
+from near_duplicate import NearDuplicateIndex, text_features
+
+VOCABULARY_SIZE = 5000
+CAMPAIGNS = 300
+CAMPAIGN_SHARE = 0.2 # share of the stream that is campaign copies
+TWEETS_PER_SECOND = 5 # simulated arrival rate, for the index window
+HASHTAGS = ["#alxafrica", "#technews", "#ai", "#startups", "#python", "#giveaway"]
+
+
+def make_vocabulary(rng):
+    return ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 9))) for _ in range(VOCABULARY_SIZE)]
+
+
+def organic_text(rng, vocabulary, weights):
+    # Zipf-like word choice, so unrelated tweets still share the common words
+    words = rng.choices(vocabulary, cum_weights=weights, k=rng.randint(8, 30))
+    return " ".join(words) + " " + rng.choice(HASHTAGS)
+
+
+def campaign_copy(rng, template, vocabulary):
+    words = template.split()
+    mutation = rng.random()
+    if mutation < 0.25: words[rng.randrange(len(words))] = rng.choice(vocabulary) # one word changed
+    elif mutation < 0.45: words.insert(rng.randrange(len(words) + 1), rng.choice(HASHTAGS))
+    elif mutation < 0.6: words = [word.upper() if rng.random() < 0.2 else word for word in words]
+    elif mutation < 0.7: words.append(rng.choice("!?.") * rng.randint(1, 3))
+    text = " ".join(words)
+    if rng.random() < 0.7: text += f" https://t.co/{''.join(rng.choice(string.ascii_letters) for _ in range(10))}"
+    if rng.random() < 0.5: text = f"@{''.join(rng.choice(string.ascii_lowercase) for _ in range(8))} " + text
+    return text
+
+
+def make_stream(rng, tweet_count):
+    # [(tweet ID, text, campaign number or None)]
+    vocabulary = make_vocabulary(rng)
+    weights, total = [], 0.0
+    for rank in range(1, VOCABULARY_SIZE + 1):
+        total += 1.0 / rank
+        weights.append(total)
+    templates = [organic_text(rng, vocabulary, weights) for _ in range(CAMPAIGNS)]
+    stream = []
+    for tweet_id in range(tweet_count):
+        if rng.random() < CAMPAIGN_SHARE:
+            campaign = rng.randrange(CAMPAIGNS)
+            stream.append((tweet_id, campaign_copy(rng, templates[campaign], vocabulary), campaign))
+        else:
+            stream.append((tweet_id, organic_text(rng, vocabulary, weights), None))
+    return stream
+
+
+def score(stream, skipped):
+    # skipped: tweet ID -> ID of the tweet it was found to repeat. A skip is false unless both
+    # tweets belong to the same campaign. Copies are campaign tweets after the campaign's first.
+    campaigns = {tweet_id: campaign for tweet_id, _, campaign in stream}
+    seen, caught, copies, false_skips = set(), 0, 0, 0
+    for tweet_id, _, campaign in stream:
+        match_id = skipped.get(tweet_id)
+        if match_id is not None:
+            if campaign is not None and campaigns[match_id] == campaign: caught += 1
+            else: false_skips += 1
+        if campaign is not None:
+            copies += campaign in seen
+            seen.add(campaign)
+    return caught, copies, false_skips
+
+
+def run_index(stream, window, capacity, trace_memory=False):
+    # Returns ({skipped tweet ID: matched tweet ID}, seconds, bytes held by the index)
+    now = [0.0]
+    if trace_memory: tracemalloc.start()
+    index = NearDuplicateIndex(capacity=capacity, window=window, clock=lambda: now[0])
+    skipped = {}
+    start = perf_counter()
+    for position, (tweet_id, text, _) in enumerate(stream):
+        now[0] = position / TWEETS_PER_SECOND
+        match_id = index.check(text, tweet_id)
+        if match_id is not None: skipped[tweet_id] = match_id
+        else: index.remember_tweet(tweet_id) # as if the bot acted on every tweet it did not skip
+    seconds = perf_counter() - start
+    index_bytes = 0
+    if trace_memory:
+        del skipped, stream
+        index_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return None, seconds, index_bytes, len(index)
+    return skipped, seconds, index_bytes, len(index)
+
+
+def run_linear_scan(stream, threshold):
+    # Exact Jaccard against every remembered text: the O(n) per tweet baseline
+    remembered, skipped = [], {}
+    start = perf_counter()
+    for tweet_id, text, _ in stream:
+        features = text_features(text)
+        if features is None: continue
+        match_id = next((other_id for other_id, other in remembered if len(features & other) >= threshold * len(features | other)), None)
+        if match_id is not None: skipped[tweet_id] = match_id
+        else: remembered.append((tweet_id, features))
+    return skipped, perf_counter() - start
+
+
+def report(name, stream, skipped, seconds, extra=""):
+    caught, copies, false_skips = score(stream, skipped)
+    print(f"{name:<12} tweets={len(stream):>7,}  {seconds / len(stream) * 1e6:8.1f}us/tweet  "
+          f"caught={caught / max(copies, 1):6.1%} of {copies:,} copies  false skips={false_skips / len(stream):6.2%}{extra}")
+
+
+if __name__ == "__main__":
+    tweet_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    scan_count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    stream = make_stream(random.Random(1), tweet_count)
+    window_seconds, capacity = 6 * 3600, 10000
+
+    skipped, seconds, _, _ = run_index(stream, window_seconds, capacity)
+    _, _, index_bytes, entries = run_index(stream[:3 * capacity], window_seconds, capacity, trace_memory=True)
+    report("index", stream, skipped, seconds,
+           f"  memory={index_bytes / 2**20:4.1f}MiB for {entries:,} texts ({index_bytes / max(entries, 1):.0f}B each)")
+
+    prefix = stream[:scan_count]
+    skipped, seconds, _, _ = run_index(prefix, window_seconds, capacity)
+    report("index", prefix, skipped, seconds)
+    skipped, seconds = run_linear_scan(prefix, NearDuplicateIndex().threshold)
+    report("linear scan", prefix, skipped, seconds)
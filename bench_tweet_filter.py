@@ -0,0 +1,85 @@
+# bench_tweet_filter.py
+# Micro-benchmark: compiled TweetFilter vs. the original per-tweet linear scans.
+# Usage: python bench_tweet_filter.py [tweets_per_page] [pages]
+import random
+import string
+import sys
+from time import perf_counter
+from types import SimpleNamespace
+
+from tweet_filter import TweetFilter
+
+RULE_SIZES = (10_000, 100_000)
+TARGET_LANGUAGES = ["en", "es", "fr"]
+
+
+def random_word(rng, min_len=4, max_len=10):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(min_len, max_len)))
+
+
+def make_rules(rng, size):
+    keywords = [f"{random_word(rng)} {random_word(rng)}" for _ in range(size)]
+    usernames = {random_word(rng, 6, 14) for _ in range(size)}
+    return keywords, usernames
+
+
+def make_page(rng, page_size, keywords, usernames):
+    tweets, users = [], {}
+    blocked = list(usernames)
+    for i in range(page_size):
+        words = [random_word(rng) for _ in range(rng.randint(15, 40))]
+        roll = rng.random()
+        if roll < 0.05: words.insert(rng.randrange(len(words)), rng.choice(keywords))
+        author = rng.choice(blocked) if roll > 0.95 else random_word(rng, 6, 14)
+        lang = "de" if rng.random() < 0.05 else "en"
+        users[i] = {"id": i, "username": author}
+        tweets.append(SimpleNamespace(id=i, author_id=i, text=" ".join(words).title(), lang=lang))
+    return tweets, users
+
+
+def legacy_should_skip(tweet_text, tweet_author_username, tweet_lang, keywords, usernames):
+    # Copy of the pre-compiled should_skip_tweet_interactive logic, without logging
+    if TARGET_LANGUAGES and tweet_lang and tweet_lang.lower() not in [lang.lower() for lang in TARGET_LANGUAGES]:
+        return True
+    if any(keyword.lower() in tweet_text.lower() for keyword in keywords):
+        return True
+    if tweet_author_username.lower() in (name.lower() for name in usernames):
+        return True
+    return False
+
+
+def run(size, page_size, pages):
+    rng = random.Random(size)
+    keywords, usernames = make_rules(rng, size)
+    batches = [make_page(rng, page_size, keywords, usernames) for _ in range(pages)]
+    tweet_count = page_size * pages
+
+    start = perf_counter()
+    tweet_filter = TweetFilter(TARGET_LANGUAGES, keywords, usernames)
+    build_seconds = perf_counter() - start
+
+    start = perf_counter()
+    compiled_skips = 0
+    for tweets, users in batches:
+        compiled_skips += sum(1 for _, rule, _ in tweet_filter.filter_batch(tweets, users) if rule)
+    compiled_seconds = perf_counter() - start
+
+    start = perf_counter()
+    legacy_skips = 0
+    for tweets, users in batches:
+        for tweet in tweets:
+            if legacy_should_skip(tweet.text, users[tweet.author_id]["username"], tweet.lang, keywords, usernames):
+                legacy_skips += 1
+    legacy_seconds = perf_counter() - start
+
+    print(f"rules={size:>7,}  tweets={tweet_count:>5}  build={build_seconds * 1000:8.1f}ms  "
+          f"compiled={compiled_seconds / tweet_count * 1e6:9.1f}us/tweet  "
+          f"legacy={legacy_seconds / tweet_count * 1e6:10.1f}us/tweet  "
+          f"speedup={legacy_seconds / max(compiled_seconds, 1e-9):7.1f}x  skips={compiled_skips}/{legacy_skips}")
+
+
+if __name__ == "__main__":
+    page_size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    for rule_size in RULE_SIZES:
+        run(rule_size, page_size, pages)
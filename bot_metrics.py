@@ -0,0 +1,229 @@
+# bot_metrics.py
+# In-process metrics for the bot: counters, latency histograms and gauges, exposed in the
+# Prometheus text format on a small local HTTP endpoint and as a periodic summary log line.
+#
+# The bot records API calls (count by outcome, latency histogram per endpoint), actions,
+# skips by stage and reason, time spent in the persistence helpers and time spent sleeping.
+# Gauges such as the done-ID store sizes are read from callbacks when the metrics are
+# rendered. All recording methods are thread-safe (the async runtime calls tweepy from
+# worker threads). Times come from the injected clock, so virtual-clock runs report
+# simulated time.
+import logging
+import threading
+from time import time
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0) # seconds
+
+# name -> (type, help)
+METRIC_DEFINITIONS = {
+    "bot_uptime_seconds": ("gauge", "Seconds since the metrics were started."),
+    "bot_sleep_seconds_total": ("counter", "Seconds spent in countdown sleeps (pacing and rate limit waits)."),
+    "bot_api_requests_total": ("counter", "API requests by endpoint and outcome (ok, rate_limited, error)."),
+    "bot_api_request_seconds": ("histogram", "API request latency by endpoint."),
+    "bot_http_requests_total": ("counter", "HTTP attempts by endpoint and outcome, retries included (api_transport.py)."),
+    "bot_http_request_seconds": ("histogram", "HTTP attempt latency by endpoint."),
+    "bot_actions_total": ("counter", "Successful retweets, likes and follows."),
+    "bot_skips_total": ("counter", "Skipped tweets and actions by stage and reason."),
+    "bot_persistence_seconds": ("histogram", "Time spent in the state persistence helpers by operation."),
+    "bot_dedupe_ids": ("gauge", "IDs in the done-ID stores."),
+    "bot_candidates_buffered": ("gauge", "Candidates waiting in the buffer for an action slot."),
+    "bot_stream_events_total": ("counter", "Filtered-stream tweets, keep-alives and reconnects."),
+}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs: return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    __slots__ = ("bucket_counts", "sum", "count")
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1) # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = 0
+        while index < len(LATENCY_BUCKETS) and value > LATENCY_BUCKETS[index]: index += 1
+        self.bucket_counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation (the last finite bound for +Inf)
+        if not self.count: return 0.0
+        rank, seen = q * self.count, 0
+        for index, bucket_count in enumerate(self.bucket_counts):
+            seen += bucket_count
+            if seen >= rank: return LATENCY_BUCKETS[min(index, len(LATENCY_BUCKETS) - 1)]
+        return LATENCY_BUCKETS[-1]
+
+
+class MetricsRegistry:
+    def __init__(self, clock=time, summary_interval=15 * 60):
+        self.clock = clock
+        self.started_at = clock()
+        self.summary_interval = summary_interval
+        self.next_summary_at = self.started_at + summary_interval
+        self._counters = {}   # (name, label_key) -> value
+        self._histograms = {} # (name, label_key) -> Histogram
+        self._gauges = {}     # (name, label_key) -> value or callable() -> value
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None: histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def set_gauge(self, name, value, **labels):
+        # value may be a callable, read on every render()/summary()
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def record_api_call(self, endpoint, outcome, seconds):
+        self.inc("bot_api_requests_total", endpoint=endpoint, outcome=outcome)
+        self.observe("bot_api_request_seconds", seconds, endpoint=endpoint)
+
+    def record_http_attempt(self, endpoint, outcome, seconds):
+        # api_transport observer: one call per HTTP attempt, so retries show up next to the API calls
+        self.inc("bot_http_requests_total", endpoint=endpoint, outcome=outcome)
+        self.observe("bot_http_request_seconds", seconds, endpoint=endpoint)
+
+    def counter_total(self, name, **labels):
+        wanted = set(labels.items())
+        with self._lock:
+            return sum(value for (counter_name, label_key), value in self._counters.items()
+                       if counter_name == name and wanted <= set(label_key))
+
+    def _gauge_values(self):
+        with self._lock: gauges = list(self._gauges.items())
+        values = []
+        for key, value in gauges:
+            if callable(value):
+                try: value = value()
+                except Exception as e:
+                    logging.debug("Metrics gauge %s failed: %s", key[0], e)
+                    continue
+            values.append((key, value))
+        values.append((("bot_uptime_seconds", ()), self.clock() - self.started_at))
+        return values
+
+    def render(self):
+        # Prometheus text exposition format, version 0.0.4
+        samples = {name: [] for name in METRIC_DEFINITIONS}
+        gauge_values = self._gauge_values()
+        with self._lock:
+            for (name, label_key), value in sorted(self._counters.items()):
+                samples.setdefault(name, []).append(f"{name}{_format_labels(label_key)} {value}")
+            for (name, label_key), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                cumulative = 0
+                for bound, bucket_count in zip(LATENCY_BUCKETS + ("+Inf",), histogram.bucket_counts):
+                    cumulative += bucket_count
+                    samples.setdefault(name, []).append(f"{name}_bucket{_format_labels(label_key, [('le', bound)])} {cumulative}")
+                samples[name].append(f"{name}_sum{_format_labels(label_key)} {histogram.sum}")
+                samples[name].append(f"{name}_count{_format_labels(label_key)} {histogram.count}")
+        for (name, label_key), value in sorted(gauge_values, key=lambda item: item[0]):
+            samples.setdefault(name, []).append(f"{name}{_format_labels(label_key)} {value}")
+
+        lines = []
+        for name, name_samples in samples.items():
+            if not name_samples: continue
+            metric_type, help_text = METRIC_DEFINITIONS.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(name_samples)
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        # One line: where the wall-clock time went, per-endpoint request stats, actions, skips and gauges
+        uptime = max(self.clock() - self.started_at, 1e-9)
+        with self._lock:
+            slept = sum(value for (name, _), value in self._counters.items() if name == "bot_sleep_seconds_total")
+            api_histograms = {dict(label_key).get("endpoint"): histogram for (name, label_key), histogram in self._histograms.items()
+                              if name == "bot_api_request_seconds"}
+            persisted = sum(histogram.sum for (name, _), histogram in self._histograms.items() if name == "bot_persistence_seconds")
+            actions = {dict(label_key).get("action"): value for (name, label_key), value in self._counters.items() if name == "bot_actions_total"}
+            skips = sum(value for (name, _), value in self._counters.items() if name == "bot_skips_total")
+        api_seconds = sum(histogram.sum for histogram in api_histograms.values())
+        other = max(uptime - slept - api_seconds - persisted, 0.0)
+        parts = [f"uptime {uptime:.0f}s: sleeping {slept / uptime:.0%}, API {api_seconds / uptime:.0%}, "
+                 f"persistence {persisted / uptime:.0%}, other {other / uptime:.0%}"]
+        for endpoint, histogram in sorted(api_histograms.items()):
+            rate_limited = self.counter_total("bot_api_requests_total", endpoint=endpoint, outcome="rate_limited")
+            errors = self.counter_total("bot_api_requests_total", endpoint=endpoint, outcome="error")
+            parts.append(f"{endpoint} {histogram.count} req ({rate_limited} 429, {errors} err, "
+                         f"p50 {histogram.quantile(0.5)}s, p95 {histogram.quantile(0.95)}s)")
+        parts.append("actions " + (", ".join(f"{name} {count}" for name, count in sorted(actions.items())) or "none"))
+        parts.append(f"skips {skips}")
+        gauges = [f"{name}{_format_labels(label_key)}={value}" for (name, label_key), value in self._gauge_values()
+                  if name != "bot_uptime_seconds"]
+        if gauges: parts.append(" ".join(gauges))
+        return "Metrics - " + "; ".join(parts)
+
+    __str__ = summary # as a log argument, the summary is only built if the record is emitted
+
+    def maybe_log_summary(self):
+        now = self.clock()
+        if now < self.next_summary_at: return False
+        self.next_summary_at = now + self.summary_interval
+        logging.info("%s", self)
+        return True
+
+
+def make_handler(registry):
+    from http.server import BaseHTTPRequestHandler # only bots that serve metrics pay for importing http.server
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            content = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass # scrapes would flood the bot log
+
+    return MetricsHandler
+
+
+class MetricsServer:
+    # ThreadingHTTPServer serving registry.render() on /metrics, from a daemon thread
+    def __init__(self, registry, host="127.0.0.1", port=0):
+        from http.server import ThreadingHTTPServer
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(registry))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,131 @@
+# candidate_buffer.py
+# Bounded, per-action priority buffer of tweets/users waiting for a rate limited action slot.
+#
+# Instead of dropping a tweet when its action type is in cooldown, the bot buffers it here
+# with a score built from its public_metrics, its age and its author, and spends the next free
+# slot on the best candidate. Scores decay exponentially with tweet age; because every candidate
+# decays at the same rate, their relative order never changes, so each candidate gets a fixed
+# heap priority of log2(base_score) + created_at / half_life when it is pushed.
+# An optional journal (query_packer.QuerySinceIds) is told about every candidate that enters or
+# leaves the buffer, so the buffer survives a restart.
+import heapq
+import math
+from itertools import count
+from time import time
+
+# Weighted engagement from the tweet's public_metrics
+ENGAGEMENT_WEIGHTS = {
+    "like_count": 1.0,
+    "retweet_count": 2.0,
+    "reply_count": 1.5,
+    "quote_count": 2.0,
+}
+VERIFIED_AUTHOR_BOOST = 1.5
+
+
+def base_score(tweet, author=None):
+    # Age-independent value of acting on a tweet (or on its author)
+    metrics = getattr(tweet, 'public_metrics', None) or {}
+    engagement = sum(metrics.get(name, 0) * weight for name, weight in ENGAGEMENT_WEIGHTS.items())
+    score = 1.0 + math.log1p(engagement)
+    if author is not None and author.get("verified"):
+        score *= VERIFIED_AUTHOR_BOOST
+    return score
+
+
+def tweet_timestamp(tweet, default=None):
+    created_at = getattr(tweet, 'created_at', None)
+    if created_at is None: return default if default is not None else time()
+    return created_at.timestamp()
+
+
+class Candidate:
+    __slots__ = ("action_name", "target_id", "action_args", "base_score", "created_at", "priority", "removed")
+
+    def __init__(self, action_name, target_id, action_args, base_score, created_at, priority):
+        self.action_name = action_name
+        self.target_id = target_id
+        self.action_args = action_args
+        self.base_score = base_score
+        self.created_at = created_at
+        self.priority = priority
+        self.removed = False
+
+    def score(self, half_life_seconds, now=None):
+        # Current decayed score, for logging
+        age = max(0.0, (now if now is not None else time()) - self.created_at)
+        return self.base_score * 0.5 ** (age / half_life_seconds)
+
+
+class CandidateBuffer:
+    def __init__(self, capacity_per_action=200, max_age_seconds=6 * 3600, half_life_seconds=3600, clock=time, journal=None):
+        self.capacity_per_action = capacity_per_action
+        self.max_age_seconds = max_age_seconds
+        self.half_life_seconds = half_life_seconds
+        self.clock = clock
+        self.journal = journal # record_candidate(action_name, target_id, action_args, score, created_at) / record_removed(action_name, target_id)
+        self._heaps = {}    # action -> [(-priority, seq, candidate)], lazily cleaned
+        self._entries = {}  # action -> {target_id: candidate}
+        self._sequence = count()
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._entries.values())
+
+    def size(self, action_name):
+        return len(self._entries.get(action_name, ()))
+
+    def push(self, action_name, target_id, action_args, score, created_at=None):
+        # Returns False if the candidate was not kept (stale, or worse than a full buffer's worst entry)
+        now = self.clock()
+        created_at = created_at if created_at is not None else now
+        if now - created_at > self.max_age_seconds: return False
+        priority = math.log2(max(score, 1e-9)) + created_at / self.half_life_seconds
+        entries = self._entries.setdefault(action_name, {})
+        heap = self._heaps.setdefault(action_name, [])
+
+        existing = entries.get(target_id)
+        if existing is not None:
+            if existing.priority >= priority: return True
+            existing.removed = True # Same target surfaced again with a better score: replace it
+        elif len(entries) >= self.capacity_per_action:
+            worst = min(entries.values(), key=lambda candidate: candidate.priority)
+            if worst.priority >= priority: return False
+            self._remove(worst)
+
+        candidate = Candidate(action_name, target_id, action_args, score, created_at, priority)
+        entries[target_id] = candidate
+        heapq.heappush(heap, (-priority, next(self._sequence), candidate))
+        if len(heap) > 2 * self.capacity_per_action + 16: self._rebuild(action_name)
+        if self.journal is not None: self.journal.record_candidate(action_name, target_id, action_args, score, created_at)
+        return True
+
+    def pop_best(self, action_name):
+        # Highest value, non-stale candidate for the action, or None
+        self.evict_stale(action_name)
+        heap = self._heaps.get(action_name)
+        while heap:
+            _, _, candidate = heapq.heappop(heap)
+            if candidate.removed: continue
+            del self._entries[action_name][candidate.target_id]
+            if self.journal is not None: self.journal.record_removed(action_name, candidate.target_id)
+            return candidate
+        return None
+
+    def evict_stale(self, action_name=None):
+        cutoff = self.clock() - self.max_age_seconds
+        evicted = 0
+        for name in ([action_name] if action_name is not None else list(self._entries)):
+            for candidate in [c for c in self._entries.get(name, {}).values() if c.created_at < cutoff]:
+                self._remove(candidate)
+                evicted += 1
+        return evicted
+
+    def _remove(self, candidate):
+        candidate.removed = True
+        del self._entries[candidate.action_name][candidate.target_id]
+        if self.journal is not None: self.journal.record_removed(candidate.action_name, candidate.target_id)
+
+    def _rebuild(self, action_name):
+        live = [entry for entry in self._heaps[action_name] if not entry[2].removed]
+        heapq.heapify(live)
+        self._heaps[action_name] = live
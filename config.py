@@ -2,6 +2,10 @@
 
 # --- Search Configuration ---
 QUERY = '#alxafrica' # Your primary search query
+# Plan each search's timing and page size from the observed tweet arrival rate (see README).
+# The two fixed intervals below then only apply until a rate is known.
+ADAPTIVE_SEARCH = True
+SEARCH_INTERVAL_MAX = 1800 # longest wait between searches of a quiet query (seconds)
 # How often to attempt a new search if the previous one found tweets (seconds)
 # Must be >= 905 for Free Tier search (1 req / 15 mins)
 SEARCH_INTERVAL_SUCCESS = 905  # 15 minutes + 5s buffer
@@ -20,9 +24,8 @@ LIKE_COOLDOWN_SECONDS = 15 * 60 + 15   # 915s (~15 minutes)
 FOLLOW_COOLDOWN_SECONDS = 15 * 60 + 20 # 920s (~15 minutes)
 RETWEET_COOLDOWN_SECONDS = 15 * 60 + 10 # 910s (~15 minutes - adjust based on observation)
 
-# Sleep between processing individual tweets found in ONE search batch
-SLEEP_BETWEEN_BATCH_ACTIONS = 60 # seconds (if an API-calling action was ATTEMPTED)
-SHORT_SLEEP_IF_NO_ACTIONS = 10   # seconds (if only filtering/skipping occurred for a tweet)
+# Sleep after each API-calling action attempt
+SLEEP_BETWEEN_BATCH_ACTIONS = 60 # seconds
 
 # --- User Filtering ---
 # Bot will not interact with tweets from these users (case-insensitive usernames)
@@ -0,0 +1,120 @@
+# history_sync.py
+# Warms the done-ID stores from the account's own history on the API, so like/retweet/follow
+# quota is not spent on targets the account already liked, retweeted or follows (a new host,
+# lost state files, actions taken outside the bot).
+#
+# Three sources are paged at their maximum page size: the following list (1000 per page),
+# liked tweets (100) and the account's recent tweets (100, where retweets are recognised by a
+# "retweeted" reference; the API only returns the latest 3200). Each page is added to its
+# store with one add_many(). All three lists come newest first, so after a complete pass an
+# incremental refresh stops at the first page with nothing new. maybe_refresh() runs one
+# every refresh_interval seconds of the injected clock, so the runtimes can call it between
+# actions. A pass that runs out of rate budget remembers its pagination token; the next
+# refresh continues from there.
+import logging
+import threading
+from time import time
+
+import tweepy
+
+# action -> (budget/metrics endpoint name, page size)
+HISTORY_SOURCES = {
+    "follow": ("following_lookup", 1000),
+    "like": ("liked_tweets", 100),
+    "retweet": ("user_tweets", 100),
+}
+
+
+def fetch_history_page(client, action, user_id, pagination_token=None):
+    # Returns (target IDs on the page, next pagination token or None)
+    _, max_results = HISTORY_SOURCES[action]
+    if action == "follow":
+        response = client.get_users_following(user_id, max_results=max_results, pagination_token=pagination_token, user_auth=True)
+        target_ids = [user.id for user in response.data or []]
+    elif action == "like":
+        response = client.get_liked_tweets(user_id, max_results=max_results, pagination_token=pagination_token, user_auth=True)
+        target_ids = [tweet.id for tweet in response.data or []]
+    else:
+        response = client.get_users_tweets(user_id, max_results=max_results, pagination_token=pagination_token,
+                                           tweet_fields=["referenced_tweets"], user_auth=True)
+        target_ids = [int(ref.id) for tweet in response.data or [] for ref in tweet.referenced_tweets or [] if ref.type == "retweeted"]
+    return target_ids, (response.meta or {}).get("next_token")
+
+
+class HistorySync:
+    def __init__(self, client, user_id, stores, rate_budget=None, metrics=None, refresh_interval=300, clock=time):
+        # stores: action -> done-ID store with add_many() (IdStore or SharedActionHistory)
+        self.client = client
+        self.user_id = user_id
+        self.stores = {action: store for action, store in stores.items() if action in HISTORY_SOURCES}
+        self.rate_budget = rate_budget
+        self.metrics = metrics
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self.next_refresh_at = None # set by the first sync()
+        self.complete = set()    # actions whose history has been paged to the end once
+        self.resume_tokens = {}  # action -> pagination token where an interrupted full pass continues
+        self.unavailable = set() # actions whose endpoint this account's API tier does not offer
+        self._lock = threading.Lock() # one pass at a time (the async runtime refreshes from a worker thread)
+
+    def sync(self):
+        # One pass per source: resumes an unfinished full pass, otherwise refreshes incrementally.
+        # Returns {action: IDs added}.
+        added = {}
+        with self._lock:
+            for action in self.stores:
+                if action in self.unavailable: continue
+                added[action] = self._sync_source(action)
+            self.next_refresh_at = self.clock() + self.refresh_interval
+        return added
+
+    def maybe_refresh(self):
+        # Returns {action: IDs added}, or None if no refresh was due
+        if self.next_refresh_at is None or self.clock() < self.next_refresh_at: return None
+        return self.sync()
+
+    def _sync_source(self, action):
+        endpoint, _ = HISTORY_SOURCES[action]
+        store = self.stores[action]
+        full_pass = action not in self.complete
+        token = self.resume_tokens.pop(action, None) if full_pass else None
+        added = pages = 0
+        while True:
+            if self.rate_budget is not None and self.rate_budget.wait_time(endpoint) > 0:
+                if full_pass: self.resume_tokens[action] = token
+                logging.info("History sync of %s paused after %s pages: %s", endpoint, pages, self.rate_budget.describe(endpoint))
+                break
+            started_at = self.clock()
+            try:
+                target_ids, token = fetch_history_page(self.client, action, self.user_id, token)
+            except tweepy.TooManyRequests as tmr:
+                self._record(endpoint, "rate_limited", started_at)
+                if self.rate_budget is not None: self.rate_budget.record_rate_limited(endpoint, getattr(tmr.response, 'headers', None))
+                if full_pass: self.resume_tokens[action] = token
+                logging.warning("History sync of %s rate limited after %s pages.", endpoint, pages)
+                break
+            except (tweepy.Forbidden, tweepy.Unauthorized) as e:
+                self._record(endpoint, "error", started_at)
+                self.unavailable.add(action)
+                logging.warning("History sync of %s is not available for this account (%s); relying on the local %s history.", endpoint, e, action)
+                break
+            except tweepy.TweepyException as e:
+                self._record(endpoint, "error", started_at)
+                if full_pass: self.resume_tokens[action] = token
+                logging.warning("History sync of %s failed after %s pages: %s", endpoint, pages, e)
+                break
+            self._record(endpoint, "ok", started_at)
+            if self.rate_budget is not None: self.rate_budget.spend(endpoint)
+            pages += 1
+            page_added = store.add_many(target_ids) if target_ids else 0
+            added += page_added
+            if not token:
+                self.complete.add(action)
+                break
+            if not full_pass and not page_added: break # newest first: the rest is already known
+        if (added or full_pass) and action not in self.unavailable:
+            logging.info("History sync of %s: %s pages, %s new %s IDs (%s known).", endpoint, pages, added, action, len(store))
+        return added
+
+    def _record(self, endpoint, outcome, started_at):
+        if self.metrics is not None: self.metrics.record_api_call(endpoint, outcome, self.clock() - started_at)
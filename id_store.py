@@ -0,0 +1,273 @@
+# id_store.py
+# Compact on-disk set of uint64 IDs (tweet or user IDs) used for the liked/retweeted/followed history.
+#
+# Layout for a store named <base>:
+#   <base>.idx    sorted native-endian uint64 array, memory-mapped and binary searched
+#   <base>.bloom  Bloom filter over the .idx contents (header: num_bits, num_hashes)
+#   <base>.tail   append-only uint64 records added since the last compaction
+# The tail is small and kept in memory; compaction merges it into a new .idx/.bloom pair
+# which is swapped in atomically with os.replace(). The merge streams the mapped index in
+# fixed-size chunks, so compaction memory does not grow with the number of stored IDs.
+import logging
+import mmap
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from heapq import merge
+
+ID_RECORD = struct.Struct("=Q")
+BLOOM_HEADER = struct.Struct("=QQ")
+MASK64 = (1 << 64) - 1
+DEFAULT_BLOOM_BITS_PER_ID = 10
+DEFAULT_BLOOM_HASHES = 7
+MIN_BLOOM_BITS = 8 * 1024
+WRITE_CHUNK_IDS = 64 * 1024
+
+
+def _bloom_positions(item_id, num_bits, num_hashes):
+    # Kirsch-Mitzenmacher double hashing from two 64-bit mixes of the ID
+    h1 = (item_id * 0x9E3779B97F4A7C15) & MASK64
+    h2 = (((item_id ^ (item_id >> 31)) * 0xBF58476D1CE4E5B9) & MASK64) | 1
+    return [((h1 + i * h2) & MASK64) % num_bits for i in range(num_hashes)]
+
+
+def _iter_index(index, chunk_ids=WRITE_CHUNK_IDS):
+    # The IDs of a mapped uint64 index, converted to ints one chunk at a time
+    for start in range(0, len(index), chunk_ids):
+        yield from index[start:start + chunk_ids].tolist()
+
+
+def _map_file(path):
+    # Read-only mapping of a file, or None for a missing/empty file (mmap rejects length 0)
+    if not os.path.exists(path) or os.path.getsize(path) == 0: return None, None
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mapped, memoryview(mapped)
+
+
+class IdStore:
+    def __init__(self, base_path, legacy_text_file=None, bloom_bits_per_id=DEFAULT_BLOOM_BITS_PER_ID, bloom_hashes=DEFAULT_BLOOM_HASHES):
+        self.base_path = base_path
+        self.index_path = base_path + ".idx"
+        self.bloom_path = base_path + ".bloom"
+        self.tail_path = base_path + ".tail"
+        self.bloom_bits_per_id = bloom_bits_per_id
+        self.bloom_hashes = bloom_hashes
+        self._lock = threading.RLock()
+        self._compaction_lock = threading.Lock() # one compaction at a time: the merge reads the mapped index unlocked
+        self._compaction_thread = None
+        self._stop_compaction = threading.Event()
+        self._index_map = self._index = None
+        self._bloom_map = self._bloom = None
+        self._bloom_bits = 0
+        self._bloom_k = 0
+
+        if legacy_text_file and not os.path.exists(self.index_path) and not os.path.exists(self.tail_path):
+            self._import_text_file(legacy_text_file)
+        self._open_index()
+        self._tail = self._load_tail()
+        self._tail_file = open(self.tail_path, 'ab')
+
+    # --- Set-like interface used by the action functions ---
+    def __contains__(self, item_id):
+        item_id = int(item_id)
+        with self._lock:
+            if item_id in self._tail: return True
+            return self._index_contains(item_id)
+
+    contains = __contains__
+
+    def __len__(self):
+        with self._lock:
+            return (len(self._index) if self._index is not None else 0) + len(self._tail)
+
+    def add(self, item_id):
+        # Persists immediately (one 8-byte append); returns False if the ID was already present
+        item_id = int(item_id)
+        with self._lock:
+            if item_id in self._tail or self._index_contains(item_id): return False
+            self._tail_file.write(ID_RECORD.pack(item_id))
+            self._tail_file.flush()
+            self._tail.add(item_id)
+            return True
+
+    def add_many(self, item_ids):
+        # Bulk insert with a single write; returns how many IDs were new
+        with self._lock:
+            new_ids = []
+            for item_id in item_ids:
+                item_id = int(item_id)
+                if item_id in self._tail or self._index_contains(item_id): continue
+                self._tail.add(item_id)
+                new_ids.append(item_id)
+            if new_ids:
+                self._tail_file.write(array('Q', new_ids).tobytes())
+                self._tail_file.flush()
+            return len(new_ids)
+
+    def tail_size(self):
+        with self._lock:
+            return len(self._tail)
+
+    # --- Lookup internals ---
+    def _index_contains(self, item_id):
+        if self._index is None: return False
+        if self._bloom is not None:
+            bloom = self._bloom
+            for position in _bloom_positions(item_id, self._bloom_bits, self._bloom_k):
+                if not bloom[BLOOM_HEADER.size + (position >> 3)] & (1 << (position & 7)):
+                    return False
+        index = self._index
+        position = bisect_left(index, item_id)
+        return position < len(index) and index[position] == item_id
+
+    def _open_index(self):
+        self._index_map, raw_index = _map_file(self.index_path)
+        self._index = raw_index.cast('Q') if raw_index is not None else None
+        self._bloom_map, self._bloom = _map_file(self.bloom_path)
+        if self._bloom is not None and len(self._bloom) >= BLOOM_HEADER.size:
+            self._bloom_bits, self._bloom_k = BLOOM_HEADER.unpack_from(self._bloom, 0)
+            if not self._bloom_bits or len(self._bloom) < BLOOM_HEADER.size + (self._bloom_bits + 7) // 8:
+                logging.warning("Ignoring malformed Bloom filter %s; falling back to binary search only.", self.bloom_path)
+                self._release(self._bloom_map, self._bloom)
+                self._bloom_map = self._bloom = None
+        else:
+            self._bloom_map = self._bloom = None
+
+    def _close_index(self):
+        if self._index is not None:
+            self._index.release()
+        self._release(self._index_map, None)
+        self._release(self._bloom_map, self._bloom)
+        self._index_map = self._index = None
+        self._bloom_map = self._bloom = None
+
+    @staticmethod
+    def _release(mapped, view):
+        if view is not None: view.release()
+        if mapped is not None: mapped.close()
+
+    def _load_tail(self):
+        if not os.path.exists(self.tail_path): return set()
+        with open(self.tail_path, 'rb') as f: raw = f.read()
+        torn_bytes = len(raw) % ID_RECORD.size
+        if torn_bytes:
+            # A crash mid-append leaves a partial record; drop it so later appends stay aligned
+            logging.warning("Truncating %s trailing bytes of a partial record in %s.", torn_bytes, self.tail_path)
+            raw = raw[:-torn_bytes]
+            with open(self.tail_path, 'r+b') as f: f.truncate(len(raw))
+        tail_ids = array('Q')
+        tail_ids.frombytes(raw)
+        return set(tail_ids)
+
+    # --- Building index files ---
+    def _write_index_files(self, sorted_ids, count):
+        # Streams an ascending iterator of unique IDs into temp .idx/.bloom files and returns their paths
+        num_bits = max(MIN_BLOOM_BITS, count * self.bloom_bits_per_id)
+        bloom_bits = bytearray(BLOOM_HEADER.pack(num_bits, self.bloom_hashes)) + bytearray((num_bits + 7) // 8)
+        index_tmp = self.index_path + ".tmp"
+        bloom_tmp = self.bloom_path + ".tmp"
+        header_size, hash_range = BLOOM_HEADER.size, range(self.bloom_hashes)
+        with open(index_tmp, 'wb') as f:
+            chunk = array('Q')
+            for item_id in sorted_ids:
+                chunk.append(item_id)
+                # Inlined _bloom_positions(); this loop runs once per stored ID
+                h1 = (item_id * 0x9E3779B97F4A7C15) & MASK64
+                h2 = (((item_id ^ (item_id >> 31)) * 0xBF58476D1CE4E5B9) & MASK64) | 1
+                for i in hash_range:
+                    position = ((h1 + i * h2) & MASK64) % num_bits
+                    bloom_bits[header_size + (position >> 3)] |= 1 << (position & 7)
+                if len(chunk) >= WRITE_CHUNK_IDS:
+                    f.write(chunk.tobytes())
+                    chunk = array('Q')
+            f.write(chunk.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(bloom_tmp, 'wb') as f:
+            f.write(bloom_bits)
+            f.flush()
+            os.fsync(f.fileno())
+        return index_tmp, bloom_tmp
+
+    def _import_text_file(self, legacy_text_file):
+        if not os.path.exists(legacy_text_file): return
+        imported = set()
+        skipped_lines = 0
+        try:
+            with open(legacy_text_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line: continue
+                    if line.isdigit(): imported.add(int(line))
+                    else: skipped_lines += 1
+        except Exception as e:
+            logging.error("Error importing IDs from %s: %s", legacy_text_file, e)
+            return
+        index_tmp, bloom_tmp = self._write_index_files(iter(sorted(imported)), len(imported))
+        os.replace(bloom_tmp, self.bloom_path)
+        os.replace(index_tmp, self.index_path)
+        logging.info("Imported %s IDs from %s into %s%s", len(imported), legacy_text_file, self.index_path,
+                     f" ({skipped_lines} non-numeric lines skipped)." if skipped_lines else ".")
+
+    # --- Compaction ---
+    def compact(self):
+        with self._compaction_lock:
+            return self._compact()
+
+    def _compact(self):
+        # Merges the tail into the sorted index. The merge runs outside the lock; IDs added
+        # meanwhile stay in the tail and are carried over to the new tail file. Only a
+        # compaction replaces the mapped index, so it can be read without the lock.
+        with self._lock:
+            snapshot = sorted(self._tail)
+            if not snapshot: return 0
+            index = self._index
+        index_count = len(index) if index is not None else 0
+        merged_count = index_count + len(snapshot)
+        index_ids = _iter_index(index) if index is not None else iter(())
+        index_tmp, bloom_tmp = self._write_index_files(merge(index_ids, snapshot), merged_count)
+        with self._lock:
+            carried_over = self._tail.difference(snapshot)
+            self._close_index()
+            self._tail_file.close()
+            os.replace(bloom_tmp, self.bloom_path)
+            os.replace(index_tmp, self.index_path)
+            tail_tmp = self.tail_path + ".tmp"
+            with open(tail_tmp, 'wb') as f:
+                f.write(array('Q', sorted(carried_over)).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tail_tmp, self.tail_path)
+            self._open_index()
+            self._tail = carried_over
+            self._tail_file = open(self.tail_path, 'ab')
+        logging.info("Compacted %s: %s tail IDs merged, %s IDs in index.", self.base_path, len(snapshot), merged_count)
+        return len(snapshot)
+
+    def start_background_compaction(self, interval_seconds=300, min_tail_ids=1000):
+        if self._compaction_thread is not None: return
+        self._stop_compaction.clear()
+        self._compaction_thread = threading.Thread(target=self._compaction_worker, args=(interval_seconds, min_tail_ids),
+                                                   name=f"compact:{os.path.basename(self.base_path)}", daemon=True)
+        self._compaction_thread.start()
+
+    def _compaction_worker(self, interval_seconds, min_tail_ids):
+        while not self._stop_compaction.wait(interval_seconds):
+            try:
+                if self.tail_size() >= min_tail_ids: self.compact()
+            except Exception as e:
+                logging.error("Background compaction of %s failed: %s", self.base_path, e)
+
+    def close(self):
+        if self._compaction_thread is not None:
+            self._stop_compaction.set()
+            self._compaction_thread.join()
+            self._compaction_thread = None
+        with self._lock:
+            if not self._tail_file.closed:
+                self._tail_file.flush()
+                self._tail_file.close()
+            self._close_index()
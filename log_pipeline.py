@@ -0,0 +1,49 @@
+# log_pipeline.py
+# Non-blocking logging: the root logger only puts records on a queue, and a QueueListener
+# thread does the formatting and the file/console writes.
+#
+# A call like logging.info("Liked %s", tweet_id) on the bot's threads now costs a level check
+# and a queue put. The %-style message is built once, and only for records that pass the
+# level. Rotation, disk flushes and a slow terminal are all handled on the listener thread.
+# JsonLinesFormatter writes one compact JSON object per record, for log shippers.
+import json
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+TEXT_LOG_FORMAT = "%(asctime)s [%(levelname)s] - %(message)s"
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"time": self.formatTime(record), "level": record.levelname, "process": record.processName,
+                 "thread": record.threadName, "message": record.getMessage()}
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+
+def make_formatter(json_lines=False, text_format=TEXT_LOG_FORMAT):
+    return JsonLinesFormatter() if json_lines else logging.Formatter(text_format)
+
+
+def start_log_pipeline(handlers, level=logging.INFO):
+    # Replaces the root logger's handlers with a QueueHandler feeding `handlers` on a listener thread
+    log_queue = queue.SimpleQueue()
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+        handler.close()
+    root_logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def stop_log_pipeline(listener):
+    # Flushes everything still queued, then closes the listener's handlers
+    if listener is None or listener._thread is None: return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
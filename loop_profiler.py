@@ -0,0 +1,142 @@
+# loop_profiler.py
+# Profiling mode for the bot's main loop (--profile DIR): CPU profiles, memory growth and
+# time per stage, per block of loop iterations.
+#
+# The bot calls next_iteration() at the top of every loop iteration (a search round, a batch
+# of streamed tweets) and wraps its work in stage("search" / "filter" / "actions" /
+# "persistence" / "sleep"). Every `every` iterations, and when the session ends, the profiler
+# writes to `directory`:
+#   profile_<iteration>.pstats     cProfile stats for the block (python -m pstats, snakeviz, gprof2dot)
+#   profile_<iteration>.txt        the top functions by cumulative time
+#   memory_<iteration>.tracemalloc tracemalloc snapshot (tracemalloc.Snapshot.load())
+#   memory_<iteration>.txt         allocation growth by line since the previous dump and since the start,
+#                                  e.g. ID stores or the users/original_tweets_data dicts that keep growing
+# and it appends one JSON line per iteration to stages.jsonl: wall time, seconds and calls per
+# stage, and traced memory. Stage times use the real perf_counter clock, also on a virtual clock.
+# cProfile only sees the thread that called start(); stage timings come from every thread.
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from time import perf_counter
+
+TRACEMALLOC_FRAMES = 4 # frames kept per allocation; the reports group by the innermost one
+TOP_ENTRIES = 25
+IGNORED_ALLOCATIONS = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                       tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"), tracemalloc.Filter(False, "<unknown>"))
+
+
+class LoopProfiler:
+    def __init__(self, directory, every=10, top=TOP_ENTRIES):
+        self.directory = directory
+        self.every = max(1, every)
+        self.top = top
+        self.iteration = 0
+        self._profile = None
+        self._lock = threading.Lock()
+        self._stage_seconds = {} # stage -> seconds in the current iteration
+        self._stage_calls = {}
+        self._block_seconds = {} # stage -> seconds since the last dump
+        self._iteration_started_at = None
+        self._first_snapshot = None
+        self._last_snapshot = None
+        self._last_dump_iteration = 0
+        self._started_tracemalloc = False
+        os.makedirs(directory, exist_ok=True)
+        self._stages_file = open(os.path.join(directory, "stages.jsonl"), 'a', encoding='utf-8')
+
+    def start(self):
+        # Profiles the calling thread from now on; a second call (e.g. after a stream fallback) is a no-op
+        if self._profile is not None: return self
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        self._first_snapshot = self._last_snapshot = self._take_snapshot()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        logging.info("Profiling the main loop into %s (dump every %s iterations).", self.directory, self.every)
+        return self
+
+    @contextmanager
+    def stage(self, name):
+        started_at = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - started_at
+            with self._lock:
+                self._stage_seconds[name] = self._stage_seconds.get(name, 0.0) + elapsed
+                self._stage_calls[name] = self._stage_calls.get(name, 0) + 1
+
+    def next_iteration(self):
+        # Ends the iteration in progress (if any) and starts the next one
+        now = perf_counter()
+        if self._iteration_started_at is not None:
+            self._record_iteration(now)
+            if self.iteration - self._last_dump_iteration >= self.every: self.dump()
+        self.iteration += 1
+        self._iteration_started_at = perf_counter()
+
+    def stop(self):
+        if self._profile is None: return
+        if self._iteration_started_at is not None: self._record_iteration(perf_counter())
+        self._iteration_started_at = None
+        if self.iteration > self._last_dump_iteration: self.dump()
+        self._profile.disable()
+        self._profile = None
+        if self._started_tracemalloc: tracemalloc.stop()
+        self._stages_file.close()
+
+    def dump(self):
+        # Writes the block's CPU profile and memory diff, then starts a fresh CPU profile
+        profile_path, memory_path = (os.path.join(self.directory, f"{kind}_{self.iteration:06d}") for kind in ("profile", "memory"))
+        self._profile.disable()
+        self._profile.dump_stats(profile_path + ".pstats")
+        report = io.StringIO()
+        pstats.Stats(self._profile, stream=report).sort_stats("cumulative").print_stats(self.top)
+        with open(profile_path + ".txt", 'w', encoding='utf-8') as f: f.write(report.getvalue())
+
+        snapshot = self._take_snapshot()
+        snapshot.dump(memory_path + ".tracemalloc")
+        since_last = snapshot.compare_to(self._last_snapshot, "lineno")
+        since_start = snapshot.compare_to(self._first_snapshot, "lineno")
+        traced, peak = tracemalloc.get_traced_memory()
+        with open(memory_path + ".txt", 'w', encoding='utf-8') as f:
+            f.write(f"Traced memory after iteration {self.iteration}: {traced / 2**20:.1f} MiB (peak {peak / 2**20:.1f} MiB)\n")
+            for title, differences in ((f"since iteration {self._last_dump_iteration}", since_last), ("since the start", since_start)):
+                f.write(f"\nTop {self.top} allocation sites by growth {title}:\n")
+                for difference in differences[:self.top]: f.write(f"{difference}\n")
+        growth = sum(difference.size_diff for difference in since_last)
+        stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in sorted(self._block_seconds.items(), key=lambda item: -item[1]))
+        logging.info("Profile dump at iteration %s: stages %s; traced memory %.1f MiB (%+.2f MiB since iteration %s); top growth: %s; wrote %s.* and %s.*",
+                     self.iteration, stages or 'none', traced / 2**20, growth / 2**20, self._last_dump_iteration,
+                     self._describe(since_last[0]) if since_last else 'none', profile_path, memory_path)
+        self._last_snapshot = snapshot
+        self._last_dump_iteration = self.iteration
+        self._block_seconds = {}
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def _record_iteration(self, now):
+        with self._lock:
+            stage_seconds, stage_calls = self._stage_seconds, self._stage_calls
+            self._stage_seconds, self._stage_calls = {}, {}
+        for name, seconds in stage_seconds.items(): self._block_seconds[name] = self._block_seconds.get(name, 0.0) + seconds
+        entry = {"iteration": self.iteration, "wall_seconds": round(now - self._iteration_started_at, 6),
+                 "stage_seconds": {name: round(seconds, 6) for name, seconds in stage_seconds.items()},
+                 "stage_calls": stage_calls, "traced_bytes": tracemalloc.get_traced_memory()[0]}
+        self._stages_file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._stages_file.flush()
+
+    def _take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(IGNORED_ALLOCATIONS)
+
+    @staticmethod
+    def _describe(difference):
+        frame = difference.traceback[0]
+        return f"{os.path.basename(frame.filename)}:{frame.lineno} {difference.size_diff / 1024:+.1f} KiB"
@@ -0,0 +1,473 @@
+# mock_twitter_api.py
+# Local stand-in for the Twitter API v2 endpoints the bot calls, for offline runs and benchmarks.
+#
+# Serves GET /2/users/me, GET /2/tweets/search/recent, POST /2/users/:id/retweets,
+# POST /2/users/:id/likes and POST /2/users/:id/following, plus the account history reads
+# GET /2/users/:id/following, /liked_tweets and /tweets (newest first), and the filtered stream
+# GET /2/tweets/search/stream with its rules endpoint. Tiers without these get a 403. The
+# stream sends every new tweet to all rules, just as search ignores its query. Between tweets
+# it sends a keep-alive every stream_heartbeat seconds, paced with `sleep`, so run it on the
+# real clock. stream_disconnect_after closes connections to exercise reconnects. history_ratio marks that share of new tweets as already liked and retweeted and
+# their authors as followed, as if the account's owner had acted on them outside the bot.
+# Search results come from a synthetic
+# stream of tweets (Poisson arrivals, RTs, spam and foreign language tweets, snowflake IDs),
+# generated lazily up to the current time. Each endpoint has a fixed 15-minute window and
+# an optional 24-hour user window. Both are reported in x-rate-limit-* / x-user-limit-24hour-*
+# headers and enforced with 429s. Request latency and extra random 429s are configurable.
+# With a virtual_clock.VirtualClock as clock (and its advance() as sleep), hours of API
+# time pass in seconds. Search honours since_id, until_id, next_token and start_time/end_time;
+# history_hours sets how far back tweets exist when the mock starts.
+#
+# Usage: python mock_twitter_api.py [--port 8080] [--tier free|basic|pro] [--tweets-per-hour 120]
+#        then run the bot with --api-base-url http://127.0.0.1:8080. Any credentials work, but
+#        the access token must start with "999-" (tweepy reads the user ID from it).
+import argparse
+import json
+import math
+import random
+import re
+import threading
+from collections import deque
+from itertools import islice
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep, time
+from types import GeneratorType
+from urllib.parse import parse_qs, urlparse
+
+# Endpoint -> (requests per 15-minute window, requests per 24 hours or None). Approximate per-user limits.
+RATE_LIMIT_TIERS = {
+    "free": {"search": (1, None), "retweet": (1, 17), "like": (1, 17), "follow": (1, 17), "me": (25, None)},
+    "basic": {"search": (60, None), "retweet": (5, 300), "like": (50, 200), "follow": (5, 400), "me": (75, None),
+              "following_lookup": (5, None), "liked_tweets": (5, None), "user_tweets": (10, None)},
+    "pro": {"search": (300, None), "retweet": (50, 300), "like": (50, 1000), "follow": (50, 400), "me": (75, None),
+            "following_lookup": (15, None), "liked_tweets": (75, None), "user_tweets": (900, None),
+            "stream": (50, None), "stream_rules": (450, None)},
+}
+# History endpoint -> (action whose targets it lists, maximum page size). Missing from a tier = 403.
+HISTORY_ENDPOINTS = {"following_lookup": ("follow", 1000), "liked_tweets": ("like", 100), "user_tweets": ("retweet", 100)}
+GATED_ENDPOINTS = set(HISTORY_ENDPOINTS) | {"stream", "stream_rules"}
+WINDOW_SECONDS = 15 * 60
+DAY_SECONDS = 24 * 3600
+SEARCH_WINDOW_SECONDS = 7 * DAY_SECONDS # recent search reaches back 7 days
+TWITTER_EPOCH_MS = 1288834974657
+ROUTES = [
+    ("GET", re.compile(r"^/2/users/me$"), "me"),
+    ("GET", re.compile(r"^/2/tweets/search/recent$"), "search"),
+    ("GET", re.compile(r"^/2/tweets/search/stream$"), "stream"),
+    ("GET", re.compile(r"^/2/tweets/search/stream/rules$"), "stream_rules"),
+    ("POST", re.compile(r"^/2/tweets/search/stream/rules$"), "stream_rules"),
+    ("POST", re.compile(r"^/2/users/(\d+)/retweets$"), "retweet"),
+    ("POST", re.compile(r"^/2/users/(\d+)/likes$"), "like"),
+    ("POST", re.compile(r"^/2/users/(\d+)/following$"), "follow"),
+    ("GET", re.compile(r"^/2/users/(\d+)/following$"), "following_lookup"),
+    ("GET", re.compile(r"^/2/users/(\d+)/liked_tweets$"), "liked_tweets"),
+    ("GET", re.compile(r"^/2/users/(\d+)/tweets$"), "user_tweets"),
+]
+FILLER_WORDS = ("great", "learning", "today", "update", "community", "project", "launch", "thread", "demo", "open", "source", "team")
+
+
+def snowflake_id(epoch_seconds, sequence):
+    return ((int(epoch_seconds * 1000) - TWITTER_EPOCH_MS) << 22) | (sequence & 0x3FFFFF)
+
+
+def iso_timestamp(epoch_seconds):
+    return datetime.fromtimestamp(epoch_seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def parse_timestamp(value):
+    # start_time/end_time query parameter (ISO 8601, e.g. 2024-05-01T12:00:00Z) -> epoch seconds
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class EndpointLimits:
+    __slots__ = ("limit", "daily_limit", "window_reset", "remaining", "daily_reset", "daily_remaining")
+
+    def __init__(self, limit, daily_limit):
+        self.limit = limit
+        self.daily_limit = daily_limit
+        self.window_reset = self.daily_reset = 0.0
+        self.remaining = limit
+        self.daily_remaining = daily_limit
+
+    def spend(self, now):
+        # Returns (allowed, headers)
+        if now >= self.window_reset:
+            self.window_reset, self.remaining = now + WINDOW_SECONDS, self.limit
+        if self.daily_limit is not None and now >= self.daily_reset:
+            self.daily_reset, self.daily_remaining = now + DAY_SECONDS, self.daily_limit
+        allowed = self.remaining > 0 and (self.daily_limit is None or self.daily_remaining > 0)
+        if allowed:
+            self.remaining -= 1
+            if self.daily_limit is not None: self.daily_remaining -= 1
+        return allowed, self.headers()
+
+    def headers(self):
+        headers = {"x-rate-limit-limit": str(self.limit), "x-rate-limit-remaining": str(self.remaining),
+                   "x-rate-limit-reset": str(int(math.ceil(self.window_reset)))}
+        if self.daily_limit is not None:
+            headers.update({"x-user-limit-24hour-limit": str(self.daily_limit), "x-user-limit-24hour-remaining": str(self.daily_remaining),
+                            "x-user-limit-24hour-reset": str(int(math.ceil(self.daily_reset)))})
+        return headers
+
+
+class MockTwitterAPI:
+    # Request handling and synthetic data, independent of the HTTP server
+    def __init__(self, clock=time, sleep=sleep, tier="free", rate_limits=None, latency=0.0, error_rate=0.0,
+                 tweets_per_hour=120, author_count=200, retweet_ratio=0.25, spam_ratio=0.05, foreign_ratio=0.05,
+                 topics=("#alxafrica", "tech news"), seed=1, my_id=999, my_username="mockbot", history_ratio=0.0,
+                 stream_heartbeat=20, stream_disconnect_after=None, server_error_rate=0.0,
+                 campaign_ratio=0.0, history_hours=1):
+        self.clock = clock
+        self.sleep = sleep
+        self.latency = latency
+        self.error_rate = error_rate
+        self.server_error_rate = server_error_rate
+        self.tweets_per_hour = tweets_per_hour
+        self.retweet_ratio = retweet_ratio
+        self.spam_ratio = spam_ratio
+        self.foreign_ratio = foreign_ratio
+        self.history_ratio = history_ratio
+        self.campaign_ratio = campaign_ratio
+        self.stream_heartbeat = stream_heartbeat
+        self.stream_disconnect_after = stream_disconnect_after
+        self.topics = list(topics)
+        self.my_id = my_id
+        self.my_username = my_username
+        self.rng = random.Random(seed)
+        self.limits = {endpoint: EndpointLimits(limit, daily) for endpoint, (limit, daily) in (rate_limits or RATE_LIMIT_TIERS[tier]).items()}
+        self.author_ids = list(range(10_000, 10_000 + author_count))
+        self.users = {author_id: {"id": str(author_id), "name": f"User {author_id}", "username": f"user{author_id}", "verified": author_id % 17 == 0}
+                      for author_id in self.author_ids}
+        self.users[my_id] = {"id": str(my_id), "name": "Mock Bot", "username": my_username, "verified": False}
+        self.tweets = deque()     # generated tweets, oldest first
+        self.tweet_index = {}     # id -> tweet
+        self.generated_until = self.clock() - min(history_hours * 3600, SEARCH_WINDOW_SECONDS) # tweets posted before the bot started
+        self.next_tweet_at = None
+        self.sequence = 0
+        self.done = {"retweet": {}, "like": {}, "follow": {}} # action -> target IDs in the order they were done
+        self.campaigns_acted_on = {"retweet": set(), "like": set()} # action -> campaign texts it was spent on
+        self.stream_rules = {} # rule ID -> {"id", "value", "tag"}
+        self.rule_sequence = 0
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    # --- Synthetic tweet stream ---
+    def _generate_until(self, now):
+        rate = self.tweets_per_hour / 3600.0
+        if rate <= 0:
+            self.generated_until = now
+            return
+        while True:
+            # The next arrival is drawn once and kept, so a tweet never appears before a request that already searched past it
+            if self.next_tweet_at is None: self.next_tweet_at = self.generated_until + self.rng.expovariate(rate)
+            if self.next_tweet_at > now: break
+            self.generated_until, self.next_tweet_at = self.next_tweet_at, None
+            self._add_tweet(self.generated_until)
+        cutoff = now - SEARCH_WINDOW_SECONDS
+        while self.tweets and self.tweets[0]["_at"] < cutoff:
+            del self.tweet_index[int(self.tweets.popleft()["id"])]
+
+    def _add_tweet(self, created_at):
+        rng = self.rng
+        self.sequence += 1
+        tweet_id = snowflake_id(created_at, self.sequence)
+        author_id = rng.choice(self.author_ids)
+        words = [rng.choice(FILLER_WORDS) for _ in range(rng.randint(4, 12))]
+        words.insert(rng.randrange(len(words) + 1), rng.choice(self.topics))
+        if rng.random() < self.spam_ratio: words.append("buy now")
+        tweet = {"id": str(tweet_id), "author_id": str(author_id), "text": " ".join(words), "edit_history_tweet_ids": [str(tweet_id)],
+                 "created_at": iso_timestamp(created_at), "lang": "es" if rng.random() < self.foreign_ratio else "en",
+                 "public_metrics": {"like_count": int(rng.paretovariate(1.2)) - 1, "retweet_count": int(rng.paretovariate(1.5)) - 1,
+                                    "reply_count": rng.randint(0, 3), "quote_count": 0},
+                 "_at": created_at}
+        originals = [candidate for candidate in islice(reversed(self.tweets), 50) if "referenced_tweets" not in candidate]
+        if originals and self.campaign_ratio and rng.random() < self.campaign_ratio:
+            # Copy-paste campaign: another account posts a recent text again with its own mention and link
+            template = rng.choice(originals[:10])
+            tweet["text"] = f"@user{rng.choice(self.author_ids)} {template.get('_template', template['text'])} https://t.co/{tweet_id % 10**8:08d}"
+            tweet["_template"] = template.get("_template", template["text"])
+        elif originals and rng.random() < self.retweet_ratio:
+            original = rng.choice(originals)
+            original_author = self.users[int(original["author_id"])]["username"]
+            tweet["text"] = f"RT @{original_author}: {original['text']}"[:140]
+            tweet["referenced_tweets"] = [{"type": "retweeted", "id": original["id"]}]
+        elif self.history_ratio and rng.random() < self.history_ratio:
+            for action, target_id in (("like", tweet["id"]), ("retweet", tweet["id"]), ("follow", tweet["author_id"])):
+                self.done[action][target_id] = created_at
+        self.tweets.append(tweet)
+        self.tweet_index[tweet_id] = tweet
+
+    # --- Request handling ---
+    def count(self, endpoint, name, amount=1):
+        endpoint_stats = self.stats.setdefault(endpoint, {})
+        endpoint_stats[name] = endpoint_stats.get(name, 0) + amount
+
+    def handle(self, method, path, query, body):
+        # Returns (status, headers, payload)
+        self.sleep(self.latency)
+        for route_method, route_path, endpoint in ROUTES:
+            match = route_path.match(path)
+            if method == route_method and match: break
+        else:
+            return 404, {}, {"title": "Not Found Error", "detail": f"No route for {method} {path}", "status": 404}
+        with self._lock:
+            now = self.clock()
+            self.count(endpoint, "requests")
+            limits = self.limits.get(endpoint)
+            if limits is None and endpoint in GATED_ENDPOINTS:
+                return 403, {}, {"title": "Client Forbidden", "detail": "This endpoint is not available on your API tier.",
+                                 "reason": "client-not-enrolled", "status": 403}
+            if self.server_error_rate and self.rng.random() < self.server_error_rate:
+                self.count(endpoint, "server_errors") # before spending: the request never reached the rate limiter
+                return 503, {}, {"title": "Service Unavailable", "detail": "Service Unavailable", "status": 503}
+            allowed, headers = limits.spend(now) if limits else (True, {})
+            if allowed and self.error_rate and self.rng.random() < self.error_rate:
+                allowed = False
+                self.count(endpoint, "injected_429")
+            if not allowed:
+                self.count(endpoint, "rate_limited")
+                return 429, headers, {"title": "Too Many Requests", "detail": "Too Many Requests", "type": "about:blank", "status": 429}
+            if endpoint == "me":
+                return 200, headers, {"data": {key: self.users[self.my_id][key] for key in ("id", "name", "username")}}
+            if endpoint == "search":
+                return 200, headers, self._search(now, query)
+            if endpoint == "stream_rules":
+                return 200, headers, self._rules(method, body or {})
+            if endpoint == "stream":
+                self._generate_until(now)
+                return 200, headers, self._stream(now)
+            if int(match.group(1)) != self.my_id:
+                return 403, headers, {"title": "Forbidden", "detail": "You can only act on behalf of the authenticated user.", "status": 403}
+            if endpoint in HISTORY_ENDPOINTS:
+                self._generate_until(now)
+                return 200, headers, self._history(endpoint, query)
+            return 200, headers, self._act(endpoint, body or {})
+
+    def _search(self, now, query):
+        self._generate_until(now)
+        since_id = int(query["since_id"]) if query.get("since_id") else 0
+        until_id = int(query["until_id"]) if query.get("until_id") else None
+        if query.get("next_token"): until_id = int(query["next_token"]) # the token is the oldest ID of the previous page
+        start_time = parse_timestamp(query["start_time"]) if query.get("start_time") else None
+        end_time = parse_timestamp(query["end_time"]) if query.get("end_time") else None
+        max_results = max(10, min(100, int(query.get("max_results", 10))))
+        matches = []
+        for tweet in reversed(self.tweets):
+            tweet_id = int(tweet["id"])
+            if until_id is not None and tweet_id >= until_id: continue
+            if end_time is not None and tweet["_at"] >= end_time: continue
+            if tweet_id <= since_id or (start_time is not None and tweet["_at"] < start_time): break
+            if not self._matches(tweet, query.get("query", "")): continue
+            matches.append(tweet)
+            if len(matches) > max_results: break
+        page, has_more = matches[:max_results], len(matches) > max_results
+        self.count("search", "tweets_served", len(page))
+        if not page:
+            self.count("search", "empty_pages")
+            return {"meta": {"result_count": 0}}
+        meta = {"result_count": len(page), "newest_id": page[0]["id"], "oldest_id": page[-1]["id"]}
+        if has_more: meta["next_token"] = page[-1]["id"]
+        return {"data": [self._public(tweet) for tweet in page], "includes": self._includes(page), "meta": meta}
+
+    def _matches(self, tweet, search_query):
+        # Synthetic tweets match every query; replays (replay_whatif.py) serve each query its recorded tweets
+        return True
+
+    def _includes(self, tweets):
+        # Expanded authors and retweeted originals, as requested by the bot's expansions
+        originals = {}
+        for tweet in tweets:
+            for ref in tweet.get("referenced_tweets", []):
+                if int(ref["id"]) in self.tweet_index: originals[ref["id"]] = self.tweet_index[int(ref["id"])]
+        author_ids = {int(tweet["author_id"]) for tweet in tweets} | {int(tweet["author_id"]) for tweet in originals.values()}
+        return {"users": [self.users[author_id] for author_id in author_ids], "tweets": [self._public(tweet) for tweet in originals.values()]}
+
+    def _rules(self, method, body):
+        if method == "GET":
+            rules = list(self.stream_rules.values())
+            return {"data": rules, "meta": {"result_count": len(rules)}} if rules else {"meta": {"result_count": 0}}
+        if "delete" in body:
+            deleted = [rule_id for rule_id in body["delete"].get("ids", []) if self.stream_rules.pop(str(rule_id), None)]
+            return {"meta": {"summary": {"deleted": len(deleted), "not_deleted": len(body["delete"].get("ids", [])) - len(deleted)}}}
+        created, errors = [], []
+        existing_values = {rule["value"] for rule in self.stream_rules.values()}
+        for rule in body.get("add", []):
+            if rule["value"] in existing_values:
+                errors.append({"value": rule["value"], "title": "DuplicateRule", "type": "https://api.twitter.com/2/problems/duplicate-rules"})
+                continue
+            self.rule_sequence += 1
+            new_rule = dict(rule, id=str(1_000_000 + self.rule_sequence))
+            self.stream_rules[new_rule["id"]] = new_rule
+            existing_values.add(rule["value"])
+            created.append(new_rule)
+        payload = {"meta": {"summary": {"created": len(created), "not_created": len(errors)}}}
+        if created: payload["data"] = created
+        if errors: payload["errors"] = errors
+        return payload
+
+    def _stream(self, connected_at):
+        # Generator of stream lines: each tweet posted after connected_at, keep-alives in between
+        sent_until = connected_at
+        while self.stream_disconnect_after is None or self.clock() - connected_at < self.stream_disconnect_after:
+            self.sleep(self.stream_heartbeat)
+            with self._lock:
+                now = self.clock()
+                self._generate_until(now)
+                new_tweets = []
+                for tweet in reversed(self.tweets):
+                    if tweet["_at"] <= sent_until: break
+                    new_tweets.append(tweet)
+                sent_until = now
+                matching_rules = [{"id": rule["id"], "tag": rule.get("tag", "")} for rule in self.stream_rules.values()]
+                lines = [{"data": self._public(tweet), "includes": self._includes([tweet]), "matching_rules": matching_rules}
+                         for tweet in reversed(new_tweets)] if matching_rules else []
+                self.count("stream", "tweets_served", len(lines))
+            for line in lines:
+                yield json.dumps(line).encode("utf-8") + b"\r\n"
+            if not lines: yield b"\r\n"
+
+    def _history(self, endpoint, query):
+        # The token is the offset into the newest-first list
+        action, page_limit = HISTORY_ENDPOINTS[endpoint]
+        max_results = max(1, min(page_limit, int(query.get("max_results", page_limit))))
+        offset = int(query.get("pagination_token") or 0)
+        target_ids = list(reversed(self.done[action]))
+        if endpoint == "user_tweets": target_ids = target_ids[:3200] # the timeline only reaches back 3200 tweets
+        page = target_ids[offset:offset + max_results]
+        self.count(endpoint, "ids_served", len(page))
+        if endpoint == "following_lookup":
+            data = [self.users.get(int(user_id), {"id": user_id, "name": f"User {user_id}", "username": f"user{user_id}"}) for user_id in page]
+        elif endpoint == "liked_tweets":
+            data = [{"id": tweet_id, "text": "...", "edit_history_tweet_ids": [tweet_id]} for tweet_id in page]
+        else:
+            data = [{"id": str(int(tweet_id) + 1), "text": "RT ...", "edit_history_tweet_ids": [str(int(tweet_id) + 1)],
+                     "referenced_tweets": [{"type": "retweeted", "id": tweet_id}]} for tweet_id in page]
+        meta = {"result_count": len(page)}
+        if offset + max_results < len(target_ids): meta["next_token"] = str(offset + max_results)
+        return {"data": data, "meta": meta} if page else {"meta": meta}
+
+    @staticmethod
+    def _public(tweet):
+        return {key: value for key, value in tweet.items() if not key.startswith('_')}
+
+    def _act(self, endpoint, body):
+        target_key, result_key = {"retweet": ("tweet_id", "retweeted"), "like": ("tweet_id", "liked"), "follow": ("target_user_id", "following")}[endpoint]
+        target_id = str(body.get(target_key, ""))
+        if target_id in self.done[endpoint]: self.count(endpoint, "duplicates")
+        else: self.count(endpoint, "ok")
+        target_tweet = self.tweet_index.get(int(target_id)) if endpoint != "follow" and target_id.isdigit() else None
+        if target_tweet is not None:
+            # Acting on one tweet of a campaign (its original or a copy) is fine; every further one is a wasted copy
+            campaign = target_tweet.get("_template", target_tweet["text"])
+            if campaign in self.campaigns_acted_on[endpoint]: self.count(endpoint, "campaign_copies")
+            self.campaigns_acted_on[endpoint].add(campaign)
+        self.done[endpoint][target_id] = self.clock()
+        data = {result_key: True}
+        if endpoint == "follow": data["pending_follow"] = False
+        return {"data": data}
+
+
+def make_handler(api):
+    class MockTwitterHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # keep-alive, like the real API
+        disable_nagle_algorithm = True # headers and body are separate writes; avoid the delayed-ACK stall
+
+        def _dispatch(self, method):
+            url = urlparse(self.path)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            body = None
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                try: body = json.loads(self.rfile.read(length))
+                except ValueError: body = None
+            status, headers, payload = api.handle(method, url.path, query, body)
+            if isinstance(payload, GeneratorType):
+                self._stream(status, headers, payload)
+                return
+            content = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(content)))
+            for name, value in headers.items(): self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(content)
+
+        def _stream(self, status, headers, lines):
+            # Chunked response that stays open while the generator yields lines
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Transfer-Encoding", "chunked")
+            for name, value in headers.items(): self.send_header(name, value)
+            self.end_headers()
+            self.close_connection = True
+            try:
+                for line in lines:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass # the client disconnected
+            finally:
+                lines.close()
+
+        def do_GET(self): self._dispatch("GET")
+        def do_POST(self): self._dispatch("POST")
+
+        def log_message(self, format, *args):
+            pass # one line per request would dominate benchmark output
+
+    return MockTwitterHandler
+
+
+class MockTwitterServer:
+    # ThreadingHTTPServer around a MockTwitterAPI, served from a daemon thread
+    def __init__(self, api, host="127.0.0.1", port=0):
+        self.api = api
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(api))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="mock-twitter-api", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Local mock of the Twitter API v2 endpoints used by the bot.")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8080)
+    arg_parser.add_argument("--tier", choices=sorted(RATE_LIMIT_TIERS), default="free")
+    arg_parser.add_argument("--tweets-per-hour", type=float, default=120)
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request.")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of an extra 429 on any request.")
+    arg_parser.add_argument("--server-error-rate", type=float, default=0.0, help="Probability of a 503 on any request.")
+    arg_parser.add_argument("--campaign-ratio", type=float, default=0.0, help="Share of tweets that repost a recent text with a new mention and link.")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    arg_parser.add_argument("--stream-heartbeat", type=float, default=20, help="Seconds between filtered-stream keep-alives (and tweet deliveries).")
+    arg_parser.add_argument("--history-hours", type=float, default=1, help="Hours of tweets posted before the mock started (up to the 7-day search window).")
+    arg_parser.add_argument("--history-ratio", type=float, default=0.0, help="Share of tweets the account already liked, retweeted and followed.")
+    cli_args = arg_parser.parse_args()
+    mock_api = MockTwitterAPI(tier=cli_args.tier, latency=cli_args.latency, error_rate=cli_args.error_rate,
+                              server_error_rate=cli_args.server_error_rate, campaign_ratio=cli_args.campaign_ratio,
+                              tweets_per_hour=cli_args.tweets_per_hour, seed=cli_args.seed, history_ratio=cli_args.history_ratio,
+                              stream_heartbeat=cli_args.stream_heartbeat, history_hours=cli_args.history_hours)
+    server = MockTwitterServer(mock_api, cli_args.host, cli_args.port)
+    print(f"Mock Twitter API ({cli_args.tier} tier) listening on {server.base_url}; Ctrl+C to stop.")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(json.dumps(mock_api.stats, indent=2))
@@ -0,0 +1,273 @@
+# orchestrator.py
+# Runs one bot worker process per account/query profile.
+#
+# Profiles come from a JSON file (see bot_profiles.example.json). Workers share one SQLite
+# store (shared_store.py) so a tweet is fetched-and-evaluated by only one of them and accounts
+# used by several profiles see each other's actions. Worker log records are funnelled
+# through a queue into a single log file, aggregated stats are logged periodically, and
+# crashed workers are restarted with backoff. Each profile keeps its own since_id under
+# <state-dir>/<profile>/, so a restarted worker resumes where it stopped.
+#
+# SIGTERM or SIGINT (Ctrl+C) to the orchestrator stops every worker: each gets one SIGTERM,
+# saves its state like a standalone bot and exits; workers still running after
+# SHUTDOWN_GRACE_SECONDS are killed. Workers ignore SIGINT, so a Ctrl+C that reaches the whole
+# process group does not interrupt them a second time while they save.
+#
+# Usage: python orchestrator.py --profiles bot_profiles.json [--state-dir bot_state]
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from multiprocessing.connection import wait as wait_for_any
+from time import time
+
+from log_pipeline import make_formatter
+from shared_store import SharedActionHistory, SharedStore
+from twitter_bot import load_credentials
+
+EXIT_CLEAN = 0
+EXIT_CRASHED = 1
+EXIT_AUTH_FAILED = 3 # not restarted: the credentials will not fix themselves
+
+LOG_FILE = "orchestrator.log"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+STATS_INTERVAL = 15 * 60          # seconds between aggregated stats log lines
+PRUNE_INTERVAL = 6 * 3600         # seconds between seen-tweet pruning passes
+RESTART_BACKOFF_INITIAL = 5       # seconds before the first restart of a crashed worker
+RESTART_BACKOFF_MAX = 15 * 60
+RESTART_BACKOFF_RESET_AFTER = 3600 # a worker that ran this long restarts with the initial backoff again
+SHUTDOWN_GRACE_SECONDS = 30
+
+
+def load_profiles(path):
+    with open(path, 'r', encoding='utf-8') as f: profiles = json.load(f)
+    if isinstance(profiles, dict): profiles = profiles.get("profiles", [])
+    names = set()
+    for profile in profiles:
+        if not profile.get("name") or not profile.get("query"):
+            raise ValueError(f"Every profile needs a 'name' and a 'query': {profile}")
+        if profile["name"] in names:
+            raise ValueError(f"Duplicate profile name: {profile['name']}")
+        names.add(profile["name"])
+    return profiles
+
+
+def profile_credentials(profile):
+    # Inline "credentials" object, or environment variables <credentials_env_prefix><KEY> (e.g. SHOP1_BEARER_TOKEN)
+    if profile.get("credentials"): return dict(profile["credentials"])
+    return load_credentials(None, prefix=profile.get("credentials_env_prefix", ""))
+
+
+def run_worker(profile, state_dir, shared_db_path, log_queue):
+    # Entry point of a worker process (spawned, so nothing is inherited from the orchestrator)
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # the orchestrator relays Ctrl+C as SIGTERM
+    from twitter_bot import TwitterBot, install_shutdown_handler
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+        handler.close()
+    root_logger.addHandler(QueueHandler(log_queue))
+    install_shutdown_handler() # terminate() on shutdown saves state like Ctrl+C
+
+    profile_name = profile["name"]
+    bot = TwitterBot(show_countdown=False)
+    bot.configure_from_profile(profile, state_dir)
+    client, my_bot_id, my_bot_username = bot.initialize_client_and_get_me(profile_credentials(profile))
+    if not client:
+        sys.exit(EXIT_AUTH_FAILED)
+
+    shared_store = SharedStore(shared_db_path)
+    bot.tweet_claimer = lambda tweet_ids: shared_store.claim_tweets(profile_name, tweet_ids)
+    liked_ids, retweeted_ids, followed_ids = bot.open_id_stores()
+    session_liked_ids = SharedActionHistory(shared_store, my_bot_id, "like", profile_name, liked_ids)
+    session_retweeted_ids = SharedActionHistory(shared_store, my_bot_id, "retweet", profile_name, retweeted_ids)
+    session_followed_ids = SharedActionHistory(shared_store, my_bot_id, "follow", profile_name, followed_ids)
+    try:
+        clean_exit = bot.run_bot_session(client, my_bot_id, session_liked_ids, session_retweeted_ids, session_followed_ids,
+                                         async_mode=bool(profile.get("async", False)))
+    except KeyboardInterrupt:
+        clean_exit = True
+    finally:
+        for history in (session_liked_ids, session_retweeted_ids, session_followed_ids):
+            history.close()
+        shared_store.close()
+    sys.exit(EXIT_CLEAN if clean_exit else EXIT_CRASHED)
+
+
+class WorkerSupervisor:
+    def __init__(self, profile, state_dir, shared_db_path, log_queue, mp_context):
+        self.profile = profile
+        self.name = profile["name"]
+        self.state_dir = state_dir
+        self.shared_db_path = shared_db_path
+        self.log_queue = log_queue
+        self.mp_context = mp_context
+        self.process = None
+        self.started_at = 0
+        self.restarts = 0
+        self.backoff = RESTART_BACKOFF_INITIAL
+        self.restart_at = None # set while a crashed worker waits for its restart
+        self.finished = False
+
+    def start(self):
+        self.process = self.mp_context.Process(target=run_worker, name=self.name,
+                                               args=(self.profile, self.state_dir, self.shared_db_path, self.log_queue))
+        self.process.start()
+        self.started_at = time()
+        self.restart_at = None
+        logging.info("Started worker '%s' (pid %s).", self.name, self.process.pid)
+
+    def poll(self):
+        # Restarts the worker after a crash once its backoff has elapsed
+        if self.finished: return
+        if self.restart_at is not None:
+            if time() >= self.restart_at:
+                self.restarts += 1
+                self.start()
+            return
+        if self.process is None or self.process.is_alive(): return
+
+        exit_code = self.process.exitcode
+        if exit_code == EXIT_CLEAN:
+            logging.info("Worker '%s' stopped cleanly.", self.name)
+            self.finished = True
+        elif exit_code == EXIT_AUTH_FAILED:
+            logging.error("Worker '%s' could not authenticate; not restarting it.", self.name)
+            self.finished = True
+        else:
+            if time() - self.started_at >= RESTART_BACKOFF_RESET_AFTER:
+                self.backoff = RESTART_BACKOFF_INITIAL
+            logging.error("Worker '%s' crashed (exit code %s); restarting in %ss.", self.name, exit_code, self.backoff)
+            self.restart_at = time() + self.backoff
+            self.backoff = min(self.backoff * 2, RESTART_BACKOFF_MAX)
+
+    def wake_up(self):
+        # (sentinel, deadline): the orchestrator sleeps until a worker exits or a restart is due
+        if self.finished: return None, None
+        if self.restart_at is not None: return None, self.restart_at
+        return self.process.sentinel, None
+
+    def request_stop(self):
+        # SIGTERM: the worker saves its state and exits; it is not restarted
+        self.finished = True
+        if self.process is not None and self.process.is_alive(): self.process.terminate()
+
+    def stop(self, deadline):
+        # Waits for the worker until `deadline` (epoch seconds), then kills it
+        if self.process is None: return
+        self.process.join(max(0, deadline - time()))
+        if self.process.is_alive():
+            logging.warning("Worker '%s' did not stop within %ss; killing it.", self.name, SHUTDOWN_GRACE_SECONDS)
+            self.process.kill()
+            self.process.join()
+
+
+def format_stats(stats, supervisors):
+    lines = ["--- Orchestrator stats ---"]
+    totals = {}
+    for supervisor in supervisors:
+        worker_stats = stats.get(supervisor.name, {})
+        for name, value in worker_stats.items(): totals[name] = totals.get(name, 0) + value
+        state = "finished" if supervisor.finished else ("alive" if supervisor.process and supervisor.process.is_alive() else "restarting")
+        counters = ", ".join(f"{name}={value}" for name, value in sorted(worker_stats.items())) or "no activity yet"
+        lines.append(f"{supervisor.name} [{state}, restarts={supervisor.restarts}]: {counters}")
+    lines.append("total: " + (", ".join(f"{name}={value}" for name, value in sorted(totals.items())) or "no activity yet"))
+    return "\n".join(lines)
+
+
+def install_stop_handlers(stop_requested):
+    # SIGTERM and SIGINT set stop_requested. The returned socket becomes readable when one arrives,
+    # so the supervision loop can wait on it next to the worker sentinels.
+    wake_up_reader, wake_up_writer = socket.socketpair()
+    wake_up_reader.setblocking(False)
+    wake_up_writer.setblocking(False)
+    signal.set_wakeup_fd(wake_up_writer.fileno())
+    def request_stop(signum, frame):
+        if not stop_requested.is_set(): logging.info("Orchestrator stopping workers (%s).", signal.Signals(signum).name)
+        stop_requested.set()
+    for signum in (signal.SIGTERM, signal.SIGINT): signal.signal(signum, request_stop)
+    return wake_up_reader, wake_up_writer
+
+
+def setup_orchestrator_logging(log_file, json_lines=False):
+    log_formatter = make_formatter(json_lines, "%(asctime)s [%(levelname)s] [%(processName)s] - %(message)s")
+    file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, mode='a', encoding='utf-8')
+    console_handler = logging.StreamHandler(sys.stdout)
+    handlers = [file_handler, console_handler]
+    for handler in handlers: handler.setFormatter(log_formatter)
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.handlers.clear()
+    for handler in handlers: root_logger.addHandler(handler)
+    return handlers
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Run one Twitter bot worker per profile with shared dedupe state.")
+    arg_parser.add_argument("--profiles", required=True, help="JSON file with the list of profiles.")
+    arg_parser.add_argument("--state-dir", default="bot_state", help="Directory for per-profile state and the shared store.")
+    arg_parser.add_argument("--shared-db", default=None, help="Shared SQLite store (default: <state-dir>/shared.sqlite3).")
+    arg_parser.add_argument("--log-file", default=LOG_FILE)
+    arg_parser.add_argument("--stats-interval", type=int, default=STATS_INTERVAL)
+    arg_parser.add_argument("--log-json", action="store_true", help="Write the log as JSON lines (one object per record).")
+    cli_args = arg_parser.parse_args()
+
+    handlers = setup_orchestrator_logging(cli_args.log_file, cli_args.log_json)
+    profiles = load_profiles(cli_args.profiles)
+    os.makedirs(cli_args.state_dir, exist_ok=True)
+    shared_db_path = cli_args.shared_db or os.path.join(cli_args.state_dir, "shared.sqlite3")
+    shared_store = SharedStore(shared_db_path)
+
+    mp_context = multiprocessing.get_context("spawn")
+    log_queue = mp_context.Queue()
+    log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    log_listener.start()
+
+    supervisors = [WorkerSupervisor(profile, cli_args.state_dir, shared_db_path, log_queue, mp_context) for profile in profiles]
+    stop_requested = threading.Event()
+    wake_up_reader, wake_up_writer = install_stop_handlers(stop_requested)
+    logging.info("Orchestrator starting %s workers; shared store %s.", len(supervisors), shared_db_path)
+    next_stats_at = time() + cli_args.stats_interval
+    next_prune_at = time()
+    try:
+        for supervisor in supervisors: supervisor.start()
+        while not stop_requested.is_set() and not all(supervisor.finished for supervisor in supervisors):
+            sentinels = [wake_up_reader]
+            deadlines = [next_stats_at, next_prune_at]
+            for sentinel, deadline in (supervisor.wake_up() for supervisor in supervisors):
+                if sentinel is not None: sentinels.append(sentinel)
+                if deadline is not None: deadlines.append(deadline)
+            if wake_up_reader in wait_for_any(sentinels, timeout=max(0, min(deadlines) - time())):
+                try: wake_up_reader.recv(64) # the signal numbers written by set_wakeup_fd
+                except BlockingIOError: pass
+                if stop_requested.is_set(): break
+            for supervisor in supervisors: supervisor.poll()
+            if time() >= next_stats_at:
+                logging.info(format_stats(shared_store.stats(), supervisors))
+                next_stats_at = time() + cli_args.stats_interval
+            if time() >= next_prune_at:
+                shared_store.prune_seen_tweets()
+                next_prune_at = time() + PRUNE_INTERVAL
+    finally:
+        for supervisor in supervisors: supervisor.request_stop()
+        shutdown_deadline = time() + SHUTDOWN_GRACE_SECONDS
+        for supervisor in supervisors: supervisor.stop(shutdown_deadline)
+        logging.info(format_stats(shared_store.stats(), supervisors))
+        shared_store.close()
+        log_listener.stop()
+        signal.set_wakeup_fd(-1)
+        wake_up_reader.close()
+        wake_up_writer.close()
+
+
+if __name__ == "__main__":
+    main()
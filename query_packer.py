@@ -0,0 +1,367 @@
+# query_packer.py
+# Packs many watched queries into as few search_recent_tweets calls as the query length
+# limit allows, and routes each returned tweet back to the queries it matches.
+#
+# Every watched query keeps its own filters, actions and since_id. Queries are OR'd together
+# as "(q1) OR (q2) OR ..." groups of at most max_length characters; a group is searched from
+# the lowest since_id of its members that have one. Routing re-evaluates each sub-query locally with a
+# small matcher for the search operators the returned fields can answer (keywords, phrases,
+# hashtags, mentions, from:, lang:, is:retweet/reply/quote, has:links/mentions/hashtags).
+# Operators it cannot check (url:, place:, ...) never exclude a tweet.
+import json
+import logging
+import os
+import re
+import threading
+from time import time
+
+from state_journal import write_snapshot
+
+QUERY_LENGTH_LIMIT = 512 # search_recent_tweets on Free/Basic access; Pro allows 4096
+GROUP_SEPARATOR = " OR "
+
+_TOKEN_PATTERN = re.compile(r'-?"[^"]*"|\(|\)|[^\s()]+')
+_WORD_PATTERN = re.compile(r"\w+")
+_HASHTAG_PATTERN = re.compile(r"#(\w+)")
+_MENTION_PATTERN = re.compile(r"@(\w+)")
+_CASHTAG_PATTERN = re.compile(r"\$([A-Za-z]\w*)")
+_LINK_PATTERN = re.compile(r"https?://")
+_REFERENCE_TYPES = {"retweet": "retweeted", "reply": "replied_to", "quote": "quoted"}
+
+
+class TweetContext:
+    # The fields of one tweet the matcher looks at, computed once per tweet and shared by every sub-query
+    __slots__ = ("text", "words", "hashtags", "mentions", "cashtags", "username", "lang", "reference_types")
+
+    def __init__(self, tweet, username, original_tweet=None):
+        text = tweet.text or ""
+        if original_tweet is not None: text += "\n" + (original_tweet.text or "") # RT text is truncated
+        self.text = " ".join(text.lower().split())
+        self.words = set(_WORD_PATTERN.findall(self.text))
+        self.hashtags = set(_HASHTAG_PATTERN.findall(self.text))
+        self.mentions = set(_MENTION_PATTERN.findall(self.text))
+        self.cashtags = set(_CASHTAG_PATTERN.findall(self.text))
+        self.username = (username or "").lower()
+        self.lang = (getattr(tweet, 'lang', None) or "").lower()
+        self.reference_types = {ref.type for ref in (tweet.referenced_tweets or [])}
+
+
+# --- Query matcher ---
+# Matchers return True, False or None ("cannot tell locally"); None behaves as unknown in
+# three-valued logic and the final verdict only rejects a tweet on a definite False.
+
+def _match_term(term, context):
+    if term.startswith('"'):
+        phrase = " ".join(term.strip('"').lower().split())
+        return phrase in context.text if phrase else None
+    term = term.lower()
+    if term.startswith('#') and len(term) > 1: return term[1:] in context.hashtags
+    if term.startswith('@') and len(term) > 1: return term[1:] in context.mentions
+    if term.startswith('$') and len(term) > 1: return term[1:] in context.cashtags
+    operator, colon, value = term.partition(':')
+    if colon and value:
+        value = value.strip('"')
+        if operator == "from": return context.username == value.lstrip('@')
+        if operator == "lang": return context.lang == value
+        if operator == "is" and value in _REFERENCE_TYPES: return _REFERENCE_TYPES[value] in context.reference_types
+        if operator == "has":
+            if value == "links": return bool(_LINK_PATTERN.search(context.text))
+            if value == "mentions": return bool(context.mentions)
+            if value == "hashtags": return bool(context.hashtags)
+            if value == "cashtags": return bool(context.cashtags)
+        return None
+    if _WORD_PATTERN.fullmatch(term): return term in context.words
+    return term in context.text
+
+
+def _all(matchers):
+    def match(context):
+        verdict = True
+        for matcher in matchers:
+            result = matcher(context)
+            if result is False: return False
+            if result is None: verdict = None
+        return verdict
+    return match
+
+
+def _any(matchers):
+    def match(context):
+        verdict = False
+        for matcher in matchers:
+            result = matcher(context)
+            if result is True: return True
+            if result is None: verdict = None
+        return verdict
+    return match
+
+
+def _negate(matcher):
+    def match(context):
+        result = matcher(context)
+        return None if result is None else not result
+    return match
+
+
+class _QueryParser:
+    # query := and_group ("OR" and_group)* ; and_group := unary+ ; unary := "-" unary | "(" query ")" | term
+    def __init__(self, query):
+        self.tokens = _TOKEN_PATTERN.findall(query)
+        self.position = 0
+
+    def parse(self):
+        matcher = self._parse_or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Unbalanced parentheses in query near '{' '.join(self.tokens[self.position:])}'")
+        return matcher
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _parse_or(self):
+        alternatives = [self._parse_and()]
+        while self._peek() == "OR":
+            self.position += 1
+            alternatives.append(self._parse_and())
+        return alternatives[0] if len(alternatives) == 1 else _any(alternatives)
+
+    def _parse_and(self):
+        terms = []
+        while self._peek() not in (None, ")", "OR"):
+            terms.append(self._parse_unary())
+        if not terms: raise ValueError("Empty query or query group")
+        return terms[0] if len(terms) == 1 else _all(terms)
+
+    def _parse_unary(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        if token == "(":
+            matcher = self._parse_or()
+            if self._peek() != ")": raise ValueError("Missing ')' in query")
+            self.position += 1
+            return matcher
+        if token.startswith('-') and (len(token) > 1 or self._peek() == "("):
+            if len(token) > 1: self.tokens.insert(self.position, token[1:])
+            return _negate(self._parse_unary())
+        term = token
+        return lambda context: _match_term(term, context)
+
+
+def compile_query(query):
+    # Returns match(TweetContext) -> bool; False only when the tweet definitely does not match
+    matcher = _QueryParser(query).parse()
+    return lambda context: matcher(context) is not False
+
+
+# --- Watched queries and packing ---
+
+class WatchedQuery:
+    __slots__ = ("name", "query", "actions", "tweet_filter", "target_languages", "matches")
+
+    def __init__(self, name, query, actions, tweet_filter, target_languages=()):
+        self.name = name
+        self.query = query.strip()
+        self.actions = tuple(actions)
+        self.tweet_filter = tweet_filter
+        self.target_languages = list(target_languages)
+        self.matches = compile_query(self.query)
+
+
+class QueryGroup:
+    __slots__ = ("queries", "query")
+
+    def __init__(self, queries):
+        self.queries = list(queries)
+        if len(self.queries) == 1: self.query = self.queries[0].query
+        else: self.query = GROUP_SEPARATOR.join(f"({watched.query})" for watched in self.queries)
+
+    @property
+    def name(self):
+        return "+".join(watched.name for watched in self.queries)
+
+
+def pack_queries(watched_queries, max_length=QUERY_LENGTH_LIMIT):
+    # First-fit decreasing: the fewest "(q1) OR (q2)" groups that each fit into max_length characters
+    bins = [] # [members, packed length]
+    for watched in sorted(watched_queries, key=lambda watched: (-len(watched.query), watched.name)):
+        if len(watched.query) > max_length:
+            raise ValueError(f"Query '{watched.name}' is {len(watched.query)} characters long; the limit is {max_length}.")
+        packed_length = len(watched.query) + 2
+        for group in bins:
+            if group[1] + len(GROUP_SEPARATOR) + packed_length <= max_length:
+                group[0].append(watched)
+                group[1] += len(GROUP_SEPARATOR) + packed_length
+                break
+        else:
+            bins.append([[watched], packed_length])
+    order = {watched.name: position for position, watched in enumerate(watched_queries)}
+    groups = [QueryGroup(sorted(members, key=lambda watched: order[watched.name])) for members, _ in bins]
+    groups.sort(key=lambda group: order[group.queries[0].name])
+    return groups
+
+
+def route_tweets(tweets, includes, group):
+    # {query name: [tweets matching that sub-query]} in page order; tweets matching no sub-query are dropped
+    routed = {watched.name: [] for watched in group.queries}
+    if len(group.queries) == 1:
+        routed[group.queries[0].name] = list(tweets)
+        return routed
+    includes = includes or {}
+    usernames = {user["id"]: user["username"] for user in includes.get("users", [])}
+    original_tweets = {tweet["id"]: tweet for tweet in includes.get("tweets", [])}
+    unrouted = 0
+    for tweet in tweets:
+        original_tweet = None
+        for ref in tweet.referenced_tweets or []:
+            if ref.type == 'retweeted': original_tweet = original_tweets.get(ref.id)
+        context = TweetContext(tweet, usernames.get(tweet.author_id), original_tweet)
+        matched = False
+        for watched in group.queries:
+            if watched.matches(context):
+                routed[watched.name].append(tweet)
+                matched = True
+        if not matched: unrouted += 1
+    if unrouted:
+        logging.info("%s tweets from the packed search matched none of its queries locally; skipping them.", unrouted)
+    return routed
+
+
+class QuerySinceIds:
+    # since_id per watched query, keyed by query text (editing a query starts it from scratch), plus the
+    # pagination cursor of each packed group's unfinished search pass (see search_pager.py), persisted as JSON.
+    # With a state_journal.StateJournal, every change is journaled as it happens, together with the
+    # candidates buffered for an action slot (record_candidate/record_removed), and save() is a group
+    # commit. The JSON file becomes a snapshot that is only rewritten when the journal grows large
+    # or the session ends. A restart then resumes from the last page the bot committed, with its
+    # unspent candidates, instead of searching that page again.
+    def __init__(self, state_file, journal=None, candidate_max_age=None, clock=time):
+        self.state_file = state_file
+        self.journal = journal
+        self.candidate_max_age = candidate_max_age
+        self.clock = clock
+        self._lock = threading.Lock() # the async runtime saves from a worker thread
+        self._since_ids = {}
+        self._cursors = {} # packed group query -> SearchCursor.to_dict()
+        self._candidates = {} # (action_name, str(target_id)) -> candidate record, journaled sessions only
+        if state_file and os.path.exists(state_file):
+            try:
+                with open(state_file, 'r', encoding='utf-8') as f: state = json.load(f)
+                if not isinstance(state.get("since_ids"), dict): state = {"since_ids": state} # flat {query: since_id} files
+                self._since_ids = {query: int(since_id) for query, since_id in state["since_ids"].items()}
+                self._cursors = dict(state.get("cursors", {}))
+                if journal is not None:
+                    for record in state.get("candidates", []): self._apply(record)
+            except Exception as e:
+                logging.error("Error loading query since_ids from %s: %s", state_file, e)
+        if journal is not None:
+            records = journal.replay()
+            for record in records: self._apply(record)
+            if records:
+                logging.info("Replayed %s journal records from %s: %s unfinished search passes, %s buffered candidates.",
+                             len(records), journal.path, len(self._cursors), len(self._candidates))
+
+    def _apply(self, record):
+        op = record.get("op")
+        if op == "since": self._since_ids[record["query"]] = int(record["id"])
+        elif op == "cursor":
+            if record.get("cursor") is None: self._cursors.pop(record["group"], None)
+            else: self._cursors[record["group"]] = record["cursor"]
+        elif op == "candidate": self._candidates[(record["action"], str(record["target"]))] = record
+        elif op == "removed": self._candidates.pop((record["action"], str(record["target"])), None)
+
+    def _journal(self, record):
+        # Callers hold self._lock, so a snapshot never misses a record appended while it is written
+        if self.journal is not None: self.journal.append(record)
+
+    def exists(self):
+        return bool(self.state_file) and os.path.exists(self.state_file)
+
+    def get(self, query):
+        return self._since_ids.get(query)
+
+    def seed(self, query, since_id):
+        with self._lock:
+            if since_id is not None and query not in self._since_ids:
+                self._since_ids[query] = since_id
+                self._journal({"op": "since", "query": query, "id": since_id})
+
+    def for_group(self, group):
+        # A group resumes from its least advanced member. A member without a since_id (a new query) joins the
+        # others' pass instead of pulling the whole group back to the latest page, which would skip what the
+        # others missed; a group of new queries fetches the latest page.
+        since_ids = [since_id for since_id in (self._since_ids.get(watched.query) for watched in group.queries) if since_id is not None]
+        return min(since_ids) if since_ids else None
+
+    def get_cursor(self, group):
+        return self._cursors.get(group.query)
+
+    def set_cursor(self, group, cursor_state):
+        with self._lock:
+            if cursor_state is None:
+                if self._cursors.pop(group.query, None) is None: return
+            elif self._cursors.get(group.query) == cursor_state: return
+            else: self._cursors[group.query] = cursor_state
+            self._journal({"op": "cursor", "group": group.query, "cursor": cursor_state})
+
+    def advance(self, group, highest_id):
+        # Moves every member of the group past highest_id; returns True if anything changed
+        changed = False
+        if highest_id is None: return changed
+        with self._lock:
+            for watched in group.queries:
+                current = self._since_ids.get(watched.query)
+                if current is None or highest_id > current:
+                    self._since_ids[watched.query] = highest_id
+                    self._journal({"op": "since", "query": watched.query, "id": highest_id})
+                    changed = True
+        return changed
+
+    # CandidateBuffer journal hooks (see candidate_buffer.py)
+    def record_candidate(self, action_name, target_id, action_args, score, created_at):
+        if self.journal is None: return
+        record = {"op": "candidate", "action": action_name, "target": target_id, "args": list(action_args),
+                  "score": score, "created_at": created_at}
+        with self._lock:
+            self._candidates[(action_name, str(target_id))] = record
+            self._journal(record)
+
+    def record_removed(self, action_name, target_id):
+        # Taken for an action attempt, evicted, or replaced by nothing
+        if self.journal is None: return
+        with self._lock:
+            if self._candidates.pop((action_name, str(target_id)), None) is not None:
+                self._journal({"op": "removed", "action": action_name, "target": target_id})
+
+    def buffered_candidates(self):
+        # Journaled candidates still in the buffer: (action_name, target_id, action_args, score, created_at)
+        with self._lock: records = list(self._candidates.values())
+        return [(record["action"], record["target"], tuple(record["args"]), record["score"], record["created_at"]) for record in records]
+
+    def _snapshot_payload(self):
+        state = {"since_ids": self._since_ids, "cursors": self._cursors}
+        if self.journal is not None:
+            if self.candidate_max_age is not None:
+                cutoff = self.clock() - self.candidate_max_age
+                for key in [key for key, record in self._candidates.items() if record["created_at"] < cutoff]:
+                    del self._candidates[key]
+            state["candidates"] = list(self._candidates.values())
+        return json.dumps(state)
+
+    def save(self, snapshot=False):
+        # Journaled: group commit, plus a snapshot when the journal is due for compaction (or snapshot=True)
+        if not self.state_file: return
+        try:
+            with self._lock:
+                if self.journal is not None and not snapshot and not self.journal.needs_compaction():
+                    self.journal.commit()
+                    return
+                write_snapshot(self.state_file, self._snapshot_payload())
+                if self.journal is not None: self.journal.reset()
+        except Exception as e:
+            logging.error("Error saving query since_ids to %s: %s", self.state_file, e)
+
+    def close(self):
+        # Folds the journal into a final snapshot
+        if self.journal is None: return
+        self.save(snapshot=True)
+        self.journal.close()
@@ -0,0 +1,229 @@
+# rate_budget.py
+# Per-endpoint request budgets driven by the x-rate-limit-* response headers.
+#
+# Every response seen by the tweepy.Client session updates the budget of the endpoint it
+# belongs to (limit, remaining, reset time for the 15-minute window and, where the API
+# reports them, the 24-hour user/app windows). Callers ask wait_time() before spending a
+# request and pace_interval() to spread the remaining requests until the window resets.
+# Concurrent callers (backfill.py workers) reserve() a request before making it and release()
+# it once its response has been counted, so they cannot all spend the last remaining call.
+# Until an endpoint has reported headers, the fixed cooldown it was registered with applies.
+import json
+import logging
+import os
+import re
+import threading
+from time import time
+
+# Header prefix -> window name. Each prefix is followed by limit/remaining/reset.
+RATE_LIMIT_HEADER_WINDOWS = {
+    "x-rate-limit-": "window",
+    "x-user-limit-24hour-": "user_24h",
+    "x-app-limit-24hour-": "app_24h",
+}
+
+ENDPOINT_ROUTES = [
+    ("GET", re.compile(r"^/2/tweets/search/recent$"), "search"),
+    ("GET", re.compile(r"^/2/tweets/search/stream$"), "stream"),
+    ("GET", re.compile(r"^/2/tweets/search/stream/rules$"), "stream_rules"),
+    ("POST", re.compile(r"^/2/tweets/search/stream/rules$"), "stream_rules"),
+    ("POST", re.compile(r"^/2/users/\d+/retweets$"), "retweet"),
+    ("POST", re.compile(r"^/2/users/\d+/likes$"), "like"),
+    ("POST", re.compile(r"^/2/users/\d+/following$"), "follow"),
+    ("GET", re.compile(r"^/2/users/me$"), "me"),
+    ("GET", re.compile(r"^/2/users/\d+/following$"), "following_lookup"),
+    ("GET", re.compile(r"^/2/users/\d+/liked_tweets$"), "liked_tweets"),
+    ("GET", re.compile(r"^/2/users/\d+/tweets$"), "user_tweets"),
+]
+NUMERIC_PATH_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint_for_request(method, path):
+    # Maps an HTTP request to the budget name used by the bot ("search", "like", ...)
+    method = method.upper()
+    for route_method, route_path, endpoint in ENDPOINT_ROUTES:
+        if method == route_method and route_path.match(path):
+            return endpoint
+    return f"{method} {NUMERIC_PATH_SEGMENT.sub('/:id', path)}"
+
+
+def parse_rate_limit_headers(headers):
+    # Returns {window_name: (limit, remaining, reset_epoch)} for every complete window in the headers
+    windows = {}
+    for prefix, window_name in RATE_LIMIT_HEADER_WINDOWS.items():
+        try:
+            limit = headers.get(prefix + "limit")
+            remaining = headers.get(prefix + "remaining")
+            reset = headers.get(prefix + "reset")
+            if remaining is None or reset is None: continue
+            windows[window_name] = (int(limit) if limit is not None else None, int(remaining), float(reset))
+        except (TypeError, ValueError):
+            continue
+    return windows
+
+
+class RateBudget:
+    def __init__(self, state_file=None, fallback_intervals=None, clock=time):
+        self.state_file = state_file
+        self.fallback_intervals = dict(fallback_intervals or {})
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._windows = {}     # endpoint -> {window_name: [limit, remaining, reset_epoch]}
+        self._last_spent = {}  # endpoint -> epoch of the last request, used for the fixed fallback cooldown
+        self._unspent = {}     # endpoint -> responses whose headers were applied but not yet spend()-ed
+        self._reserved = {}    # endpoint -> requests reserved and still in flight
+        if state_file: self.load()
+
+    # --- Queries ---
+    def has_headers(self, endpoint):
+        with self._lock:
+            return bool(self._windows.get(endpoint))
+
+    def wait_time(self, endpoint):
+        # Seconds until a request to `endpoint` may be made without exceeding any known window
+        now = self.clock()
+        with self._lock:
+            windows = self._windows.get(endpoint)
+            if windows:
+                reserved = self._reserved.get(endpoint, 0)
+                blocked_until = 0.0
+                for limit, remaining, reset_at in windows.values():
+                    if remaining - reserved <= 0 and reset_at > now:
+                        blocked_until = max(blocked_until, reset_at)
+                return max(0.0, blocked_until - now)
+            fallback = self.fallback_intervals.get(endpoint, 0)
+            return max(0.0, fallback - (now - self._last_spent.get(endpoint, 0)))
+
+    def pace_interval(self, endpoint, default=None):
+        # Interval that spreads the remaining requests of the tightest window evenly until it resets.
+        # Returns `default` (or the fallback interval) while the endpoint has not reported headers.
+        now = self.clock()
+        with self._lock:
+            windows = self._windows.get(endpoint)
+            if not windows:
+                return default if default is not None else self.fallback_intervals.get(endpoint, 0)
+            interval = 0.0
+            for limit, remaining, reset_at in windows.values():
+                if reset_at <= now: continue
+                interval = max(interval, (reset_at - now) / max(remaining, 1) if remaining > 0 else reset_at - now)
+            return interval
+
+    def describe(self, endpoint):
+        now = self.clock()
+        with self._lock:
+            windows = self._windows.get(endpoint)
+            if not windows:
+                return f"{endpoint}: no rate limit headers yet (fallback {self.fallback_intervals.get(endpoint, 0)}s)"
+            parts = [f"{name} {remaining}/{limit if limit is not None else '?'} resets in {max(0, int(reset_at - now))}s"
+                     for name, (limit, remaining, reset_at) in windows.items()]
+            return f"{endpoint}: " + ", ".join(parts)
+
+    # --- Updates ---
+    def reserve(self, endpoint):
+        # Claims one request against every known window; False if in-flight reservations already hold the
+        # rest of the budget. Until the endpoint reports headers, one reserved request is in flight at a time.
+        now = self.clock()
+        with self._lock:
+            reserved = self._reserved.get(endpoint, 0)
+            windows = self._windows.get(endpoint)
+            if windows:
+                for limit, remaining, reset_at in windows.values():
+                    available = remaining if reset_at > now else (limit if limit is not None else 1)
+                    if available - reserved <= 0: return False
+            elif reserved or now - self._last_spent.get(endpoint, 0) < self.fallback_intervals.get(endpoint, 0):
+                return False
+            self._reserved[endpoint] = reserved + 1
+            return True
+
+    def release(self, endpoint):
+        # The reserved request has finished: its response headers (or spend()) account for it now
+        with self._lock:
+            self._reserved[endpoint] = max(0, self._reserved.get(endpoint, 0) - 1)
+
+    def spend(self, endpoint):
+        # Records a completed request. If its response carried headers they already hold the exact
+        # remaining count; otherwise the last known windows are decremented locally.
+        now = self.clock()
+        with self._lock:
+            self._last_spent[endpoint] = now
+            unspent = self._unspent.get(endpoint, 0)
+            if unspent:
+                # Overlapping responses (concurrent backfill shards) each count once here
+                self._unspent[endpoint] = unspent - 1
+                return
+            for window in self._windows.get(endpoint, {}).values():
+                if window[2] <= now and window[0] is not None:
+                    window[1] = window[0] # window has reset since we last heard from the API
+                window[1] = max(0, window[1] - 1)
+
+    def update_from_headers(self, endpoint, headers, unspent=True):
+        # unspent: the response is still to be spend()-ed, which must then not decrement the windows again
+        windows = parse_rate_limit_headers(headers)
+        if not windows: return False
+        with self._lock:
+            known = self._windows.setdefault(endpoint, {})
+            for window_name, (limit, remaining, reset_at) in windows.items():
+                known[window_name] = [limit, remaining, reset_at]
+            if unspent: self._unspent[endpoint] = self._unspent.get(endpoint, 0) + 1
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("Rate budget updated from headers - %s", self.describe(endpoint))
+        self.save()
+        return True
+
+    def record_rate_limited(self, endpoint, headers=None):
+        # 429: trust the reset header if present, otherwise block for the fallback interval
+        now = self.clock()
+        if headers is not None and self.update_from_headers(endpoint, headers, unspent=False):
+            with self._lock:
+                # The response hook counted this response, but a 429 is never spend()-ed
+                self._unspent[endpoint] = max(0, self._unspent.get(endpoint, 0) - 1)
+                windows = self._windows[endpoint]
+                if not any(remaining <= 0 and reset_at > now for _, remaining, reset_at in windows.values()):
+                    # Headers said there was budget left, but the API still refused: exhaust the main window
+                    limit, _, reset_at = windows.get("window", [None, 0, now])
+                    windows["window"] = [limit, 0, max(reset_at, now + self.fallback_intervals.get(endpoint, 0))]
+        else:
+            with self._lock:
+                self._last_spent[endpoint] = now
+        self.save()
+
+    def response_hook(self, response, *args, **kwargs):
+        # requests.Session response hook: feeds every API response's headers into the budget
+        try:
+            request = response.request
+            path = request.path_url.split('?', 1)[0]
+            self.update_from_headers(endpoint_for_request(request.method, path), response.headers)
+        except Exception as e:
+            logging.debug("Could not read rate limit headers: %s", e)
+        return response
+
+    def install(self, client):
+        hooks = client.session.hooks.setdefault("response", [])
+        if self.response_hook not in hooks: hooks.append(self.response_hook)
+
+    # --- Persistence ---
+    def load(self):
+        if not self.state_file or not os.path.exists(self.state_file): return
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f: state = json.load(f)
+            now = self.clock()
+            with self._lock:
+                for endpoint, windows in state.get("windows", {}).items():
+                    # Windows that reset while the bot was down are dropped; the next response reports fresh values
+                    live = {name: list(window) for name, window in windows.items() if window[2] > now}
+                    if live: self._windows[endpoint] = live
+                self._last_spent.update(state.get("last_spent", {}))
+        except Exception as e:
+            logging.error("Error loading rate limit budget from %s: %s", self.state_file, e)
+
+    def save(self):
+        if not self.state_file: return
+        with self._lock: # also serialises the writes: concurrent searches (backfill.py) share one temp file
+            state = {"windows": self._windows, "last_spent": self._last_spent}
+            payload = json.dumps(state)
+            try:
+                tmp_file = self.state_file + ".tmp"
+                with open(tmp_file, 'w', encoding='utf-8') as f: f.write(payload)
+                os.replace(tmp_file, self.state_file)
+            except Exception as e:
+                logging.error("Error saving rate limit budget to %s: %s", self.state_file, e)
@@ -0,0 +1,246 @@
+# replay_whatif.py
+# What-if simulator: replays a recording of search responses (search_recording.py, --record)
+# through the bot on a virtual clock, once per candidate config, and compares the results.
+#
+# Each config runs in its own process: the recording is loaded into a ReplayTwitterAPI, a
+# mock_twitter_api.MockTwitterAPI whose tweets are the recorded ones instead of synthetic
+# ones. A tweet appears at the time its snowflake ID says it was posted and is served to a
+# search whose query is one it was recorded for. A search whose query was never recorded
+# (the config changed the watched queries) is served every tweet. Users and retweeted
+# originals come from the recorded includes. The bot starts from the recorded settings with the config's
+# overrides applied, runs its normal serial loop against the mock from the recording's start
+# until drain seconds after its last response, and acts on the mock's rate limits. The search
+# limit is the recorded x-rate-limit-limit; the other endpoints use the tier's limits.
+#
+# Per config it reports the actions done, the requests made (search quota used, 429s,
+# duplicate actions) and the recorded tweets that the simulated bot never received. The
+# 50th and 90th percentile delays between a tweet's posting and the search that returned it
+# are reported as well. The bot starts with empty done-ID stores, and the public_metrics of
+# each tweet are the ones recorded when production fetched it.
+#
+# Usage: python replay_whatif.py RECORDING_DIR [--configs configs.json] [--set NAME:SETTING=VALUE ...]
+#        [--tier basic] [--workers N] [--drain-minutes 15]
+#   configs.json maps config names to setting overrides, e.g.
+#   {"fixed-polls": {"adaptive_search": false}, "calm": {"sleep_between_batch_actions": 300}}.
+#   The "recorded" config (no overrides) is always run first for comparison.
+#   The mock always sends x-rate-limit headers, so the fallback cooldowns and search intervals
+#   (FALLBACK_SETTINGS) do not change a replay; overriding one logs a warning and is noted
+#   in the config's line.
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from backfill import snowflake_time
+from mock_twitter_api import RATE_LIMIT_TIERS, SEARCH_WINDOW_SECONDS, WINDOW_SECONDS, MockTwitterAPI, MockTwitterServer
+from search_recording import read_recording, recording_files
+
+BASELINE_CONFIG = "recorded"
+# Settings the bot only uses until an endpoint reports x-rate-limit headers, which the mock always sends
+FALLBACK_SETTINGS = {
+    "like_cooldown_seconds": "the like endpoint's x-rate-limit headers set its pace",
+    "retweet_cooldown_seconds": "the retweet endpoint's x-rate-limit headers set its pace",
+    "follow_cooldown_seconds": "the follow endpoint's x-rate-limit headers set its pace",
+    "search_interval_success": "the search budget's headers (and adaptive_search's arrival rates) set the search pace",
+    "search_interval_no_results": "the search budget's headers (and adaptive_search's arrival rates) set the search pace",
+}
+
+
+class Recording:
+    # The tweets, users and settings of a recording, ready to serve
+    def __init__(self, directory):
+        self.settings = {}
+        self.started_at = self.ended_at = None
+        self.tweets = {}     # id -> tweet dict with "_at" and "_queries"
+        self.originals = {}  # id -> retweeted original from includes.tweets
+        self.users = {}      # id -> user dict
+        self.queries = set()
+        self.search_limit = None
+        self.responses = 0
+        for session, record in read_recording(directory):
+            if self.started_at is None:
+                self.settings, self.started_at = session.get("settings", {}), session.get("started_at", record["at"])
+            self.ended_at = record["at"]
+            self.responses += 1
+            self.queries.add(record["query"])
+            self.search_limit = record.get("search_limit") or self.search_limit
+            for user in record["includes"].get("users", []): self.users[user["id"]] = user
+            for original in record["includes"].get("tweets", []): self.originals[original["id"]] = original
+            for tweet in record.get("data", []):
+                known = self.tweets.get(tweet["id"])
+                if known is None:
+                    known = self.tweets[tweet["id"]] = dict(tweet, _at=snowflake_time(tweet["id"]), _queries=set())
+                known["_queries"].add(record["query"])
+        if self.started_at is None:
+            raise ValueError(f"No recorded search responses in {directory}")
+
+    @property
+    def hours(self):
+        return (self.ended_at - self.started_at) / 3600
+
+
+class ReplayTwitterAPI(MockTwitterAPI):
+    def __init__(self, recording, **settings):
+        super().__init__(tweets_per_hour=0, history_hours=0, **settings)
+        self.recorded_queries = recording.queries
+        for user_id, user in recording.users.items(): self.users[int(user_id)] = user
+        for original_id, original in recording.originals.items():
+            self.tweet_index[int(original_id)] = dict(original, _at=snowflake_time(original_id))
+            self._ensure_user(original.get("author_id"))
+        self.pending = deque(sorted(recording.tweets.values(), key=lambda tweet: int(tweet["id"]))) # ID order is posting order
+        self.served_at = {} # tweet ID -> simulated time a search first returned it
+        self.unrecorded_query_searches = 0
+
+    def _ensure_user(self, author_id):
+        if author_id and int(author_id) not in self.users:
+            self.users[int(author_id)] = {"id": str(author_id), "name": f"User {author_id}", "username": f"user{author_id}"}
+
+    def _generate_until(self, now):
+        # Releases the recorded tweets posted up to now
+        while self.pending and self.pending[0]["_at"] <= now:
+            tweet = self.pending.popleft()
+            self._ensure_user(tweet.get("author_id"))
+            self.tweets.append(tweet)
+            self.tweet_index[int(tweet["id"])] = tweet
+        self.generated_until = now
+        cutoff = now - SEARCH_WINDOW_SECONDS
+        while self.tweets and self.tweets[0]["_at"] < cutoff:
+            del self.tweet_index[int(self.tweets.popleft()["id"])]
+
+    def _matches(self, tweet, search_query):
+        return search_query not in self.recorded_queries or search_query in tweet["_queries"]
+
+    def _search(self, now, query):
+        if query.get("query", "") not in self.recorded_queries: self.unrecorded_query_searches += 1
+        payload = super()._search(now, query)
+        for tweet in payload.get("data", []): self.served_at.setdefault(tweet["id"], now)
+        return payload
+
+
+def superseded_overrides(overrides):
+    # {setting: why it has no effect} for the overrides a replay ignores
+    return {setting: FALLBACK_SETTINGS[setting] for setting in overrides if setting in FALLBACK_SETTINGS}
+
+
+def warn_superseded(name, overrides):
+    for setting, reason in superseded_overrides(overrides).items():
+        logging.warning("Config %s: %s is only a fallback and does not change a replay; %s.", name, setting, reason)
+
+
+def parse_overrides(assignments, configs=None):
+    # "NAME:SETTING=VALUE" strings -> {name: {setting: value}}, added to `configs`
+    from twitter_bot import SETTINGS, parse_setting
+    configs = configs if configs is not None else {}
+    for assignment in assignments:
+        name, _, setting_value = assignment.partition(":")
+        setting, _, raw_value = setting_value.partition("=")
+        if not name or not raw_value or setting not in SETTINGS:
+            raise ValueError(f"Expected NAME:SETTING=VALUE with a bot setting, got {assignment!r}")
+        configs.setdefault(name, {})[setting] = parse_setting(setting, raw_value)
+        warn_superseded(name, {setting: raw_value})
+    return configs
+
+
+def run_config(directory, name, overrides, tier="basic", drain=WINDOW_SECONDS, latency=0.3):
+    # Entry point of a worker process: replays the recording with one config and returns its results
+    from bench_bot_throughput import BENCH_CREDENTIALS, quiet_bot_logging
+    from twitter_bot import SETTINGS, TwitterBot
+    from virtual_clock import SimulationComplete, VirtualClock
+
+    quiet_bot_logging()
+    recording = Recording(directory)
+    clock = VirtualClock(start=recording.started_at, stop_at=recording.ended_at + drain)
+    rate_limits = dict(RATE_LIMIT_TIERS[tier])
+    if recording.search_limit: rate_limits["search"] = (recording.search_limit, None)
+    mock_api = ReplayTwitterAPI(recording, clock=clock, sleep=clock.advance, rate_limits=rate_limits, latency=latency)
+    server = MockTwitterServer(mock_api).start()
+    wall_start = perf_counter()
+    try:
+        with tempfile.TemporaryDirectory() as state_dir:
+            settings = dict(recording.settings, **overrides)
+            bot = TwitterBot(clock=clock, show_countdown=False, api_base_url=server.base_url)
+            bot.configure_from_profile({"name": name, "query": settings.get("query", "")}, state_dir)
+            for setting, value in settings.items():
+                setattr(bot, setting, set(value) if isinstance(SETTINGS[setting], set) else value)
+            bot.build_tweet_filter()
+            try:
+                bot.run(BENCH_CREDENTIALS)
+            except SimulationComplete:
+                pass
+    finally:
+        server.stop()
+
+    stats = mock_api.stats
+    simulated_seconds = clock() - recording.started_at
+    searches = stats.get("search", {}).get("requests", 0)
+    search_allowance = rate_limits["search"][0] * math.ceil(simulated_seconds / WINDOW_SECONDS)
+    delays = sorted(served_at - recording.tweets[tweet_id]["_at"] for tweet_id, served_at in mock_api.served_at.items())
+    return {"name": name, "overrides": overrides, "hours": simulated_seconds / 3600, "wall_seconds": perf_counter() - wall_start,
+            "actions": {action: stats.get(action, {}).get("ok", 0) for action in ("retweet", "like", "follow")},
+            "requests": {endpoint: endpoint_stats.get("requests", 0) for endpoint, endpoint_stats in stats.items()},
+            "searches": searches, "search_quota_used": searches / max(search_allowance, 1),
+            "rate_limited": sum(endpoint_stats.get("rate_limited", 0) for endpoint_stats in stats.values()),
+            "duplicate_actions": sum(stats.get(action, {}).get("duplicates", 0) for action in ("retweet", "like", "follow")),
+            "recorded_tweets": len(recording.tweets), "missed_tweets": len(recording.tweets) - len(mock_api.served_at),
+            "delay_p50": delays[len(delays) // 2] if delays else None, "delay_p90": delays[int(len(delays) * 0.9)] if delays else None,
+            "unrecorded_query_searches": mock_api.unrecorded_query_searches, "superseded": sorted(superseded_overrides(overrides))}
+
+
+def run_configs(directory, configs, tier="basic", drain=WINDOW_SECONDS, workers=None):
+    # Runs every config in its own (spawned) process; returns their results in the order of `configs`
+    with ProcessPoolExecutor(max_workers=workers or min(len(configs), os.cpu_count() or 1),
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(run_config, directory, name, overrides, tier, drain) for name, overrides in configs.items()]
+        return [future.result() for future in futures]
+
+
+def format_result(result):
+    actions = result["actions"]
+    delay = (f"delay p50 {result['delay_p50'] / 60:5.1f}m p90 {result['delay_p90'] / 60:5.1f}m" if result["delay_p50"] is not None else "no tweets served")
+    line = (f"{result['name']:<20} actions={sum(actions.values()):5} (rt {actions['retweet']}, like {actions['like']}, follow {actions['follow']})  "
+            f"searches={result['searches']:>5} ({result['search_quota_used']:5.1%} of quota)  requests={sum(result['requests'].values()):>5}  "
+            f"429={result['rate_limited']:<4} dup={result['duplicate_actions']:<4} "
+            f"missed={result['missed_tweets']:>5}/{result['recorded_tweets']} ({result['missed_tweets'] / max(result['recorded_tweets'], 1):5.1%})  {delay}")
+    if result["unrecorded_query_searches"]: line += f"  [{result['unrecorded_query_searches']} searches for unrecorded queries]"
+    if result["superseded"]: line += f"  [no effect in a replay: {', '.join(result['superseded'])}]"
+    return line
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Replay recorded search responses through the bot with candidate configs.")
+    arg_parser.add_argument("recording_dir")
+    arg_parser.add_argument("--configs", default=None, help="JSON file mapping config names to bot setting overrides.")
+    arg_parser.add_argument("--set", dest="assignments", action="append", default=[], metavar="NAME:SETTING=VALUE",
+                            help="Override a setting in a config (created if new); repeatable.")
+    arg_parser.add_argument("--tier", choices=sorted(RATE_LIMIT_TIERS), default="basic", help="Rate limits of the action endpoints.")
+    arg_parser.add_argument("--workers", type=int, default=None, help="Configs replayed at once (default: one per CPU).")
+    arg_parser.add_argument("--drain-minutes", type=float, default=WINDOW_SECONDS / 60,
+                            help="Simulated minutes the bot keeps running after the last recorded response.")
+    arg_parser.add_argument("--json", dest="json_output", action="store_true", help="Print the results as JSON lines.")
+    cli_args = arg_parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(message)s")
+    if not recording_files(cli_args.recording_dir): arg_parser.error(f"No search-*.jsonl.gz recordings in {cli_args.recording_dir}")
+    candidate_configs = {BASELINE_CONFIG: {}}
+    try:
+        if cli_args.configs:
+            with open(cli_args.configs, 'r', encoding='utf-8') as f: file_configs = json.load(f)
+            for config_name, overrides in file_configs.items(): warn_superseded(config_name, overrides)
+            candidate_configs.update(file_configs)
+        parse_overrides(cli_args.assignments, candidate_configs)
+        from twitter_bot import SETTINGS
+        unknown = {setting for overrides in candidate_configs.values() for setting in overrides} - SETTINGS.keys()
+        if unknown: raise ValueError(f"Unknown bot settings: {', '.join(sorted(unknown))}")
+    except (OSError, ValueError) as e:
+        arg_parser.error(str(e))
+    recording = Recording(cli_args.recording_dir)
+    print(f"Recording: {recording.responses} search responses, {len(recording.tweets)} tweets over {recording.hours:.1f}h; "
+          f"replaying {len(candidate_configs)} configs.", file=sys.stderr)
+    for config_result in run_configs(cli_args.recording_dir, candidate_configs, cli_args.tier, cli_args.drain_minutes * 60, cli_args.workers):
+        print(json.dumps(config_result) if cli_args.json_output else format_result(config_result), flush=True)
@@ -0,0 +1,90 @@
+# search_pager.py
+# Lazily paginated search_recent_tweets with a resumable cursor.
+#
+# The API returns the newest matches first and next_token walks towards older ones, so a
+# search from since_id is a "pass" over the range (since_id, newest match]. A pass may take
+# several pages and several search rounds. The cursor records how far down it got, and the
+# group's since_id only moves to the pass's newest ID once the pass reaches since_id. A pass
+# interrupted by the page budget, a rate limit or a restart resumes from its stored cursor.
+# It never restarts from the top, and nothing between since_id and the newest match is skipped.
+import logging
+
+
+class SearchCursor:
+    __slots__ = ("since_id", "until_id", "newest_id", "next_token", "pages")
+
+    def __init__(self, since_id, until_id=None, newest_id=None, next_token=None, pages=0):
+        self.since_id = since_id      # lower bound of the pass (exclusive)
+        self.until_id = until_id      # oldest ID processed so far; the rest of the pass lies below it
+        self.newest_id = newest_id    # newest ID of the pass; the since_id once the pass completes
+        self.next_token = next_token  # pagination token for the next page, when the API gave one
+        self.pages = pages
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(**{name: state.get(name) for name in cls.__slots__ if name != "pages"}, pages=state.get("pages", 0))
+
+
+class SearchPage:
+    # One page of results in the shape plan_page() expects, with tweets oldest-first
+    __slots__ = ("data", "includes", "meta")
+
+    def __init__(self, data, includes, meta):
+        self.data = data
+        self.includes = includes
+        self.meta = meta
+
+
+class PaginatedSearch:
+    # Iterating yields SearchPages lazily, one API request per page, and stops after max_pages,
+    # once has_budget() says the next request would have to wait, or when the pass completes.
+    #   fetch_page(since_id, until_id, next_token) -> response with .data/.includes/.meta, or None on failure
+    # Afterwards: completed (the pass reached since_id; newest_id is the new since_id), cursor
+    # (to resume an incomplete pass; None once completed), failed (a request failed), pages.
+    def __init__(self, fetch_page, since_id, cursor=None, max_pages=1, has_budget=None):
+        self.fetch_page = fetch_page
+        self.cursor = cursor if cursor is not None and cursor.since_id == since_id else SearchCursor(since_id)
+        self.resumed = self.cursor is cursor
+        self.max_pages = max(1, max_pages)
+        self.has_budget = has_budget
+        self.completed = False
+        self.failed = False
+        self.pages = 0
+        self.newest_id = self.cursor.newest_id
+
+    def __iter__(self):
+        cursor = self.cursor
+        while True:
+            if self.pages >= self.max_pages: return
+            if self.pages and self.has_budget is not None and not self.has_budget(): return
+            next_token = cursor.next_token
+            response = self.fetch_page(cursor.since_id, None if next_token else cursor.until_id, next_token)
+            self.pages += 1
+            if response is None:
+                if next_token:
+                    # Tokens can expire across restarts; the same range is still reachable through until_id
+                    logging.warning("Search page with stored next_token failed; resuming the pass below ID %s instead.", cursor.until_id)
+                    cursor.next_token = None
+                    continue
+                self.failed = True
+                return
+
+            tweets = list(response.data or [])
+            if tweets:
+                page_ids = [tweet.id for tweet in tweets]
+                cursor.newest_id = max(page_ids) if cursor.newest_id is None else max(cursor.newest_id, max(page_ids))
+                cursor.until_id = min(page_ids) if cursor.until_id is None else min(cursor.until_id, min(page_ids))
+                self.newest_id = cursor.newest_id
+            cursor.pages += 1
+            cursor.next_token = (response.meta or {}).get("next_token")
+            # Without a since_id there is no backlog to catch up on: the newest page starts the checkpoint
+            if not cursor.next_token or cursor.since_id is None:
+                self.completed = True
+                self.cursor = None
+            if tweets:
+                tweets.sort(key=lambda tweet: tweet.id)
+                yield SearchPage(tweets, response.includes, response.meta)
+            if self.completed: return
@@ -0,0 +1,207 @@
+# search_planner.py
+# Adaptive search polling: when to search each query group next, and with what page size.
+#
+# A SearchPlanner keeps a tweet arrival-rate estimate per packed query group, updated after
+# every search round. The estimate is the tweets found divided by the seconds those searches
+# covered, both decayed with half_life so recent batches count most:
+#   - a pass that reached its since_id covered everything posted after that ID, whose time
+#     is in the ID itself
+#   - a first pass (no since_id) that came back with less than a full page covered the whole
+#     recent-search window
+#   - a pass cut short (the page overflowed and the page budget ran out) covered only its
+#     tweets: from the oldest one's created_at until now, or until the newest one's if the
+#     round resumed an older pass from its cursor
+# No batch counts for more than half_life seconds. Rounds without tweets count too, so a
+# quiet query's rate falls towards zero.
+#
+# The next poll is planned so that the tweets expected by then fit one page with room to
+# spare: arrivals are taken as Poisson, and the page must hold the mean plus margin standard
+# deviations (2 by default). That gives the longest interval that still needs one request
+# per round, capped at max_interval for quiet queries and floored at min_interval for busy
+# ones. The groups share one search budget. If their planned polls would need requests
+# faster than the budget allows (budget_interval(): seconds per request), every interval is
+# stretched by the same factor; the extra tweets then arrive as next_token pages. The page
+# size is the smallest one (10..max_page) that holds the expected tweets with the same margin.
+# Polls tend to start late, after an action and its pause ran past the due time. Like a TCP
+# retransmission timeout, the average lateness plus twice its average deviation is taken off
+# each planned interval.
+# A pass left unfinished is continued after min_interval (or the budget's pace). Until a
+# group has a rate estimate it is polled at the fixed fallback intervals. Every
+# plan is logged with the rate, the interval, the reason for it and the page size.
+import logging
+import math
+from time import time
+
+from backfill import RECENT_SEARCH_WINDOW, snowflake_time
+from candidate_buffer import tweet_timestamp
+
+MIN_PAGE_SIZE = 10 # search_recent_tweets max_results lower bound
+LATENESS_WEIGHT = 0.3 # weight of the latest round in the average lateness of polls
+UNFINISHED = "pass unfinished; continuing it"
+BUDGET_BOUND = "search budget allows"
+
+
+def arrivals_fitting(page_size, margin):
+    # Largest mean m with m + margin * sqrt(m) <= page_size
+    return ((math.sqrt(margin * margin + 4 * page_size) - margin) / 2) ** 2
+
+
+def page_size_for(expected, margin, max_page):
+    return max(MIN_PAGE_SIZE, min(max_page, math.ceil(expected + margin * math.sqrt(expected))))
+
+
+class ArrivalEstimate:
+    __slots__ = ("tweets", "seconds", "updated_at", "batches")
+
+    def __init__(self):
+        self.tweets = 0.0   # decayed tweet count
+        self.seconds = 0.0  # decayed seconds covered
+        self.updated_at = None
+        self.batches = 0
+
+    def add(self, tweets, seconds, now, half_life):
+        if self.updated_at is not None:
+            decay = 0.5 ** (max(0.0, now - self.updated_at) / half_life)
+            self.tweets *= decay
+            self.seconds *= decay
+        self.tweets += tweets
+        self.seconds += seconds
+        self.updated_at = now
+        self.batches += 1
+
+    @property
+    def rate(self):
+        # Tweets per second, or None before the first batch
+        return self.tweets / self.seconds if self.seconds > 0 else None
+
+
+class SearchPlan:
+    __slots__ = ("group_name", "rate", "interval", "page_size", "expected", "reason", "due_at")
+
+    def __init__(self, group_name, rate, interval, page_size, expected, reason, due_at):
+        self.group_name = group_name
+        self.rate = rate            # tweets per second, None without an estimate
+        self.interval = interval    # seconds from the last poll to the next
+        self.page_size = page_size  # max_results of the next pass's first page
+        self.expected = expected    # tweets expected by the next poll
+        self.reason = reason
+        self.due_at = due_at
+
+    def summary(self):
+        rate = f"{self.rate * 3600:.1f} tweets/h" if self.rate is not None else "no arrival rate yet"
+        expected = f" for ~{self.expected:.1f} expected tweets" if self.expected is not None else ""
+        return f"Search plan for group {self.group_name}: {rate}; next poll in {self.interval:.0f}s ({self.reason}), page size {self.page_size}{expected}."
+
+    __str__ = summary # as a log argument, the summary is only built if the record is emitted
+
+
+class SearchPlanner:
+    # budget_interval() -> seconds per search request the budget sustains until its window resets, or None if unknown
+    def __init__(self, query_groups, default_page_size=10, max_page=100, min_interval=15, max_interval=1800,
+                 fallback_intervals=(905, 300), half_life=3600, margin=2.0, budget_interval=None, clock=time):
+        self.query_groups = list(query_groups)
+        self.default_page_size = default_page_size
+        self.max_page = max(MIN_PAGE_SIZE, max_page)
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.interval_found, self.interval_empty = fallback_intervals
+        self.half_life = half_life
+        self.margin = margin
+        self.budget_interval = budget_interval
+        self.clock = clock
+        self.estimates = {query_group.name: ArrivalEstimate() for query_group in self.query_groups}
+        self.plans = {} # group name -> latest SearchPlan
+        self.rounds = {query_group.name: 0 for query_group in self.query_groups}
+        self.overflowed = {query_group.name: 0 for query_group in self.query_groups} # rounds whose first page did not hold every new tweet
+        self.lateness = 0.0 # seconds polls start after they were due (actions and their pauses run over), averaged
+        self.lateness_deviation = 0.0 # average distance from that mean
+        self._round = [clock(), 0, None, None]
+
+    def next_group(self):
+        # The group whose poll is due first (groups not searched yet first, in their order); starts its round
+        query_group = min(self.query_groups, key=lambda query_group: self.plans[query_group.name].due_at if query_group.name in self.plans else float("-inf"))
+        self._round = [self.clock(), 0, None, None] # started at, tweets, oldest and newest created_at
+        return query_group
+
+    def seconds_until_next(self):
+        return max(0.0, min((self.plans[query_group.name].due_at if query_group.name in self.plans else 0.0)
+                            for query_group in self.query_groups) - self.clock())
+
+    def page_size(self, query_group):
+        plan = self.plans.get(query_group.name)
+        return plan.page_size if plan is not None else self.default_page_size
+
+    def observe_page(self, page):
+        # Every page of the round started by next_group(), tweets oldest first
+        if not page.data: return
+        now = self.clock()
+        oldest, newest = tweet_timestamp(page.data[0], now), tweet_timestamp(page.data[-1], now)
+        current = self._round
+        current[1] += len(page.data)
+        current[2] = oldest if current[2] is None else min(current[2], oldest)
+        current[3] = newest if current[3] is None else max(current[3], newest)
+
+    def record_round(self, query_group, since_id, complete, resumed, pages):
+        # After a successful round: since_id is the pass's lower bound (None on a first pass), complete that the
+        # pass reached it in this round, resumed that the round continued a pass from a stored cursor
+        now = self.clock()
+        name = query_group.name
+        started_at, tweets_found, oldest, newest = self._round
+        previous = self.plans.get(name)
+        if previous is not None and previous.reason != UNFINISHED and not previous.reason.startswith(BUDGET_BOUND):
+            # Waits for the search budget are not lateness: the budget-bound plan already accounts for them
+            late = max(0.0, started_at - previous.due_at)
+            self.lateness_deviation += LATENESS_WEIGHT * (abs(late - self.lateness) - self.lateness_deviation)
+            self.lateness += LATENESS_WEIGHT * (late - self.lateness)
+        self.rounds[name] += 1
+        if pages > 1 or not complete: self.overflowed[name] += 1
+        # Seconds in which every posted tweet was found: from the pass's since_id, or the whole search window,
+        # or only the found tweets' own span; up to now unless the round continued an older pass
+        if complete and since_id is not None: covered_from = snowflake_time(since_id)
+        elif complete and not resumed and tweets_found < self.page_size(query_group): covered_from = now - RECENT_SEARCH_WINDOW
+        else: covered_from = oldest
+        covered_until = newest if resumed else now
+        if covered_from is not None and covered_until is not None:
+            self.estimates[name].add(tweets_found, min(self.half_life, max(1.0, covered_until - covered_from)), now, self.half_life)
+        plan = self._plan(query_group, tweets_found, now, complete)
+        notes = f" Polls start {self.lateness:.0f}s (+/- {self.lateness_deviation:.0f}s) late on average." if self.lateness >= 1 else ""
+        if self.overflowed[name]: notes += f" {self.overflowed[name]} of {self.rounds[name]} rounds overflowed their first page."
+        logging.info("%s%s", plan, notes)
+        return plan
+
+    def _desired_interval(self, rate):
+        # (seconds, reason) for a group's next poll, before the budget is shared out
+        if rate <= 0: return self.max_interval, "no recent tweets; longest interval"
+        interval = arrivals_fitting(self.max_page, self.margin) / rate
+        if interval >= self.max_interval: return self.max_interval, "quiet; longest interval"
+        if interval <= self.min_interval: return self.min_interval, "busy; shortest interval"
+        return interval, f"fills a {self.max_page}-tweet page"
+
+    def _plan(self, query_group, tweets_found, now, complete=True):
+        rate = self.estimates[query_group.name].rate
+        if not complete:
+            # The rest of the pass is a backlog of known size: continue it as soon as the budget allows
+            interval = max(self.min_interval, self.budget_interval() or 0) if self.budget_interval is not None else self.min_interval
+            plan = SearchPlan(query_group.name, rate, interval, self.max_page, None, UNFINISHED, now + interval)
+            self.plans[query_group.name] = plan
+            return plan
+        if rate is None:
+            interval = self.interval_found if tweets_found else self.interval_empty
+            plan = SearchPlan(query_group.name, None, interval, self.default_page_size, None, "fixed interval until a rate is known", now + interval)
+            self.plans[query_group.name] = plan
+            return plan
+        interval, reason = self._desired_interval(rate)
+        budget_interval = self.budget_interval() if self.budget_interval is not None else None
+        if budget_interval:
+            # Requests per second all groups' plans need, against the rate the budget sustains
+            demand = 1 / interval + sum(1 / self._desired_interval(self.estimates[other.name].rate or 0)[0]
+                                        for other in self.query_groups if other.name != query_group.name and other.name in self.plans)
+            stretch = demand * budget_interval
+            if stretch > 1:
+                interval *= stretch
+                reason = f"{BUDGET_BOUND} one request per {budget_interval:.0f}s"
+        expected = rate * interval
+        interval = max(self.min_interval, interval - self.lateness - 2 * self.lateness_deviation) # so a late poll still starts in time
+        plan = SearchPlan(query_group.name, rate, interval, page_size_for(expected, self.margin, self.max_page), expected, reason, now + interval)
+        self.plans[query_group.name] = plan
+        return plan
@@ -0,0 +1,125 @@
+# search_recording.py
+# Records the raw search_recent_tweets responses of a bot session, for replay_whatif.py.
+#
+# A SearchRecorder is a requests response hook on the bot's tweepy client, like the rate
+# budget's. Every successful search response is appended to <directory>/search-<start>.jsonl.gz,
+# one JSON object per line:
+#   {"session": {"started_at", "settings"}}    first line: the REPLAYED_SETTINGS of the bot
+#   {"at", "query", "params", "search_limit", "data", "includes", "meta"}   one per response
+# "params" holds the paging parameters (since_id, until_id, next_token, start_time, end_time,
+# max_results) and "search_limit" the x-rate-limit-limit header, so a replay can enforce the
+# same search quota. Authors repeat across pages, so includes.users only lists users not yet
+# written to the file; read_recording() puts them back. The gzip stream is flushed every
+# flush_interval seconds. A file cut off by a crash is read up to its last complete line.
+import glob
+import gzip
+import json
+import logging
+import os
+import threading
+import zlib
+from datetime import datetime, timezone
+from time import time
+from urllib.parse import parse_qs, urlparse
+
+from rate_budget import endpoint_for_request
+
+# Bot settings a replay starts from; what-if configs override some of them
+REPLAYED_SETTINGS = ("query", "extra_queries", "perform_retweet", "perform_like", "perform_follow", "max_results_per_search",
+                     "search_query_max_length", "search_max_pages_per_round", "catch_up_max_results",
+                     "search_interval_success", "search_interval_no_results", "min_search_interval",
+                     "adaptive_search", "search_interval_max", "search_rate_half_life",
+                     "like_cooldown_seconds", "follow_cooldown_seconds", "retweet_cooldown_seconds", "sleep_between_batch_actions",
+                     "user_blocklist_usernames", "negative_keywords_in_text", "target_languages",
+                     "near_duplicate_threshold", "near_duplicate_window", "near_duplicate_capacity",
+                     "candidate_buffer_size", "candidate_max_age_seconds", "candidate_half_life_seconds")
+PAGING_PARAMS = ("since_id", "until_id", "next_token", "start_time", "end_time", "max_results")
+
+
+def replayed_settings(bot):
+    # JSON-safe copy of a TwitterBot's REPLAYED_SETTINGS (sets become sorted lists)
+    return {name: sorted(value) if isinstance(value, (set, frozenset)) else value for name, value in
+            ((name, getattr(bot, name)) for name in REPLAYED_SETTINGS)}
+
+
+class SearchRecorder:
+    def __init__(self, directory, settings=None, flush_interval=5.0, clock=time):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.clock = clock
+        os.makedirs(directory, exist_ok=True)
+        started_at = clock()
+        self.path = os.path.join(directory, f"search-{datetime.fromtimestamp(started_at, timezone.utc):%Y%m%dT%H%M%S}.jsonl.gz")
+        self.file = gzip.open(self.path, 'at', encoding='utf-8', compresslevel=6)
+        self.users_written = set()
+        self.responses = 0
+        self._last_flush_at = started_at
+        self._lock = threading.Lock() # backfill workers search concurrently
+        self._write({"session": {"started_at": started_at, "settings": settings or {}}})
+
+    def install(self, client):
+        hooks = client.session.hooks.setdefault("response", [])
+        if self.response_hook not in hooks: hooks.append(self.response_hook)
+        return self
+
+    def response_hook(self, response, *args, **kwargs):
+        try:
+            request = response.request
+            url = urlparse(request.url)
+            if response.status_code == 200 and endpoint_for_request(request.method, url.path) == "search":
+                self.record(parse_qs(url.query), response.json(), response.headers.get("x-rate-limit-limit"))
+        except Exception as e:
+            logging.debug("Could not record search response: %s", e)
+        return response
+
+    def record(self, query_params, payload, search_limit=None):
+        params = {name: query_params[name][-1] for name in PAGING_PARAMS if query_params.get(name)}
+        with self._lock:
+            includes = dict(payload.get("includes") or {})
+            if "users" in includes:
+                includes["users"] = [user for user in includes["users"] if user["id"] not in self.users_written]
+                self.users_written.update(user["id"] for user in includes["users"])
+            self._write({"at": self.clock(), "query": query_params.get("query", [""])[-1], "params": params,
+                         "search_limit": int(search_limit) if search_limit else None,
+                         "data": payload.get("data", []), "includes": includes, "meta": payload.get("meta", {})})
+            self.responses += 1
+            if self.clock() - self._last_flush_at >= self.flush_interval: self._flush()
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, separators=(',', ':')) + "\n")
+
+    def _flush(self):
+        self.file.flush() # a sync flush: everything so far can be decompressed even if the process dies
+        self._last_flush_at = self.clock()
+
+    def close(self):
+        with self._lock:
+            self.file.close()
+        logging.info("Recorded %s search responses in %s.", self.responses, self.path)
+
+
+def recording_files(directory):
+    return sorted(glob.glob(os.path.join(directory, "search-*.jsonl.gz")))
+
+
+def read_recording(directory):
+    # Yields (session, record) for every recorded response in the directory's files, oldest file first.
+    # Each record's includes.users is complete again.
+    for path in recording_files(directory):
+        session, users = {}, {}
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    try: record = json.loads(line)
+                    except ValueError: break # the last line of a file cut off mid-write
+                    if "session" in record:
+                        session = record["session"]
+                        continue
+                    includes = record.get("includes") or {}
+                    for user in includes.get("users", []): users[user["id"]] = user
+                    author_ids = {tweet.get("author_id") for tweet in record.get("data", [])} | \
+                                 {tweet.get("author_id") for tweet in includes.get("tweets", [])}
+                    record["includes"] = dict(includes, users=[users[author_id] for author_id in author_ids if author_id in users])
+                    yield session, record
+            except (EOFError, zlib.error, gzip.BadGzipFile):
+                logging.warning("Recording %s ends early (the recorder was not closed); read it up to that point.", path)
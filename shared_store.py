@@ -0,0 +1,167 @@
+# shared_store.py
+# Cross-process state shared by the workers started from orchestrator.py.
+#
+# One SQLite database (WAL mode, so readers never block the single writer) holds:
+#   seen_tweets   which profile claimed each tweet; a tweet is evaluated by exactly one worker
+#   actions       per-account action history (account_id, action, target_id)
+#   worker_stats  counters each worker reports, aggregated by the orchestrator
+# Every process opens its own SharedStore; a lock serialises the threads of one process.
+import logging
+import sqlite3
+import threading
+from time import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_tweets (
+    tweet_id INTEGER PRIMARY KEY,
+    profile TEXT NOT NULL,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS seen_tweets_seen_at ON seen_tweets (seen_at);
+CREATE TABLE IF NOT EXISTS actions (
+    account_id INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    target_id INTEGER NOT NULL,
+    profile TEXT NOT NULL,
+    done_at REAL NOT NULL,
+    PRIMARY KEY (account_id, action, target_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS worker_stats (
+    profile TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (profile, name)
+) WITHOUT ROWID;
+"""
+SQLITE_MAX_VARIABLES = 900 # stay under SQLite's default bound-parameter limit
+SEEN_TWEET_RETENTION_SECONDS = 8 * 24 * 3600 # recent search only reaches back 7 days
+
+
+class SharedStore:
+    def __init__(self, db_path, timeout_seconds=30):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=timeout_seconds, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Seen tweets ---
+    def claim_tweets(self, profile, tweet_ids):
+        # Claims unclaimed tweets for `profile`; returns the IDs this profile owns (new or claimed earlier)
+        tweet_ids = [int(tweet_id) for tweet_id in tweet_ids]
+        if not tweet_ids: return set()
+        now = time()
+        owned = set()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for start in range(0, len(tweet_ids), SQLITE_MAX_VARIABLES):
+                    chunk = tweet_ids[start:start + SQLITE_MAX_VARIABLES]
+                    self._conn.executemany("INSERT OR IGNORE INTO seen_tweets (tweet_id, profile, seen_at) VALUES (?, ?, ?)",
+                                           [(tweet_id, profile, now) for tweet_id in chunk])
+                    placeholders = ",".join("?" * len(chunk))
+                    owned.update(row[0] for row in self._conn.execute(
+                        f"SELECT tweet_id FROM seen_tweets WHERE profile = ? AND tweet_id IN ({placeholders})", [profile, *chunk]))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.increment(profile, "tweets_claimed", len(owned))
+        self.increment(profile, "tweets_claimed_elsewhere", len(tweet_ids) - len(owned))
+        return owned
+
+    def prune_seen_tweets(self, retention_seconds=SEEN_TWEET_RETENTION_SECONDS):
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM seen_tweets WHERE seen_at < ?", (time() - retention_seconds,)).rowcount
+        if deleted: logging.info("Pruned %s seen tweet IDs older than %ss from %s.", deleted, retention_seconds, self.db_path)
+        return deleted
+
+    # --- Per-account action history ---
+    def has_action(self, account_id, action, target_id):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM actions WHERE account_id = ? AND action = ? AND target_id = ?",
+                                     (int(account_id), action, int(target_id))).fetchone()
+        return row is not None
+
+    def record_action(self, account_id, action, target_id, profile):
+        with self._lock:
+            inserted = self._conn.execute("INSERT OR IGNORE INTO actions (account_id, action, target_id, profile, done_at) VALUES (?, ?, ?, ?, ?)",
+                                          (int(account_id), action, int(target_id), profile, time())).rowcount
+        return inserted > 0
+
+    def record_actions(self, account_id, action, target_ids, profile):
+        # Bulk counterpart of record_action() in one transaction (history sync); returns how many were new
+        now = time()
+        rows = [(int(account_id), action, int(target_id), profile, now) for target_id in target_ids]
+        if not rows: return 0
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("INSERT OR IGNORE INTO actions (account_id, action, target_id, profile, done_at) VALUES (?, ?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return self._conn.total_changes - before
+
+    def count_actions(self, account_id, action):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM actions WHERE account_id = ? AND action = ?", (int(account_id), action)).fetchone()[0]
+
+    # --- Stats ---
+    def increment(self, profile, name, amount=1):
+        if not amount: return
+        with self._lock:
+            self._conn.execute("INSERT INTO worker_stats (profile, name, value) VALUES (?, ?, ?) "
+                               "ON CONFLICT (profile, name) DO UPDATE SET value = value + excluded.value", (profile, name, amount))
+
+    def stats(self):
+        # {profile: {name: value}}, including action counts per profile
+        with self._lock:
+            rows = self._conn.execute("SELECT profile, name, value FROM worker_stats").fetchall()
+            rows += self._conn.execute("SELECT profile, action || 's', COUNT(*) FROM actions GROUP BY profile, action").fetchall()
+        stats = {}
+        for profile, name, value in rows:
+            stats.setdefault(profile, {})[name] = value
+        return stats
+
+
+class SharedActionHistory:
+    # Set-like view of one account's history for one action type, backed by the local IdStore
+    # (fast path) and the shared database (so profiles running the same account see each other's actions).
+    def __init__(self, shared_store, account_id, action, profile, local_store):
+        self.shared_store = shared_store
+        self.account_id = account_id
+        self.action = action
+        self.profile = profile
+        self.local_store = local_store
+
+    def __contains__(self, item_id):
+        if item_id in self.local_store: return True
+        if self.shared_store.has_action(self.account_id, self.action, item_id):
+            self.local_store.add(item_id) # done by another worker on the same account
+            return True
+        return False
+
+    def __len__(self):
+        return len(self.local_store)
+
+    def add(self, item_id):
+        added = self.local_store.add(item_id)
+        self.shared_store.record_action(self.account_id, self.action, item_id, self.profile)
+        return added
+
+    def add_many(self, item_ids):
+        item_ids = list(item_ids)
+        added = self.local_store.add_many(item_ids)
+        self.shared_store.record_actions(self.account_id, self.action, item_ids, self.profile)
+        return added
+
+    def close(self):
+        self.local_store.close()
@@ -0,0 +1,112 @@
+# state_journal.py
+# Append-only write-ahead journal with group commit, kept next to an atomically replaced snapshot.
+#
+# Records are JSON lines. append() only buffers a record; commit() writes everything buffered
+# and fsyncs once. A search page's planned candidates and the cursor that moves past the page
+# therefore cost a single disk sync. A commit also happens on append once commit_every records
+# or commit_interval seconds have piled up, without a timer thread. On replay, a torn last line
+# (a crash mid-write) is dropped. write_snapshot() replaces a file atomically: temp file,
+# fsync, rename, directory fsync. Once a snapshot holds the journal's effect, reset() truncates
+# the journal. Replaying records onto the snapshot they were folded into yields the same state,
+# so a crash between the rename and the truncate is harmless.
+import json
+import logging
+import os
+import threading
+from time import time
+
+
+def fsync_directory(path):
+    # Makes a rename in the directory durable (no-op where directories cannot be opened)
+    try:
+        dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try: os.fsync(dir_fd)
+    except OSError: pass
+    finally: os.close(dir_fd)
+
+
+def write_snapshot(path, payload):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_directory(path)
+
+
+class StateJournal:
+    def __init__(self, path, commit_every=256, commit_interval=1.0, compact_after=5000, clock=time):
+        self.path = path
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.compact_after = compact_after
+        self.clock = clock
+        self.record_count = 0 # records in the journal file (committed or not) since the last reset
+        self.commits = 0
+        self._pending = []
+        self._oldest_pending_at = None
+        self._lock = threading.Lock()
+        self._file = None
+
+    def replay(self):
+        # Records committed before the last shutdown or crash, oldest first
+        records = []
+        if not os.path.exists(self.path): return records
+        with open(self.path, 'rb') as f: content = f.read()
+        complete_length = content.rfind(b"\n") + 1
+        if complete_length < len(content):
+            # A crash mid-write; cut the partial record so new appends start on a fresh line
+            logging.warning("Truncating a partial last record (%s bytes) in %s.", len(content) - complete_length, self.path)
+            with open(self.path, 'r+b') as f: f.truncate(complete_length)
+        for line_number, line in enumerate(content[:complete_length].split(b"\n")):
+            if not line.strip(): continue
+            try: records.append(json.loads(line))
+            except ValueError: logging.warning("Ignoring unreadable record %s in %s.", line_number + 1, self.path)
+        self.record_count = len(records)
+        return records
+
+    def append(self, record):
+        line = json.dumps(record, separators=(",", ":"))
+        with self._lock:
+            self._pending.append(line)
+            self.record_count += 1
+            if self._oldest_pending_at is None: self._oldest_pending_at = self.clock()
+            due = len(self._pending) >= self.commit_every or self.clock() - self._oldest_pending_at >= self.commit_interval
+        if due: self.commit()
+
+    def commit(self):
+        # One write and one fsync for everything appended since the last commit
+        with self._lock:
+            if not self._pending: return False
+            if self._file is None: self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write("\n".join(self._pending) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = []
+            self._oldest_pending_at = None
+            self.commits += 1
+        return True
+
+    def needs_compaction(self):
+        return self.record_count >= self.compact_after
+
+    def reset(self):
+        # Call only after a snapshot containing every appended record's effect has been written
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._pending = []
+            self._oldest_pending_at = None
+            self.record_count = 0
+            write_snapshot(self.path, "")
+
+    def close(self):
+        self.commit()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
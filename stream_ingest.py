@@ -0,0 +1,213 @@
+# stream_ingest.py
+# Filtered-stream ingestion: tweets matching the watched queries are pushed to the bot as they
+# are posted, instead of being polled from recent search every few minutes.
+#
+# Each packed query group becomes one stream rule. Our rules carry RULE_TAG_PREFIX in their
+# tag, so sync_stream_rules() can add missing ones and delete stale ones without touching
+# rules other tools created on the same app. A FilteredStream reads the connection on a
+# daemon thread. It queues one page per streamed tweet, routed to its group through the
+# matching rule IDs. Reconnects back off as the API documentation asks:
+#   network errors: linearly by 250 ms, up to 16 s
+#   HTTP errors: exponentially from 5 s (60 s after a 429), up to 320 s
+# The server sends a keep-alive newline every 20 s, so a connection silent for stall_timeout
+# is dropped and reopened. The backoff only resets once a connection has delivered data. A 401/403 (no filtered-stream access on this tier), or more than
+# max_failures failed connects in a row, ends the stream with StreamUnavailable. The bot
+# then falls back to polling search.
+import json
+import logging
+import queue
+import threading
+from time import time
+
+import requests
+import tweepy
+
+from search_pager import SearchPage
+
+STREAM_URL = "https://api.twitter.com/2/tweets/search/stream"
+RULE_TAG_PREFIX = "interactive-bot:"
+NETWORK_BACKOFF_STEP = 0.25
+NETWORK_BACKOFF_MAX = 16
+HTTP_BACKOFF_START = 5
+HTTP_BACKOFF_MAX = 320
+RATE_LIMIT_BACKOFF_START = 60
+CONNECT_TIMEOUT = 10
+
+
+class StreamUnavailable(Exception):
+    pass
+
+
+def sync_stream_rules(streaming_client, query_groups):
+    # Makes the stream rules tagged as ours match the query groups; returns {rule ID: query group}
+    wanted = {group.query: group for group in query_groups}
+    rule_groups = {}
+    try:
+        stale_ids = []
+        for rule in streaming_client.get_rules().data or []:
+            if not (rule.tag or "").startswith(RULE_TAG_PREFIX): continue
+            group = wanted.pop(rule.value, None)
+            if group is None: stale_ids.append(rule.id)
+            else: rule_groups[str(rule.id)] = group
+        if stale_ids:
+            streaming_client.delete_rules(stale_ids)
+            logging.info("Deleted %s stale filtered-stream rules.", len(stale_ids))
+        if wanted:
+            response = streaming_client.add_rules([tweepy.StreamRule(value=group.query, tag=RULE_TAG_PREFIX + group.name)
+                                                   for group in wanted.values()])
+            for rule in response.data or []:
+                rule_groups[str(rule.id)] = wanted[rule.value]
+            for error in response.errors or []:
+                logging.warning("Filtered-stream rule rejected: %s", error)
+            logging.info("Added %s filtered-stream rules.", len(response.data or []))
+    except tweepy.TweepyException as e:
+        raise StreamUnavailable(f"could not set up the stream rules: {e}") from e
+    if not rule_groups: raise StreamUnavailable("no stream rule was accepted")
+    return rule_groups
+
+
+def merge_pages(routed_tweets):
+    # [(group, SearchPage with one tweet)] -> one SearchPage per group, in arrival order
+    merged = {}
+    for group, page in routed_tweets:
+        group_page = merged.get(id(group))
+        if group_page is None:
+            merged[id(group)] = (group, SearchPage(list(page.data), {key: list(values) for key, values in page.includes.items()}, {}))
+            continue
+        group_page[1].data.extend(page.data)
+        for key, values in page.includes.items():
+            group_page[1].includes.setdefault(key, []).extend(values)
+    return list(merged.values())
+
+
+class FilteredStream:
+    def __init__(self, streaming_client, rule_groups, params, sleep, clock=time, stall_timeout=30, max_failures=8, metrics=None):
+        self.streaming_client = streaming_client
+        self.rule_groups = rule_groups
+        self.params = params
+        self.sleep = sleep
+        self.clock = clock
+        self.stall_timeout = stall_timeout
+        self.max_failures = max_failures
+        self.metrics = metrics
+        self.running = False
+        self.failure = None # StreamUnavailable once the reader gave up
+        self._queue = queue.SimpleQueue()
+        self._failures = 0 # failed connects since data last arrived
+        self._network_wait = 0.0
+        self._http_wait = HTTP_BACKOFF_START
+        self._response = None
+        self._thread = None
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="filtered-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        response = self._response
+        if response is not None:
+            try: response.close() # unblocks the reader
+            except Exception: pass
+        if self._thread is not None:
+            self._thread.join(timeout=CONNECT_TIMEOUT)
+            self._thread = None
+
+    def get(self, timeout):
+        # Waits up to `timeout` seconds for streamed tweets; returns [(group, SearchPage)] for everything queued.
+        # Raises StreamUnavailable once the reader has given up and the queue is drained.
+        routed_tweets = []
+        if self.failure is None:
+            try:
+                item = self._queue.get(timeout=timeout)
+                while True:
+                    if isinstance(item, StreamUnavailable):
+                        self.failure = item
+                        break
+                    routed_tweets.append(item)
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+        if not routed_tweets and self.failure is not None: raise self.failure
+        return merge_pages(routed_tweets)
+
+    # --- Reader thread ---
+    def _run(self):
+        try:
+            while self.running:
+                wait = 0
+                started_at = self.clock()
+                try:
+                    headers = {"Authorization": f"Bearer {self.streaming_client.bearer_token}"}
+                    with self.streaming_client.session.get(STREAM_URL, params=self.params, headers=headers, stream=True,
+                                                           timeout=(CONNECT_TIMEOUT, self.stall_timeout)) as response:
+                        self._response = response
+                        if response.status_code == 200:
+                            self._record("ok", started_at)
+                            logging.info("Connected to the filtered stream.")
+                            self._read(response)
+                            if self.running: logging.warning("Filtered stream closed by the server; reconnecting.")
+                        elif response.status_code in (401, 403):
+                            self._record("error", started_at)
+                            raise StreamUnavailable(f"{response.status_code} {response.text[:200]}")
+                        else:
+                            self._record("rate_limited" if response.status_code == 429 else "error", started_at)
+                            if response.status_code == 429: self._http_wait = max(self._http_wait, RATE_LIMIT_BACKOFF_START)
+                            logging.warning("Filtered stream connect failed: %s %s", response.status_code, response.text[:200])
+                            self._failures += 1
+                            wait, self._http_wait = self._http_wait, min(self._http_wait * 2, HTTP_BACKOFF_MAX)
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                    if not self.running: break
+                    logging.warning("Filtered stream connection error: %s", e)
+                    self._failures += 1
+                    wait, self._network_wait = self._network_wait, min(self._network_wait + NETWORK_BACKOFF_STEP, NETWORK_BACKOFF_MAX)
+                finally:
+                    self._response = None
+                if self._failures > self.max_failures:
+                    raise StreamUnavailable(f"{self._failures} failed connects in a row")
+                if self.running:
+                    self._count("reconnect")
+                    if wait:
+                        logging.info("Reconnecting to the filtered stream in %ss.", wait)
+                        self.sleep(wait)
+        except StreamUnavailable as e:
+            self._queue.put(e)
+        except KeyboardInterrupt:
+            pass # shutdown requested during a backoff sleep
+        except Exception as e:
+            if not self.running: return # stop() closed the response under the reader
+            logging.error("Filtered stream reader failed: %s", e)
+            self._queue.put(StreamUnavailable(f"reader failed: {e}"))
+        finally:
+            self.running = False
+
+    def _read(self, response):
+        for line in response.iter_lines():
+            if not self.running: return
+            if self._failures or self._network_wait or self._http_wait != HTTP_BACKOFF_START:
+                self._failures, self._network_wait, self._http_wait = 0, 0.0, HTTP_BACKOFF_START # the connection is live
+            if not line:
+                self._count("keep_alive")
+                continue
+            try: payload = json.loads(line)
+            except ValueError:
+                logging.warning("Ignoring an unreadable filtered-stream line (%s bytes).", len(line))
+                continue
+            if "data" not in payload:
+                logging.warning("Filtered stream message: %s", payload.get("errors", payload))
+                continue
+            self._count("tweet")
+            tweet = tweepy.Tweet(payload["data"])
+            includes = self.streaming_client._process_includes(payload.get("includes", {}))
+            groups = {id(group): group for group in (self.rule_groups.get(str(rule["id"])) for rule in payload.get("matching_rules", []))
+                      if group is not None}
+            for group in groups.values():
+                self._queue.put((group, SearchPage([tweet], includes, {})))
+
+    def _record(self, outcome, started_at):
+        if self.metrics is not None: self.metrics.record_api_call("stream", outcome, self.clock() - started_at)
+
+    def _count(self, event):
+        if self.metrics is not None: self.metrics.inc("bot_stream_events_total", event=event)
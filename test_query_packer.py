@@ -0,0 +1,20 @@
+from query_packer import QueryGroup, QuerySinceIds, WatchedQuery
+
+
+def watched(name, query):
+    return WatchedQuery(name, query, ("like",), tweet_filter=None)
+
+
+def test_new_member_joins_the_pass_of_known_members():
+    group = QueryGroup([watched("old", "python"), watched("older", "rust"), watched("new", "zig")])
+    since_ids = QuerySinceIds(None)
+    since_ids.seed("python", 500)
+    since_ids.seed("rust", 300)
+    assert since_ids.for_group(group) == 300
+    assert since_ids.advance(group, 900)
+    assert [since_ids.get(member.query) for member in group.queries] == [900, 900, 900]
+
+
+def test_group_of_new_members_fetches_the_latest_page():
+    group = QueryGroup([watched("a", "python"), watched("b", "rust")])
+    assert QuerySinceIds(None).for_group(group) is None
@@ -0,0 +1,412 @@
+# tweet_archive.py
+# Append-only columnar archive of every tweet the bot planned (acted on or skipped) and of its
+# action attempts, with a small query API and a report CLI.
+#
+# Layout of an archive directory:
+#   strings.jsonl                 string table; line n is the string with code n (code 0 is "")
+#   <table>/<chunk>/<column>.col  one native-endian fixed-width array per column
+#   <table>/<chunk>/text.heap     UTF-8 tweet texts back to back (tweets table); text_end holds each row's end offset
+#   <table>/<chunk>/stats.json    row count and min/max of the table's time column, written when the chunk is sealed
+# Low-cardinality strings (query names, languages, decisions, skip reasons, action names) are
+# stored as uint16 codes into the string table, which therefore holds at most 65536 strings;
+# rows that would need more are dropped with an error. The writer buffers rows and appends them to
+# every column file of the open chunk every flush_rows rows or flush_interval seconds, and
+# starts a new chunk after chunk_rows rows. New strings are written before the rows that use
+# them. When a writer opens an archive, it cuts column files that a crash left uneven back to
+# the row count they all reach.
+#
+# TweetArchive memory-maps the column files and scans them chunk by chunk as memoryviews, so
+# the work per row happens in C (map, compress, Counter). Only the pages a query touches are
+# read, and a scan of millions of rows never loads the archive into memory. Chunks outside
+# a since/until range are skipped using stats.json. The archive can be read while a bot is
+# writing it; readers see the rows flushed so far.
+#
+# Usage: python tweet_archive.py ARCHIVE_DIR [--hours 24] [--query NAME] [--top 10]
+import argparse
+import json
+import logging
+import mmap
+import os
+import threading
+from array import array
+from collections import Counter
+from functools import reduce
+from itertools import compress
+from operator import and_
+from time import time
+
+from candidate_buffer import tweet_timestamp
+
+TABLES = {
+    "tweets": (("tweet_id", "Q"), ("author_id", "Q"), ("created_at", "I"), ("seen_at", "I"), ("query", "H"), ("lang", "H"),
+               ("like_count", "I"), ("retweet_count", "I"), ("reply_count", "I"), ("quote_count", "I"),
+               ("decision", "H"), ("reason", "H"), ("actions", "H"), ("text_end", "Q")),
+    "actions": (("at", "I"), ("action", "H"), ("target_id", "Q"), ("outcome", "H")),
+}
+TIME_COLUMNS = {"tweets": "created_at", "actions": "at"}
+STRING_COLUMNS = {"query", "lang", "decision", "reason", "actions", "action", "outcome"}
+HEAP_FILE = "text.heap"
+STATS_FILE = "stats.json"
+STRINGS_FILE = "strings.jsonl"
+MAX_STRING_CODE = 0xFFFF # string columns are uint16
+METRIC_COLUMNS = {"like_count": "likes", "retweet_count": "retweets", "reply_count": "replies", "quote_count": "quotes"}
+
+# decision: "planned" (the tweet produced targets; actions lists the planned action types, "" when all were
+# already done) or "skipped" (reason holds the skip reason). outcome: "done", "already_done" or "not_done"
+# (cooldown, rate limit or API error).
+DECISION_PLANNED = "planned"
+DECISION_SKIPPED = "skipped"
+
+
+def _chunk_dirs(table_path):
+    if not os.path.isdir(table_path): return []
+    return sorted(os.path.join(table_path, name) for name in os.listdir(table_path) if name.isdigit())
+
+
+def _column_path(chunk_path, column):
+    return os.path.join(chunk_path, column + ".col")
+
+
+def _chunk_rows(chunk_path, columns):
+    # Rows every column file holds completely (the active chunk can be mid-append)
+    rows = []
+    for column, typecode in columns:
+        path = _column_path(chunk_path, column)
+        rows.append(os.path.getsize(path) // array(typecode).itemsize if os.path.exists(path) else 0)
+    return min(rows)
+
+
+class StringTable:
+    def __init__(self, path, writable=False):
+        self.path = path
+        self.strings = [""]
+        self.codes = {"": 0}
+        self._pending = []
+        if os.path.exists(path):
+            with open(path, 'rb') as f: content = f.read()
+            complete_length = content.rfind(b"\n") + 1
+            for line in content[:complete_length].splitlines():
+                string = json.loads(line)
+                self.codes[string] = len(self.strings)
+                self.strings.append(string)
+            if writable and complete_length < len(content):
+                with open(path, 'r+b') as f: f.truncate(complete_length)
+
+    def code(self, string):
+        code = self.codes.get(string)
+        if code is None:
+            if len(self.strings) > MAX_STRING_CODE:
+                raise OverflowError(f"String table {self.path} is full ({len(self.strings)} strings); cannot add {string!r}")
+            code = self.codes[string] = len(self.strings)
+            self.strings.append(string)
+            self._pending.append(json.dumps(string) + "\n")
+        return code
+
+    def flush(self):
+        if not self._pending: return
+        with open(self.path, 'a', encoding='utf-8') as f: f.write("".join(self._pending))
+        self._pending = []
+
+
+class _TableWriter:
+    def __init__(self, table_path, columns, time_column, chunk_rows):
+        self.table_path = table_path
+        self.columns = columns
+        self.time_column = time_column
+        self.chunk_rows = chunk_rows
+        self.has_text = any(column == "text_end" for column, _ in columns)
+        self.pending = {column: array(typecode) for column, typecode in columns if column != "text_end"}
+        self.pending_text = []
+        self.files = {}
+        os.makedirs(table_path, exist_ok=True)
+        chunks = _chunk_dirs(table_path)
+        self.chunk = len(chunks) - 1 if chunks else 0
+        self._open_chunk(repair=bool(chunks))
+
+    def _open_chunk(self, repair=False):
+        # repair: reopen the last chunk after a restart, cutting every file back to the rows all columns hold
+        self.chunk_path = os.path.join(self.table_path, f"{self.chunk:06d}")
+        os.makedirs(self.chunk_path, exist_ok=True)
+        self.rows = _chunk_rows(self.chunk_path, self.columns) if repair else 0
+        self.text_end = 0 # bytes in the text heap
+        for column, typecode in self.columns:
+            with open(_column_path(self.chunk_path, column), 'ab') as f: f.truncate(self.rows * array(typecode).itemsize)
+        if self.has_text:
+            if self.rows:
+                text_ends = array("Q")
+                with open(_column_path(self.chunk_path, "text_end"), 'rb') as f:
+                    f.seek((self.rows - 1) * text_ends.itemsize)
+                    text_ends.fromfile(f, 1)
+                self.text_end = text_ends[0]
+            with open(os.path.join(self.chunk_path, HEAP_FILE), 'ab') as f: f.truncate(self.text_end)
+        self.files = {column: open(_column_path(self.chunk_path, column), 'ab') for column, _ in self.columns}
+        if self.has_text: self.files[HEAP_FILE] = open(os.path.join(self.chunk_path, HEAP_FILE), 'ab')
+        if self.rows >= self.chunk_rows: self._seal()
+
+    def append(self, values, text=None):
+        for column, pending in self.pending.items(): pending.append(values[column])
+        if self.has_text: self.pending_text.append((text or "").encode("utf-8"))
+
+    def pending_rows(self):
+        return len(self.pending[self.columns[0][0]])
+
+    def flush(self):
+        while self.pending_rows():
+            take = min(self.pending_rows(), self.chunk_rows - self.rows)
+            if self.has_text:
+                texts = self.pending_text[:take]
+                del self.pending_text[:take]
+                text_ends = array("Q")
+                for text in texts:
+                    self.text_end += len(text)
+                    text_ends.append(self.text_end)
+                self.files[HEAP_FILE].write(b"".join(texts))
+                text_ends.tofile(self.files["text_end"])
+            for column, pending in self.pending.items():
+                pending[:take].tofile(self.files[column])
+                del pending[:take]
+            self.rows += take
+            for f in self.files.values(): f.flush()
+            if self.rows >= self.chunk_rows: self._seal()
+
+    def _seal(self):
+        self.close()
+        times = TweetArchive.map_column(self.chunk_path, self.time_column, dict(self.columns)[self.time_column], self.rows)
+        with open(os.path.join(self.chunk_path, STATS_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"rows": self.rows, "min_time": min(times, default=0), "max_time": max(times, default=0)}, f)
+        times.release()
+        self.chunk += 1
+        self._open_chunk()
+
+    def close(self):
+        for f in self.files.values(): f.close()
+        self.files = {}
+
+
+class ArchiveWriter:
+    def __init__(self, directory, chunk_rows=1 << 20, flush_rows=4096, flush_interval=5.0, clock=time):
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.clock = clock
+        os.makedirs(directory, exist_ok=True)
+        self.strings = StringTable(os.path.join(directory, STRINGS_FILE), writable=True)
+        self.tables = {table: _TableWriter(os.path.join(directory, table), columns, TIME_COLUMNS[table], chunk_rows)
+                       for table, columns in TABLES.items()}
+        self.rows_written = 0
+        self._last_flush_at = clock()
+        self._lock = threading.Lock() # the async runtime records attempts from the event loop and plans from worker threads
+
+    def record_plan(self, plan, query_name):
+        # One row per tweet of an action_planner.ActionPlan
+        seen_at = int(self.clock())
+        planned_actions = {}
+        for action in plan.actions:
+            for source_id in action.source_ids: planned_actions.setdefault(source_id, []).append(action.action_name)
+        with self._lock:
+            code = self.strings.code
+            table = self.tables["tweets"]
+            try:
+                query = code(query_name)
+                for tweet, reason, _ in plan.tweet_decisions:
+                    metrics = tweet.public_metrics or {}
+                    # Every code is looked up before append(), so a full string table never leaves a partial row
+                    table.append({"tweet_id": tweet.id, "author_id": int(tweet.author_id or 0), "created_at": int(tweet_timestamp(tweet, seen_at)),
+                                  "seen_at": seen_at, "query": query, "lang": code(tweet.lang or ""),
+                                  "like_count": metrics.get("like_count", 0), "retweet_count": metrics.get("retweet_count", 0),
+                                  "reply_count": metrics.get("reply_count", 0), "quote_count": metrics.get("quote_count", 0),
+                                  "decision": code(DECISION_SKIPPED if reason is not None else DECISION_PLANNED), "reason": code(reason or ""),
+                                  "actions": code("+".join(planned_actions.get(tweet.id, ())))}, tweet.text)
+            except OverflowError as e:
+                logging.error("Not archiving the rest of this plan: %s", e)
+            self._maybe_flush()
+
+    def record_attempt(self, action_name, target_id, outcome):
+        with self._lock:
+            try:
+                self.tables["actions"].append({"at": int(self.clock()), "action": self.strings.code(action_name), "target_id": int(target_id),
+                                               "outcome": self.strings.code(outcome)})
+            except OverflowError as e:
+                logging.error("Not archiving the %s attempt on %s: %s", action_name, target_id, e)
+            self._maybe_flush()
+
+    def _maybe_flush(self):
+        pending = sum(table.pending_rows() for table in self.tables.values())
+        if pending >= self.flush_rows or self.clock() - self._last_flush_at >= self.flush_interval: self._flush()
+
+    def _flush(self):
+        self.strings.flush()
+        for table in self.tables.values():
+            self.rows_written += table.pending_rows()
+            table.flush()
+        self._last_flush_at = self.clock()
+
+    def flush(self):
+        with self._lock: self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            for table in self.tables.values(): table.close()
+
+
+class ArchiveChunk:
+    # One chunk of a table, readable as zero-copy memoryviews while the chunk is in use
+    def __init__(self, path, columns, rows):
+        self.path = path
+        self.columns = dict(columns)
+        self.rows = rows
+        self._views = {}
+
+    def column(self, name):
+        view = self._views.get(name)
+        if view is None: view = self._views[name] = TweetArchive.map_column(self.path, name, self.columns[name], self.rows)
+        return view
+
+    def texts(self):
+        ends = self.column("text_end")
+        with open(os.path.join(self.path, HEAP_FILE), 'rb') as f: heap = f.read(ends[-1] if self.rows else 0)
+        start = 0
+        for end in ends:
+            yield heap[start:end].decode("utf-8", "replace")
+            start = end
+
+    def close(self):
+        for view in self._views.values(): view.release()
+        self._views = {}
+
+
+class TweetArchive:
+    # Read-only queries. where: {column: value, set of values, or callable on the stored value}; string columns
+    # take strings. since/until: epoch seconds on the table's time column (tweets: created_at, actions: at).
+    def __init__(self, directory):
+        self.directory = directory
+        self.strings = StringTable(os.path.join(directory, STRINGS_FILE)).strings
+
+    @staticmethod
+    def map_column(chunk_path, column, typecode, rows):
+        # memoryview of the first `rows` values; the mapping stays alive until the view is released
+        if not rows: return memoryview(array(typecode))
+        with open(_column_path(chunk_path, column), 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped).cast(typecode)[:rows]
+
+    def chunks(self, table="tweets", since=None, until=None):
+        columns = TABLES[table]
+        for chunk_path in _chunk_dirs(os.path.join(self.directory, table)):
+            stats_path = os.path.join(chunk_path, STATS_FILE)
+            if os.path.exists(stats_path) and (since is not None or until is not None):
+                with open(stats_path, 'r', encoding='utf-8') as f: stats = json.load(f)
+                if (since is not None and stats["max_time"] < since) or (until is not None and stats["min_time"] >= until): continue
+            rows = _chunk_rows(chunk_path, columns)
+            if not rows: continue
+            chunk = ArchiveChunk(chunk_path, columns, rows)
+            try: yield chunk
+            finally: chunk.close()
+
+    def _codes(self, values):
+        return {code for code, string in enumerate(self.strings) if string in values}
+
+    def _mask(self, chunk, table, where, since, until):
+        # bytes with 1 for every selected row, or None to select the whole chunk
+        tests = []
+        for column, wanted in (where or {}).items():
+            view = chunk.column(column)
+            if callable(wanted):
+                # Coerced to bool: the mask is built with bytes(), which only takes 0..255
+                if column in STRING_COLUMNS: tests.append(map(lambda code: bool(wanted(self.strings[code])), view))
+                else: tests.append(map(lambda value: bool(wanted(value)), view))
+                continue
+            if isinstance(wanted, (set, frozenset, list, tuple)):
+                wanted = self._codes(set(wanted)) if column in STRING_COLUMNS else set(wanted)
+                tests.append(map(wanted.__contains__, view))
+            else:
+                if column in STRING_COLUMNS:
+                    codes = self._codes({wanted})
+                    wanted = codes.pop() if codes else -1
+                tests.append(map(int(wanted).__eq__, view))
+        time_view = chunk.column(TIME_COLUMNS[table]) if since is not None or until is not None else None
+        if since is not None: tests.append(map(int(since).__le__, time_view))
+        if until is not None: tests.append(map(int(until).__gt__, time_view))
+        if not tests: return None
+        return bytes(tests[0]) if len(tests) == 1 else bytes(reduce(lambda left, right: map(and_, left, right), tests))
+
+    def _selected(self, view, mask):
+        return view if mask is None else compress(view, mask)
+
+    def count(self, where=None, since=None, until=None, table="tweets"):
+        total = 0
+        for chunk in self.chunks(table, since, until):
+            mask = self._mask(chunk, table, where, since, until)
+            total += chunk.rows if mask is None else mask.count(1)
+        return total
+
+    def value_counts(self, column, where=None, since=None, until=None, table="tweets"):
+        counts = Counter()
+        for chunk in self.chunks(table, since, until):
+            counts.update(self._selected(chunk.column(column), self._mask(chunk, table, where, since, until)))
+        if column in STRING_COLUMNS: return Counter({self.strings[code]: count for code, count in counts.items()})
+        return counts
+
+    def sum(self, column, where=None, since=None, until=None, table="tweets"):
+        return sum(sum(self._selected(chunk.column(column), self._mask(chunk, table, where, since, until)))
+                   for chunk in self.chunks(table, since, until))
+
+    def rows(self, columns, where=None, since=None, until=None, table="tweets", limit=None):
+        # Yields tuples of the selected columns (strings decoded; "text" reads the tweet text), oldest chunk first
+        for chunk in self.chunks(table, since, until):
+            mask = self._mask(chunk, table, where, since, until)
+            if mask is not None and not mask.count(1): continue
+            values = [chunk.texts() if column == "text" else chunk.column(column) for column in columns]
+            decode = [column in STRING_COLUMNS for column in columns]
+            for row in self._selected(zip(*values), mask):
+                yield tuple(self.strings[value] if is_string else value for value, is_string in zip(row, decode))
+                if limit is not None:
+                    limit -= 1
+                    if limit <= 0: return
+
+    def acted_targets(self, action=None, since=None, until=None):
+        # IDs of the targets whose attempt succeeded (tweets for retweet/like, users for follow)
+        where = {"outcome": "done"}
+        if action is not None: where["action"] = action # a name or a set of names
+        return set(self.value_counts("target_id", where, since, until, table="actions"))
+
+    def report(self, since=None, query=None, top=10):
+        where = {"query": query} if query else None
+        lines = []
+        total = self.count(where, since)
+        if not total: return "No tweets archived" + (f" for query {query}" if query else "") + (" in that time range." if since else ".")
+        decisions = self.value_counts("decision", where, since)
+        lines.append(f"{total} tweets archived" + (f" (query {query})" if query else "") + ": "
+                     + ", ".join(f"{count} {decision}" for decision, count in decisions.most_common()))
+        reasons = self.value_counts("reason", dict(where or {}, decision=DECISION_SKIPPED), since)
+        if reasons: lines.append("Skip reasons: " + ", ".join(f"{reason} {count}" for reason, count in reasons.most_common()))
+        langs = self.value_counts("lang", where, since)
+        if langs: lines.append("Languages: " + ", ".join(f"{lang or '?'} {count}" for lang, count in langs.most_common(top)))
+        authors = self.value_counts("author_id", where, since)
+        if authors:
+            lines.append(f"Authors: {len(authors)} distinct; top {top}: " + ", ".join(f"{author_id} ({count})" for author_id, count in authors.most_common(top)))
+        outcomes = Counter()
+        for (action, outcome), count in Counter(self.rows(("action", "outcome"), since=since, table="actions")).items(): outcomes[f"{action} {outcome}"] = count
+        if outcomes: lines.append("Action attempts: " + ", ".join(f"{name} {count}" for name, count in sorted(outcomes.items())))
+        acted = self.acted_targets(("like", "retweet"), since=since)
+        if acted:
+            acted_where = dict(where or {}, tweet_id=acted)
+            acted_count = self.count(acted_where, since)
+            if acted_count:
+                averages = ", ".join(f"{label} {self.sum(column, acted_where, since) / acted_count:.1f}" for column, label in METRIC_COLUMNS.items())
+                everyone = ", ".join(f"{label} {self.sum(column, where, since) / total:.1f}" for column, label in METRIC_COLUMNS.items())
+                lines.append(f"Engagement of the {acted_count} archived tweets liked or retweeted when seen: {averages} (all tweets: {everyone})")
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Summarise a tweet archive written with --archive.")
+    arg_parser.add_argument("directory")
+    arg_parser.add_argument("--hours", type=float, default=None, help="Only tweets created in the last HOURS hours.")
+    arg_parser.add_argument("--query", default=None, help="Only tweets found by this watched query name.")
+    arg_parser.add_argument("--top", type=int, default=10)
+    cli_args = arg_parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    archive = TweetArchive(cli_args.directory)
+    print(archive.report(since=time() - cli_args.hours * 3600 if cli_args.hours else None, query=cli_args.query, top=cli_args.top))
@@ -0,0 +1,130 @@
+# tweet_filter.py
+# Compiled tweet filter: built once from the configured languages, negative keywords
+# and blocklist, then applied to a whole search page per call.
+import logging
+
+SKIP_REASON_LANGUAGE = "language"
+SKIP_REASON_NEGATIVE_KEYWORD = "negative_keyword"
+SKIP_REASON_BLOCKLIST = "blocklist"
+
+
+class KeywordAutomaton:
+    # Aho-Corasick automaton over lowercased phrases. One pass over the text finds
+    # the first phrase that occurs anywhere in it, regardless of how many phrases there are.
+    __slots__ = ("_goto", "_fail", "_output")
+
+    def __init__(self, phrases):
+        self._goto = [{}]   # state -> {char: next_state}
+        self._fail = [0]
+        self._output = [None]  # state -> phrase ending here (or reachable via fail links)
+        for phrase in phrases:
+            phrase = phrase.strip().lower()
+            if phrase: self._add(phrase)
+        self._build_fail_links()
+
+    def __len__(self):
+        return len(self._goto)
+
+    def _add(self, phrase):
+        state = 0
+        for char in phrase:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._goto[state][char] = next_state
+            state = next_state
+        if self._output[state] is None:
+            self._output[state] = phrase
+
+    def _build_fail_links(self):
+        goto, fail, output = self._goto, self._fail, self._output
+        queue = list(goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                target = goto[fallback].get(char, 0)
+                fail[next_state] = target if target != next_state else 0
+                if output[next_state] is None:
+                    output[next_state] = output[fail[next_state]]
+
+    def find_first(self, text):
+        # Returns the first phrase found in the (already lowercased) text, or None.
+        goto, fail, output = self._goto, self._fail, self._output
+        if len(goto) == 1: return None
+        state = 0
+        for char in text:
+            transitions = goto[state]
+            while char not in transitions and state:
+                state = fail[state]
+                transitions = goto[state]
+            state = transitions.get(char, 0)
+            if output[state] is not None:
+                return output[state]
+        return None
+
+
+class TweetFilter:
+    # Immutable snapshot of the filter configuration. Rebuild it whenever the
+    # languages, keywords or blocklist change.
+    __slots__ = ("target_languages", "blocked_usernames", "keywords", "keyword_count")
+
+    def __init__(self, target_languages=(), negative_keywords=(), blocklist_usernames=()):
+        self.target_languages = frozenset(lang.strip().lower() for lang in target_languages if lang and lang.strip())
+        self.blocked_usernames = frozenset(name.strip().lower().lstrip('@') for name in blocklist_usernames if name and name.strip())
+        keywords = [keyword for keyword in negative_keywords if keyword and keyword.strip()]
+        self.keyword_count = len(keywords)
+        self.keywords = KeywordAutomaton(keywords)
+
+    def check(self, tweet_text, tweet_author_username, tweet_lang=None):
+        # Returns (rule, detail) for the first rule that fires, or None if the tweet passes.
+        # Rules are evaluated in the same order the bot has always used: language, keywords, blocklist.
+        if self.target_languages and tweet_lang and tweet_lang.lower() not in self.target_languages:
+            return SKIP_REASON_LANGUAGE, tweet_lang
+        if self.keyword_count:
+            matched = self.keywords.find_first((tweet_text or "").lower())
+            if matched is not None:
+                return SKIP_REASON_NEGATIVE_KEYWORD, matched
+        if self.blocked_usernames and tweet_author_username and tweet_author_username.lower() in self.blocked_usernames:
+            return SKIP_REASON_BLOCKLIST, tweet_author_username
+        return None
+
+    def filter_batch(self, tweets, users):
+        # Scores a whole search page in one pass. `users` is the id -> user mapping built
+        # from response.includes. Returns a list of (tweet, rule, detail) in page order;
+        # rule and detail are None for tweets that pass every filter.
+        results = []
+        if not tweets: return results
+        for tweet in tweets:
+            username = users.get(tweet.author_id, {}).get("username", "UnknownUser")
+            verdict = self.check(tweet.text, username, getattr(tweet, 'lang', None))
+            if verdict is None:
+                results.append((tweet, None, None))
+            else:
+                results.append((tweet, verdict[0], verdict[1]))
+        return results
+
+
+def describe_skip(rule, detail, tweet_text="", tweet_author_username="", target_languages=()):
+    # Human readable log line for a fired rule, matching the bot's historical wording.
+    if rule == SKIP_REASON_LANGUAGE:
+        return f"Skipping tweet: Language '{detail}' not in target languages {list(target_languages)}."
+    if rule == SKIP_REASON_NEGATIVE_KEYWORD:
+        return f"Skipping tweet: Contains negative keyword '{detail}'. Text: {tweet_text[:100]}..."
+    if rule == SKIP_REASON_BLOCKLIST:
+        return f"Skipping tweet: Author @{tweet_author_username} is in blocklist."
+    return f"Skipping tweet: {rule}."
+
+
+def log_skip(rule, detail, tweet_text="", tweet_author_username="", target_languages=(), level=logging.INFO):
+    # describe_skip() is only rendered when the record would actually be emitted
+    if logging.getLogger().isEnabledFor(level):
+        logging.log(level, describe_skip(rule, detail, tweet_text, tweet_author_username, target_languages))
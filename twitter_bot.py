@@ -0,0 +1,1188 @@
+# twitter_bot.py
+# The bot as a library: TwitterBot holds one bot's configuration and session state, so several
+# bots can run in one process (e.g. embedded in a service, one thread each).
+#
+# Importing this module has no side effects: logging is left to the caller (the
+# twitter_interactive_bot.py CLI sets up the queued log pipeline), and tweepy, requests,
+# asyncio and the stream/history modules are only imported by the methods that use them, so
+# a bot is constructed in well under a millisecond. Settings default to SETTINGS and can be
+# given as keyword arguments, loaded with TwitterBot.from_config() from config.py,
+# credentials.py and TWITTER_BOT_<SETTING> / TWITTER_<CREDENTIAL> environment variables, or
+# set from an orchestrator profile. The metrics registry, rate budget, tweet filter and
+# near-duplicate index are created per bot on first use. All bots in a process send their API
+# calls through one shared connection pool (api_transport.shared_connection_pool()), and the
+# default SYSTEM_CLOCK is shared too, so one SIGTERM stops them all.
+import contextlib
+import importlib
+import json
+import logging
+import math
+import os
+import signal
+import sys
+import traceback
+
+from action_planner import plan_search_page
+from bot_metrics import MetricsRegistry, MetricsServer
+from candidate_buffer import CandidateBuffer
+from id_store import IdStore
+from near_duplicate import SKIP_REASON_NEAR_DUPLICATE, NearDuplicateIndex
+from query_packer import QueryGroup, QuerySinceIds, WatchedQuery, pack_queries, route_tweets
+from rate_budget import RateBudget
+from search_pager import PaginatedSearch, SearchCursor
+from search_planner import SearchPlanner
+from state_journal import StateJournal
+from tweet_filter import TweetFilter, log_skip
+from virtual_clock import SystemClock
+
+CREDENTIAL_KEYS = ("bearer_token", "consumer_key", "consumer_secret", "access_token", "access_token_secret")
+SETTINGS_ENV_PREFIX = "TWITTER_BOT_"   # e.g. TWITTER_BOT_QUERY, TWITTER_BOT_PERFORM_LIKE=1
+CREDENTIALS_ENV_PREFIX = "TWITTER_"    # e.g. TWITTER_BEARER_TOKEN
+SYSTEM_CLOCK = SystemClock() # wall clock whose sleeps wait on an event; SIGTERM ends them (install_shutdown_handler)
+SEARCH_TWEET_FIELDS = ['created_at', 'public_metrics', 'author_id', 'text', 'referenced_tweets', 'lang']
+SEARCH_EXPANSIONS = ['author_id', 'referenced_tweets.id', 'referenced_tweets.id.author_id']
+SEARCH_USER_FIELDS = ['username', 'name', 'verified']
+NO_STAGE = contextlib.nullcontext() # stage() outside profiling mode
+
+# --- Settings (name -> default); config.py uses the same names in upper case ---
+SETTINGS = {
+    "query": "",
+    "perform_retweet": False,
+    "perform_like": False,
+    "perform_follow": False,
+    "max_results_per_search": 10,
+    "dry_run": False, # --dry-run: print each page's action plan instead of calling the action endpoints
+    "show_countdown": True, # Live console countdown during sleeps (disabled for orchestrated workers)
+    "api_base_url": None, # e.g. http://127.0.0.1:8080 to run against mock_twitter_api.py instead of api.twitter.com
+    "tweet_claimer": None, # Orchestrated workers: callable(tweet_ids) -> set of IDs this worker may evaluate
+    "extra_queries": [], # More watched queries (dicts from --queries / profiles), OR'd together with query into packed searches
+    "search_query_max_length": 512, # search_recent_tweets query length limit (512 on Free/Basic, 4096 on Pro)
+    "search_max_pages_per_round": 5, # next_token pages one search round may follow while the search budget allows
+    "catch_up_max_results": 100, # page size once a round follows next_token to catch up on a backlog
+    "stream_mode": False, # --stream: receive tweets from the filtered stream instead of polling search (falls back to polling)
+    "stream_stall_timeout": 30, # seconds without data (keep-alives arrive every 20s) before the stream is reopened
+    "stream_max_reconnects": 8, # failed connects in a row before falling back to polling search
+    "stream_backfill_minutes": 0, # minutes of tweets to recover after a reconnect (Pro and Enterprise access only)
+    "stream_idle_wakeup": 60, # seconds the stream loop waits for tweets when no buffered candidate is due sooner
+    "metrics_port": None, # serve Prometheus metrics on http://127.0.0.1:<port>/metrics during a session (--metrics-port)
+    "metrics_summary_interval": 15 * 60, # seconds between "Metrics - ..." summary log lines
+    "sync_history": False, # --sync-history: warm the done-ID stores from the account's following list, likes and retweets at startup
+    "history_refresh_interval": 5 * 60, # seconds between incremental history refreshes while sync_history is on
+    "profile_dir": None, # --profile: write cProfile stats, tracemalloc diffs and stage timings of the main loop here
+    "profile_every": 10, # loop iterations per profile dump
+    "backfill": False, # --backfill: search the recent-search window of watched queries without a since_id before the loop starts
+    "backfill_window": 7 * 24 * 3600, # seconds back from now (recent search reaches back 7 days)
+    "backfill_shards": 14, # start_time/end_time ranges the window is split into
+    "backfill_workers": 4, # shards fetched concurrently
+    "backfill_max_pages": 100, # search requests one backfill may make at most
+    "backfill_max_wait": 60, # seconds; the backfill ends once the search budget is blocked for longer
+    "archive_dir": None, # --archive: append every planned tweet and action attempt to a columnar archive here (tweet_archive.py)
+    "record_dir": None, # --record: save the raw search responses here for what-if replays (search_recording.py, replay_whatif.py)
+
+    "search_interval_success": 905, # fixed intervals, until adaptive search has an arrival rate (or without it)
+    "search_interval_no_results": 300,
+    "adaptive_search": True, # plan each search group's next poll and page size from its tweet arrival rate (search_planner.py)
+    "search_interval_max": 1800, # seconds; longest wait between polls of a quiet search group
+    "search_rate_half_life": 3600, # seconds; older batches count half as much in the arrival rate after this long
+    "like_cooldown_seconds": 15 * 60 + 15,
+    "follow_cooldown_seconds": 15 * 60 + 20,
+    "retweet_cooldown_seconds": 15 * 60 + 10,
+    "sleep_between_batch_actions": 60,
+
+    "user_blocklist_usernames": set(),
+    "negative_keywords_in_text": [],
+    "target_languages": ["en"],
+    "near_duplicate_threshold": 0.7, # skip tweets at least this similar (word Jaccard) to one acted on in the window; 0 disables
+    "near_duplicate_window": 6 * 3600, # seconds an acted-on tweet's text is remembered
+    "near_duplicate_capacity": 10000, # texts remembered at most (about 2 KB each)
+
+    # Persistence files (relative to the working directory unless configure_from_profile() moves them)
+    "liked_tweet_ids_file": "liked_tweet_ids_interactive.txt",
+    "retweeted_tweet_ids_file": "retweeted_tweet_ids_interactive.txt",
+    "followed_user_ids_file": "followed_user_ids_interactive.txt",
+    "last_searched_id_file": "last_searched_id_interactive.txt", # Legacy single-query since_id, imported once
+    "query_since_ids_file": "query_since_ids_interactive.json", # since_id per watched query (snapshot of the journal below)
+    # Write-ahead journal (<query_since_ids_file>.journal) of since_ids, search cursors and buffered candidates
+    "state_journal_commit_interval": 1.0, # seconds; appends are fsynced together at most this long after the first one
+    "state_journal_compact_after": 5000, # records; then the journal is folded into a fresh snapshot
+    # Binary ID stores (<base>.idx/.bloom/.tail); the *_file text files above are imported into them once
+    "liked_tweet_ids_store": "liked_tweet_ids_interactive",
+    "retweeted_tweet_ids_store": "retweeted_tweet_ids_interactive",
+    "followed_user_ids_store": "followed_user_ids_interactive",
+    "id_store_compaction_interval": 300, # seconds between background compaction checks
+    "id_store_compaction_min_tail": 1000, # compact once this many IDs sit in the append-only tail
+
+    "sleep_after_generic_api_error": 60, # longest wait after repeated API errors in the main loop
+    "sleep_after_critical_error_before_exit": 5,
+    "rate_budget_file": "rate_limit_budget_interactive.json", # x-rate-limit-* state, survives restarts
+    "min_search_interval": 15, # seconds; floor for header-paced searches on higher API tiers
+    # HTTP transport under tweepy (api_transport.py): pooled keep-alive connections, timeouts and retries
+    "api_timeout": (5, 30), # (connect, read) seconds for calls that set no timeout of their own
+    "api_retries": 3, # retries of idempotent calls after connection errors, timeouts and 5xx responses
+    "api_max_rate_limit_wait": 60, # seconds; a 429 whose window resets sooner is waited out and retried in place
+    "api_error_backoff_start": 5, # seconds after the first failed search or API error; doubles per failure in a row
+    # Candidates waiting for an action slot (per action type), best first by engagement, recency and author
+    "candidate_buffer_size": 200,
+    "candidate_max_age_seconds": 6 * 3600, # candidates whose tweet is older than this are evicted
+    "candidate_half_life_seconds": 3600,   # a candidate's score halves for every hour of tweet age
+}
+
+# Per-bot runtime state next to the settings: the injected clock, the credentials and the
+# objects the get_*/start_* methods create on first use
+RUNTIME_SLOTS = ("clock", "sleep", "connection_pool", "credentials", "metrics", "rate_budget", "tweet_filter",
+                 "near_duplicates", "history_sync", "profiler", "archive", "recorder")
+
+
+# --- Config Loading (non-interactive counterpart of the CLI prompts) ---
+def normalise_usernames(names):
+    return {name.strip().lower().lstrip('@') for name in names if name.strip()}
+
+def normalise_keywords(keywords):
+    return [keyword.strip().lower() for keyword in keywords if keyword.strip()]
+
+def _load_module(module):
+    # A module object, or the name of an importable one (None if it does not exist)
+    if not isinstance(module, str): return module
+    try:
+        return importlib.import_module(module)
+    except ModuleNotFoundError as e:
+        if e.name != module: raise
+        return None
+
+def settings_from_module(module):
+    # Every upper-case name in a config module (e.g. config.py) that names a setting
+    module = _load_module(module)
+    if module is None: return {}
+    return {name.lower(): value for name, value in vars(module).items() if name.isupper() and name.lower() in SETTINGS}
+
+def parse_setting(name, raw_value):
+    # An environment variable's text as the type of the setting's default
+    default = SETTINGS[name]
+    if isinstance(default, bool): return raw_value.strip().lower() in ("1", "true", "yes", "y", "on")
+    if isinstance(default, (int, float)): return type(default)(raw_value)
+    if isinstance(default, tuple): return tuple(float(part) for part in raw_value.split(','))
+    if isinstance(default, (list, set)): return type(default)(part.strip() for part in raw_value.split(',') if part.strip())
+    if default is None:
+        try: return json.loads(raw_value) # metrics_port=9108; anything else stays a string
+        except ValueError: return raw_value
+    return raw_value
+
+def settings_from_env(environ=None, prefix=SETTINGS_ENV_PREFIX):
+    environ = os.environ if environ is None else environ
+    return {name: parse_setting(name, environ[prefix + name.upper()]) for name in SETTINGS if prefix + name.upper() in environ}
+
+def load_credentials(module="credentials", environ=None, prefix=CREDENTIALS_ENV_PREFIX):
+    # credentials.py values, overridden by non-empty <prefix><KEY> environment variables (e.g. TWITTER_BEARER_TOKEN)
+    environ = os.environ if environ is None else environ
+    module = _load_module(module) if module is not None else None
+    credentials = {key: getattr(module, key, "") for key in CREDENTIAL_KEYS} if module is not None else dict.fromkeys(CREDENTIAL_KEYS, "")
+    credentials.update({key: environ[prefix + key.upper()] for key in CREDENTIAL_KEYS if environ.get(prefix + key.upper())})
+    return credentials
+
+def load_extra_queries(filename):
+    # JSON list of watched queries: {"name", "query", "retweet", "like", "follow", "languages", "negative_keywords", "blocklist"}
+    with open(filename, 'r', encoding='utf-8') as f: entries = json.load(f)
+    if isinstance(entries, dict): entries = entries.get("queries", [])
+    return entries
+
+
+# --- Helper Functions (shutdown handler, load_last_id) ---
+def install_shutdown_handler():
+    # SIGTERM (systemd, docker stop, the orchestrator) shuts down like Ctrl+C: the state is saved on the way out.
+    # Ends the sleeps of every bot on SYSTEM_CLOCK; call it from the main thread.
+    def handle_sigterm(signum, frame):
+        logging.info("Received SIGTERM; shutting down.")
+        SYSTEM_CLOCK.request_shutdown()
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+def load_last_id(filename):
+    try:
+        if os.path.exists(filename):
+            with open(filename, 'r', encoding='utf-8') as f: content = f.read().strip()
+            return int(content) if content and content.isdigit() else None
+        return None
+    except Exception as e: logging.error("Error loading last searched ID from %s: %s", filename, e); return None
+
+
+class TwitterBot:
+    __slots__ = tuple(SETTINGS) + RUNTIME_SLOTS
+
+    def __init__(self, clock=None, sleep=None, connection_pool=None, credentials=None, **settings):
+        # clock/sleep: time source and sleep for all pacing; benchmarks pass a virtual_clock.VirtualClock
+        # and its sleep() so simulated hours pass instantly. connection_pool: urllib3 pool manager for
+        # the API clients (default: the process-wide api_transport.shared_connection_pool()).
+        unknown = settings.keys() - SETTINGS.keys()
+        if unknown: raise TypeError(f"Unknown TwitterBot settings: {', '.join(sorted(unknown))}")
+        for name, default in SETTINGS.items():
+            value = settings.get(name, default)
+            setattr(self, name, value.copy() if isinstance(value, (list, set, dict)) else value)
+        self.clock = clock or SYSTEM_CLOCK
+        self.sleep = sleep or getattr(self.clock, "sleep", SYSTEM_CLOCK.sleep)
+        self.connection_pool = connection_pool
+        self.credentials = credentials
+        self.metrics = self.rate_budget = self.tweet_filter = self.near_duplicates = self.history_sync = self.profiler = self.archive = self.recorder = None
+
+    @classmethod
+    def from_config(cls, config="config", credentials="credentials", environ=None, clock=None, sleep=None, connection_pool=None, **overrides):
+        # Settings from the config module, then TWITTER_BOT_* environment variables, then `overrides`;
+        # credentials from the credentials module and TWITTER_* environment variables. No prompts.
+        settings = settings_from_module(config) if config is not None else {}
+        settings.update(settings_from_env(environ))
+        settings.update(overrides)
+        bot = cls(clock, sleep, connection_pool, load_credentials(credentials, environ), **settings)
+        bot.user_blocklist_usernames = normalise_usernames(bot.user_blocklist_usernames)
+        bot.negative_keywords_in_text = normalise_keywords(bot.negative_keywords_in_text)
+        return bot
+
+    def countdown_sleep(self, seconds, message_prefix=""):
+        if seconds <= 0: return
+        logging.info("%sSleeping for %ss...", message_prefix, seconds)
+        sleep_started_at = self.clock()
+        try:
+            with self.stage("sleep"):
+                if not self.show_countdown or not sys.stdout.isatty():
+                    self.sleep(seconds) # one event wait: no wakeups until it ends
+                    return
+                for i in range(seconds, 0, -1):
+                    print(f"\r{message_prefix}{i}s remaining...          ", end="", flush=True)
+                    try: self.sleep(1)
+                    except KeyboardInterrupt: print("\rCountdown interrupted.                 ", flush=True); logging.info("Countdown sleep interrupted by user."); raise
+                print("\rSleep complete.                          ", flush=True)
+        finally:
+            self.get_metrics().inc("bot_sleep_seconds_total", self.clock() - sleep_started_at)
+
+    def open_id_store(self, store_base, legacy_text_file):
+        # Imports the legacy text file on first use; adds to the returned store are persisted immediately
+        started_at = self.clock()
+        store = IdStore(store_base, legacy_text_file=legacy_text_file)
+        store.start_background_compaction(self.id_store_compaction_interval, self.id_store_compaction_min_tail)
+        self.get_metrics().observe("bot_persistence_seconds", self.clock() - started_at, operation="open_id_store")
+        return store
+
+    def open_id_stores(self):
+        # (liked, retweeted, followed) done-ID stores
+        return (self.open_id_store(self.liked_tweet_ids_store, self.liked_tweet_ids_file),
+                self.open_id_store(self.retweeted_tweet_ids_store, self.retweeted_tweet_ids_file),
+                self.open_id_store(self.followed_user_ids_store, self.followed_user_ids_file))
+
+    def load_query_since_ids(self):
+        # Per-query since_ids; the legacy single-query file seeds query the first time
+        # Dry runs never move the persisted since_ids, so they do not journal either
+        journal = None if self.dry_run else StateJournal(self.query_since_ids_file + ".journal", commit_interval=self.state_journal_commit_interval,
+                                                         compact_after=self.state_journal_compact_after, clock=self.clock)
+        since_ids = QuerySinceIds(self.query_since_ids_file, journal, candidate_max_age=self.candidate_max_age_seconds, clock=self.clock)
+        if not since_ids.exists():
+            since_ids.seed(self.query, load_last_id(self.last_searched_id_file))
+        return since_ids
+
+    def save_query_since_ids(self, since_ids):
+        if self.dry_run: return # Dry runs never move the persisted since_ids
+        started_at = self.clock()
+        with self.stage("persistence"):
+            since_ids.save()
+        self.get_metrics().observe("bot_persistence_seconds", self.clock() - started_at, operation="save_since_ids")
+
+    # --- Metrics (bot_metrics.py; scraped from metrics_port and summarised in the log) ---
+    def get_metrics(self):
+        if self.metrics is None:
+            self.metrics = MetricsRegistry(clock=self.clock, summary_interval=self.metrics_summary_interval)
+        return self.metrics
+
+    def start_metrics_server(self):
+        if not self.metrics_port: return None
+        try:
+            metrics_server = MetricsServer(self.get_metrics(), port=self.metrics_port).start()
+        except OSError as e:
+            logging.error("Could not serve metrics on port %s: %s", self.metrics_port, e)
+            return None
+        logging.info("Serving metrics on %s", metrics_server.url)
+        return metrics_server
+
+    def count_skip(self, stage, reason):
+        self.get_metrics().inc("bot_skips_total", stage=stage, reason=reason)
+
+    # --- Profiling Mode (loop_profiler.py; --profile) ---
+    def start_profiler(self):
+        self.profiler = None
+        if not self.profile_dir: return None
+        from loop_profiler import LoopProfiler
+        self.profiler = LoopProfiler(self.profile_dir, self.profile_every).start()
+        return self.profiler
+
+    def stage(self, name):
+        # Times a stage of the loop ("search", "filter", "actions", "persistence", "sleep") while profiling
+        return self.profiler.stage(name) if self.profiler is not None else NO_STAGE
+
+    def next_iteration(self):
+        if self.profiler is not None: self.profiler.next_iteration()
+
+    # --- Tweet Archive (tweet_archive.py; --archive) ---
+    def start_archive(self):
+        self.archive = None
+        if not self.archive_dir: return None
+        from tweet_archive import ArchiveWriter
+        self.archive = ArchiveWriter(self.archive_dir, clock=self.clock)
+        logging.info("Archiving planned tweets and action attempts in %s.", self.archive_dir)
+        return self.archive
+
+    def record_attempt(self, action_name, target_id, succeeded, done_ids):
+        # A target now done (acted on, or found already done) remembers its tweet's text for the near-duplicate check
+        if self.near_duplicates is not None and str(target_id) in done_ids: self.near_duplicates.remember_acted(action_name, target_id)
+        if self.archive is None: return
+        outcome = "done" if succeeded else ("already_done" if str(target_id) in done_ids else "not_done")
+        self.archive.record_attempt(action_name, target_id, outcome)
+
+    # --- Search Recording (search_recording.py; --record) ---
+    def start_recorder(self, client):
+        self.recorder = None
+        if not self.record_dir: return None
+        from search_recording import SearchRecorder, replayed_settings
+        self.recorder = SearchRecorder(self.record_dir, replayed_settings(self), clock=self.clock).install(client)
+        logging.info("Recording search responses in %s.", self.recorder.path)
+        return self.recorder
+
+    # --- History Sync (history_sync.py; dedupe state from the account's real history) ---
+    # A bulk sync runs before the first action. Incremental refreshes then run between actions
+    # (serial loop) or from their own task (async runtime) every history_refresh_interval.
+    def start_history_sync(self, client, my_bot_id, action_runners):
+        self.history_sync = None
+        if not self.sync_history or not action_runners: return None
+        from history_sync import HistorySync
+        self.history_sync = HistorySync(client, my_bot_id, {action_name: done_ids for action_name, (done_ids, _) in action_runners.items()},
+                                        rate_budget=self.get_rate_budget(), metrics=self.get_metrics(),
+                                        refresh_interval=self.history_refresh_interval, clock=self.clock)
+        added = self.history_sync.sync()
+        logging.info("History sync added %s.", ", ".join(f"{count} {action_name}" for action_name, count in added.items()) or "nothing")
+        return self.history_sync
+
+    def maybe_refresh_history(self):
+        if self.history_sync is not None: self.history_sync.maybe_refresh()
+
+    # --- Rate Limit Budget (used by the search loop and action methods) ---
+    # Tracks the x-rate-limit-* headers per endpoint. The fixed cooldown settings only apply
+    # to an endpoint until it has reported headers.
+    def get_rate_budget(self):
+        if self.rate_budget is None:
+            self.rate_budget = RateBudget(self.rate_budget_file, fallback_intervals={
+                "search": self.search_interval_no_results,
+                "retweet": self.retweet_cooldown_seconds,
+                "like": self.like_cooldown_seconds,
+                "follow": self.follow_cooldown_seconds,
+            }, clock=self.clock)
+        return self.rate_budget
+
+    def next_search_interval(self, tweets_found):
+        # Fixed intervals until the search endpoint reports headers; then spread the remaining budget until reset
+        rate_budget = self.get_rate_budget()
+        if not rate_budget.has_headers("search"):
+            return self.search_interval_success if tweets_found else self.search_interval_no_results
+        return max(self.min_search_interval, int(rate_budget.pace_interval("search")) + 1)
+
+    def new_search_planner(self, query_groups):
+        # Adaptive polling per search group within the search budget; None keeps next_search_interval()'s pacing
+        if not self.adaptive_search: return None
+        rate_budget = self.get_rate_budget()
+        return SearchPlanner(query_groups, self.max_results_per_search, max(self.max_results_per_search, self.catch_up_max_results),
+                             self.min_search_interval, self.search_interval_max, (self.search_interval_success, self.search_interval_no_results),
+                             self.search_rate_half_life, clock=self.clock,
+                             budget_interval=lambda: rate_budget.pace_interval("search") if rate_budget.has_headers("search") else None)
+
+    def next_search_group(self, search_planner, query_groups, search_round):
+        # The group whose planned poll is due first, or round-robin without a planner
+        return search_planner.next_group() if search_planner is not None else query_groups[search_round % len(query_groups)]
+
+    def plan_next_search(self, search_planner, query_group, since_id, paginated_search, tweets_found):
+        # Seconds until the next search round, after a successful one
+        if search_planner is None: return self.next_search_interval(tweets_found > 0)
+        search_planner.record_round(query_group, since_id, paginated_search.completed, paginated_search.resumed, paginated_search.pages)
+        return search_planner.seconds_until_next()
+
+    def error_backoff(self, failures, longest):
+        # Wait after `failures` failed rounds in a row: api_error_backoff_start, doubling up to `longest`.
+        # The transport already retried each call, so a brief outage costs seconds, a long one stays cheap.
+        return min(longest, self.api_error_backoff_start * 2 ** (failures - 1))
+
+    # --- Configuration ---
+    def configure_from_profile(self, profile, state_dir):
+        # Non-interactive counterpart of the CLI prompts, used by orchestrator.py workers.
+        # Every persistence file lives in <state_dir>/<profile name>/ so restarted workers resume their since_id.
+        self.query = profile["query"]
+        self.extra_queries = list(profile.get("queries", []))
+        self.max_results_per_search = max(10, min(100, int(profile.get("max_results", self.max_results_per_search))))
+        self.perform_retweet = bool(profile.get("retweet", False))
+        self.perform_like = bool(profile.get("like", False))
+        self.perform_follow = bool(profile.get("follow", False))
+        self.user_blocklist_usernames = normalise_usernames(profile.get("blocklist", []))
+        self.negative_keywords_in_text = normalise_keywords(profile.get("negative_keywords", []))
+        self.target_languages = list(profile.get("languages", self.target_languages))
+        self.metrics_port = profile.get("metrics_port", self.metrics_port)
+        self.sync_history = bool(profile.get("sync_history", self.sync_history))
+        self.stream_mode = bool(profile.get("stream", self.stream_mode))
+        self.near_duplicate_threshold = float(profile.get("near_duplicate_threshold", self.near_duplicate_threshold))
+        self.profile_dir = profile.get("profile_dir", self.profile_dir)
+        self.backfill = bool(profile.get("backfill", self.backfill))
+        self.archive_dir = profile.get("archive_dir", self.archive_dir)
+        self.record_dir = profile.get("record_dir", self.record_dir)
+
+        profile_dir = os.path.join(state_dir, profile["name"])
+        os.makedirs(profile_dir, exist_ok=True)
+        for name in ("liked_tweet_ids_file", "retweeted_tweet_ids_file", "followed_user_ids_file", "last_searched_id_file",
+                     "query_since_ids_file", "liked_tweet_ids_store", "retweeted_tweet_ids_store", "followed_user_ids_store",
+                     "rate_budget_file"):
+            setattr(self, name, os.path.join(profile_dir, os.path.basename(getattr(self, name))))
+        logging.info("Profile '%s': query '%s', max results %s, actions - Retweet: %s, Like: %s, Follow: %s, state in %s",
+                     profile['name'], self.query, self.max_results_per_search, self.perform_retweet, self.perform_like, self.perform_follow, profile_dir)
+        self.build_tweet_filter()
+
+    def build_tweet_filter(self):
+        self.tweet_filter = TweetFilter(self.target_languages, self.negative_keywords_in_text, self.user_blocklist_usernames)
+        logging.info("Compiled tweet filter: %s languages, %s negative keywords, %s blocked usernames.", len(self.tweet_filter.target_languages), self.tweet_filter.keyword_count, len(self.tweet_filter.blocked_usernames))
+        return self.tweet_filter
+
+    def start_near_duplicate_index(self):
+        # Copy-paste campaigns: one index per session, shared by every watched query so they draw on one quota
+        self.near_duplicates = None
+        if self.near_duplicate_threshold <= 0: return None
+        self.near_duplicates = NearDuplicateIndex(self.near_duplicate_threshold, capacity=self.near_duplicate_capacity,
+                                                  window=self.near_duplicate_window, clock=self.clock)
+        return self.near_duplicates
+
+    def build_watched_queries(self):
+        # query with the bot's actions/filters first, then every extra_queries entry; unset entry fields inherit the bot's
+        primary_actions = [name for name, enabled in (("retweet", self.perform_retweet), ("like", self.perform_like), ("follow", self.perform_follow)) if enabled]
+        primary_filter = self.tweet_filter or self.build_tweet_filter()
+        watched_queries = [WatchedQuery("main", self.query, primary_actions, primary_filter, self.target_languages)]
+        for position, entry in enumerate(self.extra_queries, start=1):
+            actions = [name for name in ("retweet", "like", "follow") if entry.get(name, name in primary_actions)]
+            tweet_filter, languages = primary_filter, self.target_languages
+            if any(key in entry for key in ("languages", "negative_keywords", "blocklist")):
+                languages = list(entry.get("languages", self.target_languages))
+                tweet_filter = TweetFilter(languages, entry.get("negative_keywords", self.negative_keywords_in_text),
+                                           entry.get("blocklist", self.user_blocklist_usernames))
+            watched_queries.append(WatchedQuery(entry.get("name") or f"query{position}", entry["query"], actions, tweet_filter, languages))
+        return watched_queries
+
+    def build_query_groups(self):
+        # Packs the watched queries into the fewest OR'd searches that fit search_query_max_length
+        query_groups = pack_queries(self.build_watched_queries(), self.search_query_max_length)
+        for query_group in query_groups:
+            members = ", ".join(f"{watched.name} ({'/'.join(watched.actions) or 'no actions'})" for watched in query_group.queries)
+            logging.info("Search group %s (%s chars): %s", query_group.name, len(query_group.query), members)
+        return query_groups
+
+    # --- Twitter API Action Methods ---
+    # These use the bot's settings and take session-specific ID stores (persisted on add) as arguments
+
+    def install_transport(self, client, **settings):
+        # Pooled, retrying transport (api_transport.py) on a tweepy client, reporting to this bot's metrics
+        from api_transport import install_transport, shared_connection_pool
+        return install_transport(client, self.api_base_url, timeout=self.api_timeout, max_rate_limit_wait=self.api_max_rate_limit_wait,
+                                 pool=self.connection_pool or shared_connection_pool(), sleep=self.sleep, clock=self.clock,
+                                 observer=self.get_metrics().record_http_attempt, **settings)
+
+    def initialize_client_and_get_me(self, creds_dict): # Takes credentials dictionary
+        import tweepy
+        try:
+            client = tweepy.Client(
+                bearer_token=creds_dict['bearer_token'],
+                consumer_key=creds_dict['consumer_key'],
+                consumer_secret=creds_dict['consumer_secret'],
+                access_token=creds_dict['access_token'],
+                access_token_secret=creds_dict['access_token_secret']
+            )
+            self.install_transport(client, retries=self.api_retries)
+            if self.api_base_url: logging.info("Sending API requests to %s instead of api.twitter.com.", self.api_base_url)
+            self.get_rate_budget().install(client) # Feed every response's rate limit headers into the budget
+            logging.info("Successfully initialized tweepy.Client with provided credentials.")
+            me_response = client.get_me(user_fields=['id', 'username'])
+            if me_response.data:
+                my_id = me_response.data.id
+                my_username = me_response.data.username
+                logging.info("Authenticated as: @%s (ID: %s)", my_username, my_id)
+                return client, my_id, my_username
+            else:
+                logging.critical("Could not get 'me' data using provided credentials. Errors: %s", me_response.errors)
+                return None, None, None
+        except KeyError as e:
+            logging.critical("Missing credential key: %s. Please provide all required credentials.", e)
+            return None, None, None
+        except tweepy.TweepyException as e:
+            logging.critical("Failed to initialize client or authenticate: %s", e)
+            return None, None, None
+        except Exception as e:
+            logging.critical("Unexpected error during client init: %s", e)
+            return None, None, None
+
+    def perform_search_interactive(self, client, current_query, current_since_id, current_max_results, until_id=None, next_token=None,
+                                   start_time=None, end_time=None):
+        import tweepy
+        page_position = f", next_token: {next_token}" if next_token else (f", until_id: {until_id}" if until_id else "")
+        if start_time or end_time: page_position += f", from {start_time} to {end_time}"
+        logging.info("Searching for tweets with: '%s' (since_id: %s, max_results: %s%s)", current_query, current_since_id, current_max_results, page_position)
+        started_at = self.clock()
+        try:
+            with self.stage("search"):
+                response = client.search_recent_tweets(
+                    current_query,
+                    max_results=current_max_results,
+                    since_id=current_since_id,
+                    until_id=until_id,
+                    next_token=next_token,
+                    start_time=start_time,
+                    end_time=end_time,
+                    tweet_fields=SEARCH_TWEET_FIELDS,
+                    expansions=SEARCH_EXPANSIONS,
+                    user_fields=SEARCH_USER_FIELDS
+                )
+            self.get_metrics().record_api_call("search", "ok", self.clock() - started_at)
+            self.get_rate_budget().spend("search")
+            return response
+        except tweepy.TooManyRequests as tmr:
+            self.get_metrics().record_api_call("search", "rate_limited", self.clock() - started_at)
+            logging.warning("Search rate limit hit: %s.", tmr) # Removed "Will sleep..." as main loop handles it
+            self.get_rate_budget().record_rate_limited("search", getattr(tmr.response, 'headers', None))
+            raise
+        except tweepy.TweepyException as e:
+            self.get_metrics().record_api_call("search", "error", self.clock() - started_at)
+            logging.error("Error during search: %s", e)
+            return None
+
+    def should_skip_tweet_interactive(self, tweet_text, tweet_author_username, tweet_lang=None): # Uses the compiled filter
+        # Single-tweet entry point; the main loop scores whole pages with tweet_filter.filter_batch()
+        tweet_filter = self.tweet_filter or self.build_tweet_filter()
+        verdict = tweet_filter.check(tweet_text, tweet_author_username, tweet_lang)
+        if verdict is None: return False
+        log_skip(verdict[0], verdict[1], tweet_text, tweet_author_username, self.target_languages)
+        return True
+
+    def attempt_retweet_action_interactive(self, client, tweet_id, is_already_retweeted_by_other, current_retweeted_ids_set):
+        import tweepy
+        tweet_id_str = str(tweet_id)
+        if not self.perform_retweet: return False
+        if is_already_retweeted_by_other:
+            logging.info("Skipping retweet for %s: Search result was already a retweet.", tweet_id_str)
+            self.count_skip("attempt", "already_a_retweet")
+            return False
+        if tweet_id_str in current_retweeted_ids_set:
+            logging.info("Skipping retweet for %s: Already retweeted in this session/persistence.", tweet_id_str)
+            self.count_skip("attempt", "already_done")
+            return False
+
+        rate_budget = self.get_rate_budget()
+        remaining_cooldown = rate_budget.wait_time("retweet")
+        if remaining_cooldown > 0:
+            logging.info("Skipping retweet for %s: Still in retweet cooldown/rate limit window (%ss remaining).", tweet_id_str, int(remaining_cooldown))
+            self.count_skip("attempt", "cooldown")
+            return False
+        started_at = self.clock()
+        try:
+            logging.info("Attempting to retweet tweet ID: %s", tweet_id_str)
+            client.retweet(tweet_id)
+            self.get_metrics().record_api_call("retweet", "ok", self.clock() - started_at)
+            self.get_metrics().inc("bot_actions_total", action="retweet")
+            logging.info("Successfully retweeted tweet ID: %s", tweet_id_str)
+            current_retweeted_ids_set.add(tweet_id_str)
+            rate_budget.spend("retweet")
+            return True
+        except tweepy.TooManyRequests as tmr:
+            self.get_metrics().record_api_call("retweet", "rate_limited", self.clock() - started_at)
+            logging.warning("Rate limit hit for retweeting %s. %s", tweet_id_str, rate_budget.describe('retweet'))
+            rate_budget.record_rate_limited("retweet", getattr(tmr.response, 'headers', None))
+            return False
+        except tweepy.TweepyException as e:
+            self.get_metrics().record_api_call("retweet", "error", self.clock() - started_at)
+            logging.warning("Error retweeting %s: %s", tweet_id_str, e)
+            error_message = str(e).lower()
+            if "already retweeted" in error_message or "you have already retweeted this tweet" in error_message:
+                logging.info("Confirmed already retweeted (by API error) tweet ID: %s", tweet_id_str)
+                current_retweeted_ids_set.add(tweet_id_str)
+            return False
+        return False
+
+    def attempt_like_action_interactive(self, client, tweet_id, current_liked_ids_set):
+        import tweepy
+        tweet_id_str = str(tweet_id)
+        if not self.perform_like: return False
+        if tweet_id_str in current_liked_ids_set:
+            logging.info("Skipping like for %s: Already liked in this session/persistence.", tweet_id_str)
+            self.count_skip("attempt", "already_done")
+            return False
+
+        rate_budget = self.get_rate_budget()
+        remaining_cooldown = rate_budget.wait_time("like")
+        if remaining_cooldown > 0:
+            logging.info("Skipping like for %s: Still in like cooldown/rate limit window (%ss remaining).", tweet_id_str, int(remaining_cooldown))
+            self.count_skip("attempt", "cooldown")
+            return False
+        started_at = self.clock()
+        try:
+            logging.info("Attempting to like tweet ID: %s", tweet_id_str)
+            client.like(tweet_id)
+            self.get_metrics().record_api_call("like", "ok", self.clock() - started_at)
+            self.get_metrics().inc("bot_actions_total", action="like")
+            logging.info("Successfully liked tweet ID: %s", tweet_id_str)
+            current_liked_ids_set.add(tweet_id_str)
+            rate_budget.spend("like")
+            return True
+        except tweepy.TooManyRequests as tmr:
+            self.get_metrics().record_api_call("like", "rate_limited", self.clock() - started_at)
+            logging.warning("Rate limit hit for liking %s. %s", tweet_id_str, rate_budget.describe('like'))
+            rate_budget.record_rate_limited("like", getattr(tmr.response, 'headers', None))
+            return False
+        except tweepy.TweepyException as e:
+            self.get_metrics().record_api_call("like", "error", self.clock() - started_at)
+            logging.warning("Error liking %s: %s", tweet_id_str, e)
+            error_message = str(e).lower()
+            if "already liked" in error_message or "you have already liked this tweet" in error_message:
+                logging.info("Confirmed already liked (by API error) tweet ID: %s", tweet_id_str)
+                current_liked_ids_set.add(tweet_id_str)
+            return False
+        return False
+
+    def attempt_follow_action_interactive(self, client, user_id_to_follow, user_username_to_follow, my_bot_id, current_followed_ids_set):
+        import tweepy
+        user_id_str = str(user_id_to_follow)
+        if not self.perform_follow or user_id_to_follow == my_bot_id:
+            if user_id_to_follow == my_bot_id:
+                logging.info("Skipping follow: Cannot follow self.")
+                self.count_skip("attempt", "self_follow")
+            return False
+        if user_id_str in current_followed_ids_set:
+            logging.info("Skipping follow for @%s: Already followed in this session/persistence.", user_username_to_follow)
+            self.count_skip("attempt", "already_done")
+            return False
+
+        rate_budget = self.get_rate_budget()
+        remaining_cooldown = rate_budget.wait_time("follow")
+        if remaining_cooldown > 0:
+            logging.info("Skipping follow for @%s: Still in follow cooldown/rate limit window (%ss remaining).", user_username_to_follow, int(remaining_cooldown))
+            self.count_skip("attempt", "cooldown")
+            return False
+        started_at = self.clock()
+        try:
+            logging.info("Attempting to follow user @%s (ID: %s)", user_username_to_follow, user_id_str)
+            response = client.follow_user(target_user_id=user_id_to_follow)
+            self.get_metrics().record_api_call("follow", "ok", self.clock() - started_at)
+            self.get_metrics().inc("bot_actions_total", action="follow")
+            if (response.data or {}).get("pending_follow"):
+                logging.info("Follow request to protected user @%s (ID: %s) is pending approval.", user_username_to_follow, user_id_str)
+            else:
+                logging.info("Successfully followed user @%s (ID: %s)", user_username_to_follow, user_id_str)
+            current_followed_ids_set.add(user_id_str)
+            rate_budget.spend("follow")
+            return True
+        except tweepy.TooManyRequests as tmr:
+            self.get_metrics().record_api_call("follow", "rate_limited", self.clock() - started_at)
+            logging.warning("Rate limit hit for following @%s. %s", user_username_to_follow, rate_budget.describe('follow'))
+            rate_budget.record_rate_limited("follow", getattr(tmr.response, 'headers', None))
+            return False
+        except tweepy.TweepyException as e:
+            self.get_metrics().record_api_call("follow", "error", self.clock() - started_at)
+            logging.warning("Error following @%s: %s", user_username_to_follow, e)
+            error_message = str(e).lower()
+            if "already following" in error_message or "already requested to follow" in error_message:
+                logging.info("Confirmed already following (by API error) user @%s (ID: %s)", user_username_to_follow, user_id_str)
+                current_followed_ids_set.add(user_id_str)
+            return False
+        return False
+
+    def cooldown_remaining(self, action_name):
+        # Seconds until the action type's rate limit budget (or fallback cooldown) allows another call
+        return self.get_rate_budget().wait_time(action_name)
+
+    # --- Candidate Buffer (shared by all runtimes) ---
+    # Tweets that pass the filters are buffered per action type instead of being acted on (or
+    # dropped) immediately; whenever an action type's budget frees up, its best candidate is used.
+
+    def new_candidate_buffer(self, since_ids):
+        # Journaled sessions get back the candidates that were still buffered when the last run stopped
+        candidate_buffer = CandidateBuffer(self.candidate_buffer_size, self.candidate_max_age_seconds, self.candidate_half_life_seconds,
+                                           clock=self.clock, journal=since_ids if since_ids.journal is not None else None)
+        restored = sum(1 for candidate in since_ids.buffered_candidates() if candidate_buffer.push(*candidate))
+        if restored: logging.info("Restored %s buffered candidates from the state journal.", restored)
+        for action_name in ("retweet", "like", "follow"):
+            self.get_metrics().set_gauge("bot_candidates_buffered", lambda action_name=action_name: candidate_buffer.size(action_name), action=action_name)
+        return candidate_buffer
+
+    def build_action_runners(self, session_liked_ids, session_retweeted_ids, session_followed_ids, query_groups):
+        # action name -> (done ID store, attempt method) for every action type at least one watched query enables
+        enabled_actions = {action_name for query_group in query_groups for watched in query_group.queries for action_name in watched.actions}
+        action_runners = {}
+        if "retweet" in enabled_actions: action_runners["retweet"] = (session_retweeted_ids, self.attempt_retweet_action_interactive)
+        if "like" in enabled_actions: action_runners["like"] = (session_liked_ids, self.attempt_like_action_interactive)
+        if "follow" in enabled_actions: action_runners["follow"] = (session_followed_ids, self.attempt_follow_action_interactive)
+        return action_runners
+
+    def plan_page(self, response, query_group, my_bot_id, action_runners):
+        # Routes one (packed) search page to its watched queries and plans each query's tweets with that
+        # query's filter and actions. Returns one deduplicated action plan per query that received tweets.
+        tweets = response.data
+        if self.tweet_claimer is not None:
+            claimed_ids = self.tweet_claimer([tweet.id for tweet in tweets])
+            tweets = [tweet for tweet in tweets if tweet.id in claimed_ids]
+            if len(tweets) < len(response.data):
+                logging.info("Skipping %s tweets already claimed by other workers.", len(response.data) - len(tweets))
+        plans = []
+        routed_tweets = route_tweets(tweets, response.includes, query_group)
+        for watched in query_group.queries:
+            if not routed_tweets[watched.name]: continue
+            done_ids_by_action = {action_name: action_runners[action_name][0] for action_name in watched.actions}
+            plan = plan_search_page(routed_tweets[watched.name], response.includes, my_bot_id, watched.tweet_filter, done_ids_by_action,
+                                    watched.target_languages, self.near_duplicates)
+            label = f"[{watched.name}] " if len(query_group.queries) > 1 else ""
+            logging.info("%s%s", label, plan)
+            for _, reason, _ in plan.tweet_decisions:
+                if reason is not None: self.count_skip("tweet", reason)
+            for _, _, reason in plan.action_skips: self.count_skip("action", reason)
+            if self.archive is not None: self.archive.record_plan(plan, watched.name)
+            if self.dry_run:
+                print(label + plan.format(), flush=True)
+            plans.append(plan)
+        return plans
+
+    def start_paginated_search(self, client, query_group, since_ids, search_planner=None):
+        # One search round for a packed group: a new pass down from the newest match to the group's since_id,
+        # or the rest of a pass an earlier round (or run) could not finish within its page budget
+        first_page_size = search_planner.page_size(query_group) if search_planner is not None else self.max_results_per_search
+        def fetch_page(since_id, until_id, next_token):
+            catching_up = until_id is not None or next_token is not None
+            return self.perform_search_interactive(client, query_group.query, since_id, self.catch_up_max_results if catching_up else first_page_size,
+                                                   until_id, next_token)
+        stored_cursor = since_ids.get_cursor(query_group)
+        paginated_search = PaginatedSearch(fetch_page, since_ids.for_group(query_group),
+                                           SearchCursor.from_dict(stored_cursor) if stored_cursor else None, self.search_max_pages_per_round,
+                                           has_budget=lambda: self.get_rate_budget().wait_time("search") <= 0)
+        if paginated_search.resumed:
+            logging.info("Resuming search pass of group %s below ID %s (%s pages done).", query_group.name, paginated_search.cursor.until_id, paginated_search.cursor.pages)
+        return paginated_search
+
+    def record_search_progress(self, since_ids, query_group, paginated_search):
+        # A completed pass moves the group's since_id to its newest tweet; an unfinished one keeps its cursor
+        with self.stage("persistence"):
+            if paginated_search.completed:
+                since_ids.set_cursor(query_group, None)
+                if since_ids.advance(query_group, paginated_search.newest_id):
+                    logging.info("Updating since_id of search group %s to: %s", query_group.name, paginated_search.newest_id)
+            elif paginated_search.pages:
+                since_ids.set_cursor(query_group, paginated_search.cursor.to_dict())
+
+    def backfill_new_queries(self, client, my_bot_id, query_groups, since_ids, candidate_buffer, action_runners):
+        # --backfill: watched queries without a since_id (new queries) get the recent-search window searched in
+        # parallel time shards (backfill.py) and planned in ID order; their since_id then continues where it ended
+        if not self.backfill: return
+        from backfill import WindowBackfill
+        for query_group in query_groups:
+            new_queries = [watched for watched in query_group.queries if since_ids.get(watched.query) is None]
+            if not new_queries: continue
+            backfill_group = query_group if len(new_queries) == len(query_group.queries) else QueryGroup(new_queries)
+            def fetch_page(start_time, end_time, next_token, query=backfill_group.query):
+                return self.perform_search_interactive(client, query, None, self.catch_up_max_results, next_token=next_token,
+                                                       start_time=start_time, end_time=end_time)
+            backfill = WindowBackfill(fetch_page, self.backfill_window, self.backfill_shards, self.backfill_workers, self.backfill_max_pages,
+                                      self.backfill_max_wait, rate_budget=self.get_rate_budget(),
+                                      clock=self.clock, sleep=self.sleep)
+            logging.info("Backfilling search group %s in %s shards (%s workers).", backfill_group.name, len(backfill.shards), backfill.workers)
+            for page in backfill:
+                with self.stage("filter"):
+                    plans = self.plan_page(page, backfill_group, my_bot_id, action_runners)
+                    if not self.dry_run:
+                        self.buffer_action_plans(candidate_buffer, plans)
+            logging.info("%s", backfill)
+            if since_ids.advance(backfill_group, backfill.since_id):
+                logging.info("Updating since_id of search group %s to: %s (end of the backfill)", backfill_group.name, backfill.since_id)
+            self.save_query_since_ids(since_ids)
+
+    def buffer_action_plans(self, candidate_buffer, plans):
+        # Buffers every planned action as a candidate; returns the action names that received candidates
+        buffered = set()
+        for action in (action for plan in plans for action in plan.actions):
+            if candidate_buffer.push(action.action_name, action.target_id, action.action_args, action.score, action.created_at):
+                buffered.add(action.action_name)
+            else:
+                logging.info("Skipping %s for %s: Score %.2f too low for the full (or stale) candidate buffer.", action.action_name, action.target_id, action.score)
+                self.count_skip("buffer", "score_too_low")
+        return buffered
+
+    def next_candidate(self, candidate_buffer, action_name, done_ids):
+        # Best buffered candidate that has not been acted on since it was buffered
+        while True:
+            candidate = candidate_buffer.pop_best(action_name)
+            if candidate is None: return None
+            if str(candidate.target_id) in done_ids: continue
+            if self.near_duplicates is not None:
+                duplicate_of = self.near_duplicates.acted_duplicate(action_name, candidate.target_id)
+                if duplicate_of is not None:
+                    logging.info("Skipping %s candidate %s: Text nearly duplicates tweet %s, acted on since it was buffered.", action_name, candidate.target_id, duplicate_of)
+                    self.count_skip("action", SKIP_REASON_NEAR_DUPLICATE)
+                    continue
+            logging.info("Best %s candidate: %s (score %.2f, %s more buffered).", action_name, candidate.target_id,
+                         candidate.score(self.candidate_half_life_seconds, self.clock()), candidate_buffer.size(action_name))
+            return candidate
+
+    def act_on_ready_candidates(self, client, candidate_buffer, action_runners):
+        # Spends every action type whose budget is free on its best candidate; True if an API call was attempted
+        attempted_any = False
+        self.maybe_refresh_history()
+        for action_name, (done_ids, attempt_function) in action_runners.items():
+            if not candidate_buffer.size(action_name) or self.cooldown_remaining(action_name) > 0: continue
+            candidate = self.next_candidate(candidate_buffer, action_name, done_ids)
+            if candidate is None: continue
+            with self.stage("actions"):
+                succeeded = attempt_function(client, *candidate.action_args, done_ids)
+            self.record_attempt(action_name, candidate.target_id, succeeded, done_ids)
+            if succeeded: attempted_any = True
+        return attempted_any
+
+    def act_on_candidates_until(self, deadline, client, candidate_buffer, action_runners, message_prefix):
+        # Sleeps until `deadline`, waking up to act whenever an action type with buffered candidates comes off cooldown
+        while True:
+            if self.act_on_ready_candidates(client, candidate_buffer, action_runners) and self.sleep_between_batch_actions > 0:
+                self.countdown_sleep(self.sleep_between_batch_actions, "Post-action delay: ")
+            now = self.clock()
+            if now >= deadline: return
+            wake_at = deadline
+            for action_name in action_runners:
+                if candidate_buffer.size(action_name):
+                    wake_at = min(wake_at, now + self.cooldown_remaining(action_name))
+            self.countdown_sleep(max(1, math.ceil(wake_at - now)), message_prefix)
+
+    # --- Async Runtime Mode (--async) ---
+    # Search polling, one worker per enabled action type and since_id persistence run as independent
+    # asyncio tasks. The blocking tweepy calls run in worker threads, so one action type's cooldown
+    # never stalls the other action types or the next search.
+
+    async def search_task_sleep(self, seconds):
+        # The search task paces the runtime, so its idle time is what the metrics report as sleeping
+        import asyncio
+        sleep_started_at = self.clock()
+        try:
+            with self.stage("sleep"):
+                await asyncio.sleep(seconds)
+        finally:
+            self.get_metrics().inc("bot_sleep_seconds_total", self.clock() - sleep_started_at)
+
+    async def async_search_task(self, client, my_bot_id, state, candidate_buffer, action_runners, candidates_available):
+        import asyncio
+        import tweepy
+        query_groups, since_ids = state["query_groups"], state["since_ids"]
+        search_round = search_failures = 0
+        search_planner = self.new_search_planner(query_groups)
+        while True:
+            self.next_iteration()
+            search_wait = self.get_rate_budget().wait_time("search")
+            if search_wait > 0:
+                await self.search_task_sleep(search_wait + 1)
+            query_group = self.next_search_group(search_planner, query_groups, search_round)
+            since_id = since_ids.for_group(query_group)
+            paginated_search = self.start_paginated_search(client, query_group, since_ids, search_planner)
+            search_pages = iter(paginated_search)
+            tweets_found = 0
+            try:
+                # Each page is fetched in a worker thread; its plan is buffered before the next page is requested
+                while (page := await asyncio.to_thread(next, search_pages, None)) is not None:
+                    tweets_found += len(page.data)
+                    if search_planner is not None: search_planner.observe_page(page)
+                    logging.info("Found %s tweets in search results (page %s).", len(page.data), paginated_search.pages)
+                    with self.stage("filter"):
+                        plans = self.plan_page(page, query_group, my_bot_id, action_runners)
+                        buffered = set() if self.dry_run else self.buffer_action_plans(candidate_buffer, plans)
+                    for action_name in buffered:
+                        candidates_available[action_name].set()
+                    self.record_search_progress(since_ids, query_group, paginated_search)
+                    state["since_ids_changed"].set()
+            except tweepy.TooManyRequests as tmr:
+                logging.error("Async search task caught TooManyRequests: %s.", tmr)
+                await self.search_task_sleep(math.ceil(self.get_rate_budget().wait_time("search")) + 1)
+                continue
+            self.record_search_progress(since_ids, query_group, paginated_search)
+            state["since_ids_changed"].set()
+            if paginated_search.failed and not tweets_found:
+                search_failures += 1
+                retry_wait = self.error_backoff(search_failures, self.search_interval_no_results)
+                logging.info("Search failed/no response. Retrying in %ss.", retry_wait)
+                await self.search_task_sleep(retry_wait)
+                continue
+            search_failures = 0
+            search_round += 1
+            self.get_metrics().maybe_log_summary()
+            if not tweets_found:
+                logging.info("No new tweets found in this search iteration.")
+            await self.search_task_sleep(self.plan_next_search(search_planner, query_group, since_id, paginated_search, tweets_found))
+
+    async def async_action_worker(self, action_name, client, candidate_buffer, done_ids, attempt_function, candidates_available):
+        import asyncio
+        while True:
+            if not candidate_buffer.size(action_name):
+                candidates_available.clear()
+                await candidates_available.wait()
+                continue
+            remaining = self.cooldown_remaining(action_name)
+            if remaining > 0:
+                logging.info("%s worker waiting %ss for cooldown (%s candidates buffered).", action_name.capitalize(), int(remaining), candidate_buffer.size(action_name))
+                await asyncio.sleep(remaining + 1) # +1s so the attempt method's own cooldown check passes
+                continue
+            candidate = self.next_candidate(candidate_buffer, action_name, done_ids)
+            if candidate is None: continue
+            with self.stage("actions"):
+                attempted = await asyncio.to_thread(attempt_function, client, *candidate.action_args, done_ids)
+            self.record_attempt(action_name, candidate.target_id, attempted, done_ids)
+            if attempted and self.sleep_between_batch_actions > 0:
+                await asyncio.sleep(self.sleep_between_batch_actions)
+
+    async def async_persistence_task(self, state):
+        import asyncio
+        while True:
+            await state["since_ids_changed"].wait()
+            state["since_ids_changed"].clear()
+            logging.info("Saving updated search since_ids.")
+            await asyncio.to_thread(self.save_query_since_ids, state["since_ids"])
+
+    async def async_history_task(self):
+        import asyncio
+        while True:
+            await asyncio.sleep(self.history_refresh_interval)
+            await asyncio.to_thread(self.maybe_refresh_history)
+
+    async def main_async_runtime(self, client, my_bot_id, state, session_liked_ids, session_retweeted_ids, session_followed_ids):
+        import asyncio
+        state["since_ids_changed"] = asyncio.Event()
+        candidate_buffer = self.new_candidate_buffer(state["since_ids"])
+        action_runners = self.build_action_runners(session_liked_ids, session_retweeted_ids, session_followed_ids, state["query_groups"])
+        await asyncio.to_thread(self.backfill_new_queries, client, my_bot_id, state["query_groups"], state["since_ids"], candidate_buffer, action_runners)
+        candidates_available = {action_name: asyncio.Event() for action_name in action_runners}
+
+        tasks = [asyncio.create_task(self.async_search_task(client, my_bot_id, state, candidate_buffer, action_runners, candidates_available), name="search"),
+                 asyncio.create_task(self.async_persistence_task(state), name="persistence")]
+        for action_name, (done_ids, attempt_function) in action_runners.items():
+            tasks.append(asyncio.create_task(self.async_action_worker(action_name, client, candidate_buffer, done_ids, attempt_function,
+                                                                      candidates_available[action_name]), name=action_name))
+        if self.history_sync is not None:
+            tasks.append(asyncio.create_task(self.async_history_task(), name="history"))
+        logging.info("Async runtime started with tasks: %s", ', '.join(task.get_name() for task in tasks))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks: task.cancel()
+
+    def run_async_runtime(self, client, my_bot_id, query_groups, since_ids, session_liked_ids, session_retweeted_ids, session_followed_ids):
+        # Candidates still buffered when the bot stops are dropped; the next search starts after them.
+        # Returns False if the runtime stopped because of an unexpected error.
+        import asyncio
+        state = {"query_groups": query_groups, "since_ids": since_ids}
+        try:
+            asyncio.run(self.main_async_runtime(client, my_bot_id, state, session_liked_ids, session_retweeted_ids, session_followed_ids))
+        except KeyboardInterrupt:
+            logging.info("Bot stopped by user (KeyboardInterrupt).")
+        except Exception as e_unexpected:
+            logging.critical("An UNEXPECTED error occurred in the async runtime: %s", e_unexpected)
+            logging.critical(traceback.format_exc())
+            return False
+        finally:
+            self.save_query_since_ids(since_ids)
+        return True
+
+    # --- Sessions ---
+    def run(self, credentials=None, async_mode=False):
+        # Authenticates (with `credentials` or the ones from from_config()), opens the done-ID stores and runs
+        # a session until it stops. Returns None if authentication failed, else run_bot_session()'s result.
+        client, my_bot_id, my_bot_username = self.initialize_client_and_get_me(credentials or self.credentials or {})
+        if not client:
+            logging.error("Exiting due to authentication failure.")
+            return None
+        id_stores = self.open_id_stores()
+        try:
+            return self.run_bot_session(client, my_bot_id, *id_stores, async_mode=async_mode)
+        finally:
+            for id_store in id_stores:
+                id_store.close()
+
+    def run_bot_session(self, client, my_bot_id, session_liked_ids, session_retweeted_ids, session_followed_ids, async_mode=False):
+        # Search/act loop for an authenticated client with this bot's settings.
+        # Returns False if the session stopped because of an unexpected error (so supervisors can restart it).
+        since_ids = self.load_query_since_ids()
+        query_groups = self.build_query_groups()
+
+        logging.info("--- Bot Starting with User Configuration ---")
+        # ... (logging of settings as before) ...
+        logging.info("Loaded %s liked, %s retweeted, %s followed IDs for this session.", len(session_liked_ids), len(session_retweeted_ids), len(session_followed_ids))
+        for query_group in query_groups:
+            since_id = since_ids.for_group(query_group)
+            logging.info("Starting since_id for search group %s: %s", query_group.name, since_id if since_id else 'None (fetching latest)')
+        logging.info("------------------------------------------")
+
+        for endpoint in ("search", "retweet", "like", "follow"):
+            logging.info("Rate budget - %s", self.get_rate_budget().describe(endpoint))
+
+        for store_name, done_ids in (("liked", session_liked_ids), ("retweeted", session_retweeted_ids), ("followed", session_followed_ids)):
+            self.get_metrics().set_gauge("bot_dedupe_ids", lambda done_ids=done_ids: len(done_ids), store=store_name)
+        metrics_server = self.start_metrics_server()
+        self.start_profiler() # in the loop's thread: cProfile only sees the thread that starts it
+        self.start_archive()
+        self.start_recorder(client)
+        try:
+            self.start_near_duplicate_index()
+            self.start_history_sync(client, my_bot_id, self.build_action_runners(session_liked_ids, session_retweeted_ids, session_followed_ids, query_groups))
+            if self.stream_mode:
+                if async_mode: logging.info("--stream replaces the async runtime's search polling; running the stream loop.")
+                return self.run_stream_loop(client, my_bot_id, query_groups, since_ids, session_liked_ids, session_retweeted_ids, session_followed_ids)
+            if async_mode:
+                return self.run_async_runtime(client, my_bot_id, query_groups, since_ids, session_liked_ids, session_retweeted_ids, session_followed_ids)
+            return self.run_serial_loop(client, my_bot_id, query_groups, since_ids, session_liked_ids, session_retweeted_ids, session_followed_ids)
+        finally:
+            since_ids.close()
+            logging.info("%s", self.get_metrics())
+            if metrics_server is not None: metrics_server.stop()
+            if self.profiler is not None: self.profiler.stop()
+            if self.archive is not None: self.archive.close()
+            if self.recorder is not None: self.recorder.close()
+
+    def run_serial_loop(self, client, my_bot_id, query_groups, since_ids, session_liked_ids, session_retweeted_ids, session_followed_ids):
+        import tweepy
+        candidate_buffer = self.new_candidate_buffer(since_ids)
+        action_runners = self.build_action_runners(session_liked_ids, session_retweeted_ids, session_followed_ids, query_groups)
+        try:
+            self.backfill_new_queries(client, my_bot_id, query_groups, since_ids, candidate_buffer, action_runners)
+        except KeyboardInterrupt:
+            logging.info("Bot stopped by user during the backfill.")
+            return True
+        search_round = 0 # without adaptive search, packed search groups are searched round-robin
+        search_planner = self.new_search_planner(query_groups)
+        search_failures = api_errors = 0 # failures in a row, for error_backoff()
+
+        while True:
+            self.next_iteration()
+            try:
+                search_wait = self.get_rate_budget().wait_time("search")
+                if search_wait > 0:
+                    self.act_on_candidates_until(self.clock() + search_wait + 1, client, candidate_buffer, action_runners, "Waiting for search rate limit budget: ")
+                query_group = self.next_search_group(search_planner, query_groups, search_round)
+                since_id = since_ids.for_group(query_group)
+                paginated_search = self.start_paginated_search(client, query_group, since_ids, search_planner)
+                tweets_found_in_batch = 0
+
+                for page in paginated_search: # lazily follows next_token while the page and search budgets allow
+                    tweets_found_in_batch += len(page.data)
+                    if search_planner is not None: search_planner.observe_page(page)
+                    logging.info("Found %s tweets in search results (page %s).", len(page.data), paginated_search.pages)
+
+                    with self.stage("filter"):
+                        plans = self.plan_page(page, query_group, my_bot_id, action_runners)
+                        if not self.dry_run:
+                            self.buffer_action_plans(candidate_buffer, plans)
+                    self.record_search_progress(since_ids, query_group, paginated_search)
+                    self.save_query_since_ids(since_ids)
+
+                self.record_search_progress(since_ids, query_group, paginated_search)
+                self.save_query_since_ids(since_ids)
+                if paginated_search.failed and not tweets_found_in_batch:
+                    search_failures += 1
+                    retry_wait = self.error_backoff(search_failures, self.search_interval_no_results)
+                    self.act_on_candidates_until(self.clock() + retry_wait, client, candidate_buffer, action_runners, "Search failed/no response. Retrying: ")
+                    continue
+                search_failures = api_errors = 0
+                search_round += 1
+                self.get_metrics().maybe_log_summary()
+                if not tweets_found_in_batch:
+                    logging.info("No new tweets found in this search iteration.")
+
+                # Act on the best buffered candidates as action budgets free up until the next search is due
+                sleep_interval_before_next_search = self.plan_next_search(search_planner, query_group, since_id, paginated_search,
+                                                                          tweets_found_in_batch)
+                self.act_on_candidates_until(self.clock() + sleep_interval_before_next_search, client, candidate_buffer, action_runners, "Next search batch in: ")
+
+            # ... (except blocks for TooManyRequests, TweepyException, KeyboardInterrupt, Exception as before) ...
+            except tweepy.TooManyRequests as tmr_main:
+                logging.error("Main loop caught TooManyRequests (likely search): %s.", tmr_main)
+                rate_limit_sleep_duration = math.ceil(self.get_rate_budget().wait_time("search")) + 1 # Until the reset from the headers (or fallback)
+                try:
+                    self.countdown_sleep(rate_limit_sleep_duration, "Search rate limit cooldown: ")
+                except KeyboardInterrupt:
+                    logging.info("Bot stopped by user during search rate limit sleep.")
+                    self.save_query_since_ids(since_ids)
+                    break
+            except tweepy.TweepyException as e_main:
+                logging.error("A Tweepy API error occurred in main loop: %s", e_main)
+                if hasattr(e_main, 'response') and e_main.response is not None:
+                    logging.error("Response details: Status %s, Text: %s", e_main.response.status_code, e_main.response.text[:200])
+                api_errors += 1
+                self.countdown_sleep(self.error_backoff(api_errors, self.sleep_after_generic_api_error), "Waiting after API error: ")
+            except KeyboardInterrupt:
+                logging.info("Bot stopped by user (KeyboardInterrupt).")
+                self.save_query_since_ids(since_ids)
+                break
+            except Exception as e_unexpected:
+                logging.critical("An UNEXPECTED error occurred in main loop: %s", e_unexpected)
+                logging.critical(traceback.format_exc())
+                self.save_query_since_ids(since_ids)
+                logging.info("Stopping bot due to unexpected critical error.")
+                self.countdown_sleep(self.sleep_after_critical_error_before_exit, "Exiting after critical error in: ")
+                return False
+        return True
+
+    # --- Filtered Stream Mode (--stream) ---
+    # Tweets matching the watched queries arrive as they are posted (stream_ingest.py) and go through
+    # the same plan/buffer/act path as search pages. Without stream access, or once the stream gives
+    # up reconnecting, the session continues with run_serial_loop.
+
+    def start_filtered_stream(self, client, query_groups):
+        # Returns a running FilteredStream, or None if this account cannot use the filtered stream
+        import tweepy
+        from stream_ingest import FilteredStream, StreamUnavailable, sync_stream_rules
+        streaming_client = tweepy.StreamingClient(client.bearer_token)
+        self.install_transport(streaming_client, retries=0) # FilteredStream handles its own reconnects; the transport only pools and redirects
+        self.get_rate_budget().install(streaming_client)
+        try:
+            rule_groups = sync_stream_rules(streaming_client, query_groups)
+        except StreamUnavailable as e:
+            logging.warning("Filtered stream unavailable (%s); polling search instead.", e)
+            return None
+        params = {"tweet.fields": ",".join(SEARCH_TWEET_FIELDS), "expansions": ",".join(SEARCH_EXPANSIONS), "user.fields": ",".join(SEARCH_USER_FIELDS)}
+        if self.stream_backfill_minutes: params["backfill_minutes"] = self.stream_backfill_minutes
+        return FilteredStream(streaming_client, rule_groups, params, sleep=self.sleep, clock=self.clock, stall_timeout=self.stream_stall_timeout,
+                              max_failures=self.stream_max_reconnects, metrics=self.get_metrics()).start()
+
+    def run_stream_loop(self, client, my_bot_id, query_groups, since_ids, session_liked_ids, session_retweeted_ids, session_followed_ids):
+        from stream_ingest import StreamUnavailable
+        stream = self.start_filtered_stream(client, query_groups)
+        if stream is None:
+            return self.run_serial_loop(client, my_bot_id, query_groups, since_ids, session_liked_ids, session_retweeted_ids, session_followed_ids)
+        candidate_buffer = self.new_candidate_buffer(since_ids)
+        action_runners = self.build_action_runners(session_liked_ids, session_retweeted_ids, session_followed_ids, query_groups)
+        try:
+            self.backfill_new_queries(client, my_bot_id, query_groups, since_ids, candidate_buffer, action_runners)
+            while True:
+                self.next_iteration()
+                # Wait for tweets, but no longer than until the first action type with candidates comes off cooldown
+                wait = min((self.cooldown_remaining(action_name) for action_name in action_runners if candidate_buffer.size(action_name)),
+                           default=self.stream_idle_wakeup)
+                wait_started_at = self.clock()
+                try:
+                    with self.stage("sleep"):
+                        pages = stream.get(timeout=max(1, wait))
+                finally:
+                    self.get_metrics().inc("bot_sleep_seconds_total", self.clock() - wait_started_at)
+                for query_group, page in pages:
+                    logging.info("Received %s tweets from the filtered stream for search group %s.", len(page.data), query_group.name)
+                    with self.stage("filter"):
+                        plans = self.plan_page(page, query_group, my_bot_id, action_runners)
+                        if not self.dry_run:
+                            self.buffer_action_plans(candidate_buffer, plans)
+                    since_ids.advance(query_group, max(tweet.id for tweet in page.data)) # polling resumes after the streamed tweets
+                if pages: self.save_query_since_ids(since_ids)
+                if self.act_on_ready_candidates(client, candidate_buffer, action_runners) and self.sleep_between_batch_actions > 0:
+                    self.countdown_sleep(self.sleep_between_batch_actions, "Post-action delay: ")
+                self.get_metrics().maybe_log_summary()
+        except StreamUnavailable as e:
+            logging.warning("Filtered stream gave up (%s); falling back to polling search.", e)
+        except KeyboardInterrupt:
+            logging.info("Bot stopped by user (KeyboardInterrupt).")
+            return True
+        except Exception as e_unexpected:
+            logging.critical("An UNEXPECTED error occurred in the stream loop: %s", e_unexpected)
+            logging.critical(traceback.format_exc())
+            return False
+        finally:
+            stream.stop()
+            self.save_query_since_ids(since_ids)
+        return self.run_serial_loop(client, my_bot_id, query_groups, since_ids, session_liked_ids, session_retweeted_ids, session_followed_ids)
@@ -0,0 +1,69 @@
+# virtual_clock.py
+# Injectable clocks: SystemClock for live runs, VirtualClock for offline runs where sleeping
+# advances simulated time instantly.
+#
+# SystemClock.sleep() blocks on a threading.Event rather than polling, so an idle bot makes
+# no wakeups at all until its next scheduled request. request_shutdown() (e.g. from a SIGTERM
+# handler) sets the event: the sleep in progress and any later one end at once with
+# ShutdownRequested.
+#
+# A VirtualClock is callable like time.time, so it can be passed wherever the code takes a
+# `clock` (RateBudget, CandidateBuffer) and installed as the bot's CLOCK/SLEEP pair. Once
+# the simulated time reaches stop_at, sleep() raises SimulationComplete. It is a
+# KeyboardInterrupt, so the bot's loops shut down the same way they do on Ctrl+C.
+import threading
+from time import time
+
+
+class SimulationComplete(KeyboardInterrupt):
+    pass
+
+
+class ShutdownRequested(KeyboardInterrupt):
+    pass
+
+
+class SystemClock:
+    def __init__(self):
+        self.shutdown_event = threading.Event()
+
+    def __call__(self):
+        return time()
+
+    def time(self):
+        return time()
+
+    def sleep(self, seconds):
+        if self.shutdown_event.wait(seconds if seconds > 0 else 0):
+            raise ShutdownRequested("Shutdown requested")
+
+    def request_shutdown(self):
+        self.shutdown_event.set()
+
+
+class VirtualClock:
+    def __init__(self, start=None, stop_at=None):
+        self._now = float(start if start is not None else time())
+        self.stop_at = stop_at
+        self.slept = 0.0 # total simulated seconds spent in sleep()
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        return self._now
+
+    def time(self):
+        return self._now
+
+    def advance(self, seconds):
+        # Moves time forward without the stop_at check (e.g. simulated request latency)
+        if seconds <= 0: return
+        with self._lock:
+            self._now += seconds
+
+    def sleep(self, seconds):
+        if self.stop_at is not None and self._now >= self.stop_at:
+            raise SimulationComplete(f"Simulation reached {self.stop_at}")
+        if seconds > 0:
+            with self._lock:
+                self._now += seconds
+                self.slept += seconds